@@ -1,8 +1,17 @@
 # app/main.py
 from fastapi import FastAPI
 from fastapi.concurrency import asynccontextmanager
-from app.routers import auth, usage, policy, ai
+from app.routers import auth, usage, policy, ai, metrics
+from app.services.ai_pool import ai_pool
+from app.services.ai_snapshot import ai_refresher
 from app.services.categorizer import dataset_loader
+from app.services.feature_delta import feature_repair_job, incremental_enabled
+from app.services.feature_scheduler import feature_scheduler
+from app.services.ingest_spool import start_drainer, stop_drainer
+from app.services.model_registry import model_registry
+from app.services.online_state import ONLINE_MODELS_ENABLED, online_state_job
+from app.services.risk_scoring import RISK_BATCH_ENABLED, risk_batch_job, risk_meta
+from app.services.usage_views import MV_REFRESH_ENABLED, view_refresh_job
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
@@ -12,11 +21,53 @@ async def lifespan(app: FastAPI):
     # 1. 50k'lık App Dataset'ini belleğe yükle
     # Bu işlem sadece bir kere yapılır ve uygulama ayakta kaldığı sürece RAM'den okunur.
     dataset_loader.load_data() 
+
+    # 1b. Eğitilmiş model artifact'ları (persona) bir kez yüklenir; istek yolunda eğitim yok
+    model_registry.load_all()
+
+    # 1b2. risk_dimension / risk_level id'leri bir kez seed edilir; risk yazımı meta sorgusu atmaz
+    try:
+        risk_meta.seed()
+    except Exception as e:
+        print(f"Risk meta seed edilemedi, ilk risk yazımında tekrar denenecek: {e}")
+
+    # 1c. AI dashboard süreç havuzu: işçiler şimdi başlar (her biri modelleri bir kez yükler)
+    ai_pool.start()
+
+    # 2. feature_daily yeniden hesaplama scheduler'ı (debounce + birleştirme)
+    feature_scheduler.start()
+
+    # 3. Write-behind spool: önceki çalışmadan kalan batch'ler varsa tekrar oynatılır
+    start_drainer()
+
+    # 4. Artımlı feature modunda son günler periyodik olarak tam hesapla onarılır
+    if incremental_enabled():
+        feature_repair_job.start()
+
+    # 5. view_daily_app_usage materialized view'unun periyodik CONCURRENTLY yenilemesi
+    if MV_REFRESH_ENABLED:
+        view_refresh_job.start()
+
+    # 6. Gece risk batch'i: tüm aktif kullanıcılar tek sorgu + tek upsert ile puanlanır
+    if RISK_BATCH_ENABLED:
+        risk_batch_job.start()
+
+    # 7. Online modda kesinleşen feature_daily günleri kullanıcı model durumuna uygulanır
+    if ONLINE_MODELS_ENABLED:
+        online_state_job.start()
     
     yield # Uygulama burada çalışmaya devam eder
     
     # --- SHUTDOWN ---
     print("Digital Health Kids Backend Kapatılıyor...")
+    ai_refresher.stop(wait=False)
+    ai_pool.stop()
+    online_state_job.stop()
+    risk_batch_job.stop()
+    view_refresh_job.stop()
+    feature_repair_job.stop()
+    stop_drainer()
+    feature_scheduler.stop(flush=True)
     # Gerekirse DB bağlantılarını kapatma vs. burada yapılabilir
 
 app = FastAPI(
@@ -28,4 +79,5 @@ app = FastAPI(
 app.include_router(auth.router, prefix="/api/auth", tags=["auth"])
 app.include_router(usage.router, prefix="/api/usage", tags=["usage"])
 app.include_router(policy.router, prefix="/api/policy", tags=["policy"])
-app.include_router(ai.router, prefix="/api", tags=["ai"])
\ No newline at end of file
+app.include_router(ai.router, prefix="/api", tags=["ai"])
+app.include_router(metrics.router, prefix="/api/metrics", tags=["metrics"])
\ No newline at end of file
@@ -1,10 +1,11 @@
 # app/models/core.py
 from sqlalchemy import (
     Column, String, Text, DateTime, ForeignKey,
-    Integer, Boolean, Date, DECIMAL, SmallInteger, Time
+    Integer, BigInteger, Boolean, Date, DECIMAL, SmallInteger, Time, Float, LargeBinary
 )
 from sqlalchemy.dialects.postgresql import UUID, JSONB
 from sqlalchemy.orm import relationship
+from sqlalchemy.sql import func
 from app.db import Base
 import uuid
 from datetime import datetime
@@ -66,8 +67,11 @@ class AppCatalog(Base):
     package_name = Column(Text, primary_key=True)
     app_name = Column(Text, nullable=False)
     category_id = Column(Integer, ForeignKey("app_category.id"))
+    # CatalogIndex watermark'ı: ORM güncellemelerinde otomatik ilerler
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
     category = relationship("AppCategory", backref="apps")
 class DailyAppUsageView(Base):
+    # Materialized view (db/view_daily-app-usage.sql); tazelik için MvRefreshLog'a bak
     __tablename__ = "view_daily_app_usage"
     user_id = Column(UUID(as_uuid=True), primary_key=True)
     usage_date = Column(Date, primary_key=True)
@@ -75,6 +79,23 @@ class DailyAppUsageView(Base):
     total_minutes = Column(Integer)
     session_count = Column(Integer)
 
+
+class MvRefreshLog(Base):
+    __tablename__ = "mv_refresh_log"
+    view_name = Column(Text, primary_key=True)
+    data_as_of = Column(DateTime(timezone=True), nullable=False)
+    refreshed_at = Column(DateTime(timezone=True), server_default=func.now())
+    duration_ms = Column(Integer)
+    concurrent = Column(Boolean, nullable=False, default=True)
+
+
+class BatchRunLog(Base):
+    __tablename__ = "batch_run_log"
+    job_name = Column(Text, primary_key=True)
+    run_date = Column(Date, primary_key=True)
+    users = Column(Integer)
+    finished_at = Column(DateTime(timezone=True), server_default=func.now())
+
 # 2. AI & ANALYTICS TABLOLARI (Refactor Edilmiş Hali)
 class FeatureDaily(Base):
     __tablename__ = "feature_daily"
@@ -88,6 +109,11 @@ class FeatureDaily(Base):
     weekday = Column(SmallInteger) # 0=Pzt, 6=Paz
     weekend = Column(Boolean)
     is_holiday = Column(Boolean, default=False)
+    # Artımlı güncelleme için ham saniyeler (dakika/oran kolonları bunlardan türetilir)
+    total_seconds = Column(Float)
+    night_seconds = Column(Float)
+    gaming_seconds = Column(Float)
+    social_seconds = Column(Float)
 
 class WeeklyForecast(Base):
     __tablename__ = "weekly_forecast"
@@ -99,6 +125,33 @@ class WeeklyForecast(Base):
     yhat_lo = Column(Integer)
     yhat_hi = Column(Integer)
     model_key = Column(String)
+    yhat = Column(Integer)
+    daily_series = Column(JSONB)
+    daily_lo = Column(JSONB)
+    daily_hi = Column(JSONB)
+    start_date = Column(Date)
+    history_end = Column(Date)
+    history_signature = Column(String)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+class UserProfile(Base):
+    __tablename__ = "user_profile"
+    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id"), primary_key=True)
+    label = Column(String, nullable=False)
+    probabilities = Column(JSONB)
+    model_key = Column(String)
+    history_end = Column(Date)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now())
+
+class AIModelState(Base):
+    __tablename__ = "ai_model_state"
+    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id"), primary_key=True)
+    model_key = Column(String, nullable=False)
+    last_day = Column(Date)
+    n_days = Column(Integer, nullable=False, default=0)
+    state = Column(LargeBinary, nullable=False)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now())
+
 class DailyUsageLog(Base):
     __tablename__ = "daily_usage_log"
     user_id = Column(UUID(as_uuid=True), ForeignKey("users.id"), primary_key=True)
@@ -108,3 +161,42 @@ class DailyUsageLog(Base):
     app_name = Column(Text)
     total_seconds = Column(Integer)
     updated_at = Column(DateTime, default=datetime.utcnow)
+
+
+class UsageHourly(Base):
+    __tablename__ = "usage_hourly"
+    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id"), primary_key=True)
+    device_id = Column(UUID(as_uuid=True), ForeignKey("device.id"), primary_key=True)
+    date = Column(Date, primary_key=True)
+    hour = Column(SmallInteger, primary_key=True)
+    package_name = Column(Text, primary_key=True)
+    seconds = Column(Float, nullable=False, default=0.0)
+    night_seconds = Column(Float, nullable=False, default=0.0)
+
+
+class UsageHourlyDay(Base):
+    __tablename__ = "usage_hourly_day"
+    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id"), primary_key=True)
+    date = Column(Date, primary_key=True)
+    night_start = Column(Time, nullable=False)
+    night_end = Column(Time, nullable=False)
+
+
+class UsageWeekly(Base):
+    __tablename__ = "usage_weekly"
+    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id"), primary_key=True)
+    week_start = Column(Date, primary_key=True)
+    total_seconds = Column(BigInteger, nullable=False, default=0)
+    total_minutes = Column(Integer, nullable=False, default=0)
+    active_days = Column(SmallInteger, nullable=False, default=0)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now())
+
+
+class UsageMonthly(Base):
+    __tablename__ = "usage_monthly"
+    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id"), primary_key=True)
+    month_start = Column(Date, primary_key=True)
+    total_seconds = Column(BigInteger, nullable=False, default=0)
+    total_minutes = Column(Integer, nullable=False, default=0)
+    active_days = Column(SmallInteger, nullable=False, default=0)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now())
@@ -1,30 +1,31 @@
 # app/routers/ai.py
 from fastapi import APIRouter, Depends
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 
 from app.db import get_db
 from app.schemas.ai import AIDashboardResponse
 from app.services.ai_engine import AIEngine
+from app.services.ai_snapshot import ai_refresher, load_snapshot
 
 router = APIRouter(prefix="/ai", tags=["AI"])
 
 @router.get("/dashboard/{user_id}", response_model=AIDashboardResponse)
-def get_ai_dashboard(
+async def get_ai_dashboard(
     user_id: str,
     db: Session = Depends(get_db),
 ):
-    # Engine'i başlat
-    engine = AIEngine(db, user_id)
-    
+    # Kalıcı anlık görüntü varsa hemen dön; eskiyse arka planda tek uçuşta yenile
+    snapshot = await run_in_threadpool(load_snapshot, db, user_id)
+    if snapshot is not None:
+        if snapshot["stale"]:
+            ai_refresher.trigger(user_id)
+        recs = AIEngine.get_smart_recommendations(
+            snapshot["risk_analysis"]["level"], snapshot["user_profile"]["label"]
+        )
+        return AIDashboardResponse(**snapshot, suggestions=recs)
+
+    # İlk ziyaret: risk/profil/tahmin süreç havuzunda birlikte hesaplanır (ve yazılır).
     # Veri yoksa backend otomatik mock'a düşer; client tarafında toggle gerekmiyor
-    risk = engine.calculate_risk_score(allow_mock=True)
-    profile = engine.determine_profile(allow_mock=True)
-    forecast = engine.predict_next_week(allow_mock=True)
-    recs = engine.get_smart_recommendations(risk['level'], profile['label'])
-    
-    return AIDashboardResponse(
-        risk_analysis=risk,
-        user_profile=profile,
-        forecast=forecast,
-        suggestions=recs,
-    )
\ No newline at end of file
+    engine = await run_in_threadpool(AIEngine, db, user_id)
+    return AIDashboardResponse(**await engine.build_dashboard_async(allow_mock=True))
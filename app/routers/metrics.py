@@ -0,0 +1,75 @@
+# app/routers/metrics.py
+from fastapi import APIRouter, Depends
+from sqlalchemy.orm import Session
+
+from app.db import get_db
+
+from app.services.ai_pool import ai_pool
+from app.services.ai_snapshot import ai_refresher
+from app.services.catalog_index import catalog_index
+from app.services.dashboard_cache import dashboard_cache
+from app.services.feature_delta import FEATURE_UPDATE_MODE, feature_repair_job
+from app.services.feature_scheduler import feature_scheduler
+from app.services.ingest_spool import ingest_spool
+from app.services.model_registry import model_registry
+from app.services.online_state import ONLINE_MODELS_ENABLED, online_state_job
+from app.services.risk_scoring import risk_batch_job
+from app.services.usage_views import view_freshness, view_refresh_job
+
+router = APIRouter()
+
+
+@router.get("/ingest")
+def get_ingest_metrics():
+    """Write-behind spool durumu: bekleyen batch/olay sayısı ve gecikme (lag)."""
+    return ingest_spool.stats()
+
+
+@router.get("/features")
+def get_feature_scheduler_metrics():
+    """feature_daily scheduler sayaçları ve artımlı moddaki onarım işinin durumu."""
+    return {
+        **feature_scheduler.stats(),
+        "update_mode": FEATURE_UPDATE_MODE,
+        "repair": feature_repair_job.stats(),
+    }
+
+
+@router.get("/dashboard_cache")
+def get_dashboard_cache_metrics():
+    """Dashboard önbelleği: hit/miss, tahliye (eviction) ve invalidation sayaçları."""
+    return dashboard_cache.stats()
+
+
+@router.get("/catalog_index")
+def get_catalog_index_metrics():
+    """Paket -> kategori indeksi: boyut, watermark ve yenileme sayaçları."""
+    return catalog_index.stats()
+
+
+@router.get("/views")
+def get_view_metrics(db: Session = Depends(get_db)):
+    """Materialized view tazeliği (watermark, gecikme) ve yenileme işinin durumu."""
+    return {
+        "daily_app_usage": view_freshness(db),
+        "refresh": view_refresh_job.stats(),
+    }
+
+
+@router.get("/models")
+def get_model_metrics():
+    """Yüklü model artifact'ları ve online model durumu güncelleme işi."""
+    return {
+        **model_registry.stats(),
+        "online": {"enabled": ONLINE_MODELS_ENABLED, **online_state_job.stats()},
+    }
+
+
+@router.get("/risk")
+def get_risk_metrics():
+    """Gece risk batch işi, AI dashboard arka plan yenilemesi ve süreç havuzu sayaçları."""
+    return {
+        "batch": risk_batch_job.stats(),
+        "dashboard_refresh": ai_refresher.stats(),
+        "pool": ai_pool.stats(),
+    }
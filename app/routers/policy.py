@@ -15,6 +15,8 @@ from app.schemas.policy import (
     BlockAppRequest,
 )
 from app.services.auto_policy import apply_auto_policy, preview_auto_policy
+from app.services.hourly_rollup import rebuild_night_window
+from app.services.night_window import NightWindow
 from app.models.core import User
 
 # Basit öneri seti (MVP): risk ve tahmine göre ebeveyne gösterilecek, otomatik uygulama yok
@@ -156,6 +158,7 @@ def update_settings(
     if not settings:
         settings = UserSettings(user_id=user_id)
         db.add(settings)
+    night_before = NightWindow.from_settings(settings)
 
     t_start = None
     t_end = None
@@ -174,6 +177,10 @@ def update_settings(
     settings.nightly_start = t_start
     settings.nightly_end = t_end
     settings.weekend_relax_pct = payload.weekend_relax_pct
+
+    # Gece penceresi değiştiyse saatlik rollup'ın gece saniyeleri yeni pencereyle kurulur
+    if NightWindow.from_settings(settings) != night_before:
+        rebuild_night_window(db, user_id)
     
     if payload.blocked_packages is not None:
         # 1. Gelen liste (Set olarak işlem yapmak daha hızlı)
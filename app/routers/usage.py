@@ -1,11 +1,14 @@
-from datetime import datetime, timedelta, timezone, time, date
+from datetime import datetime, timedelta, time, date
 from uuid import UUID
-from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks 
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from pydantic import ValidationError
 from sqlalchemy.orm import Session
-from sqlalchemy.dialects.postgresql import insert
-from app.db import get_db, SessionLocal
-from app.models.core import DailyUsageLog, AppSession, User, UserSettings
+from app.db import get_db
+from app.models.core import DailyUsageLog, AppSession, User
 from app.schemas.usage import (
+    UsageEvent,
     UsageReportRequest,
     UsageReportResponse,
     DashboardResponse,
@@ -14,61 +17,41 @@ from app.schemas.usage import (
     AppDetailResponse,
     HourlyUsage,
     SessionUsage,
+    UsageHistoryResponse,
+    UsagePeriodStat,
 )
-from app.services.analytics import calculate_daily_features 
-from app.services.categorizer import get_or_create_app_entry
+from app.services.dashboard_cache import dashboard_cache
+from app.services.dashboard_query import OTHER_LABEL, OTHER_PACKAGE_NAME, daily_app_breakdown
+from app.services.feature_scheduler import feature_scheduler
+from app.services.catalog_index import catalog_index
+from app.services.categorizer import get_or_create_app_entries
+from app.services.ingest import (
+    TR_TZ,
+    ChunkedUsageWriter,
+    ImplausibleUsageError,
+    aggregate_events,
+    build_daily_rows,
+    persist_usage,
+)
+from app.services.ingest_spool import ingest_spool, spool_enabled
+from app.services.hourly_rollup import hourly_usage
+from app.services.night_window import NightWindow
+from app.services.period_rollup import MAX_RANGE_DAYS, usage_history
 from app.services.category_constants import display_label_for, DEFAULT_CATEGORY_KEY
-from app.models.core import AppCatalog, AppCategory 
+import os
 import time as perf_time
 
 router = APIRouter()
 
-# Türkiye için UTC+3 saat dilimini tanımla
-TR_TZ = timezone(timedelta(hours=3))
-def _calculate_features_background(user_id: UUID, target_date: date):
-    """Run feature calculation with a fresh DB session to avoid closed session errors."""
-    db = SessionLocal()
-    try:
-        calculate_daily_features(user_id, target_date, db)
-    finally:
-        db.close()
-
-
-
-def _interval_overlap_minutes(a_start: datetime, a_end: datetime, b_start: datetime, b_end: datetime) -> float:
-    if a_end <= b_start or a_start >= b_end:
-        return 0.0
-    overlap_start = max(a_start, b_start)
-    overlap_end = min(a_end, b_end)
-    return max((overlap_end - overlap_start).total_seconds(), 0) / 60.0
-
-
-def _night_overlap_minutes(start_dt: datetime, end_dt: datetime, win_start_t: time, win_end_t: time) -> float:
-    minutes = 0.0
-    cursor = start_dt
-    while cursor < end_dt:
-        day_end = datetime.combine(cursor.date(), time.max, tzinfo=cursor.tzinfo)
-        seg_end = min(day_end, end_dt)
+# NDJSON akışında kaç olayda bir DB'ye yazılacağı
+STREAM_CHUNK_SIZE = int(os.getenv("USAGE_STREAM_CHUNK_SIZE", "500"))
+# Tek bir NDJSON satırı için üst sınır (bellek koruması)
+STREAM_MAX_LINE_BYTES = 64 * 1024
 
-        if win_start_t > win_end_t:
-            win1_start = datetime.combine(cursor.date(), win_start_t, tzinfo=cursor.tzinfo)
-            win1_end = datetime.combine(cursor.date(), time.max, tzinfo=cursor.tzinfo)
-            win2_start = datetime.combine(cursor.date(), time.min, tzinfo=cursor.tzinfo)
-            win2_end = datetime.combine(cursor.date(), win_end_t, tzinfo=cursor.tzinfo)
-            minutes += _interval_overlap_minutes(cursor, seg_end, win1_start, win1_end)
-            minutes += _interval_overlap_minutes(cursor, seg_end, win2_start, win2_end)
-        else:
-            win_start = datetime.combine(cursor.date(), win_start_t, tzinfo=cursor.tzinfo)
-            win_end = datetime.combine(cursor.date(), win_end_t, tzinfo=cursor.tzinfo)
-            minutes += _interval_overlap_minutes(cursor, seg_end, win_start, win_end)
-
-        cursor = seg_end + timedelta(seconds=1)
-    return minutes
 
 @router.post("/report", response_model=UsageReportResponse)
 def report_usage(
     payload: UsageReportRequest, 
-    background_tasks: BackgroundTasks, 
     db: Session = Depends(get_db)):
 
     t0 = perf_time.perf_counter()
@@ -93,113 +76,43 @@ def report_usage(
     user_id = payload.user_id
     device_id = payload.device_id
 
-    def _split_session(start_dt: datetime, end_dt: datetime):
-        current_start = start_dt
-        # Stop when we pass the real end time to avoid infinite loop on same-day sessions
-        while current_start <= end_dt:
-            day_end = datetime.combine(current_start.date(), time.max, tzinfo=TR_TZ)
-            segment_end = min(day_end, end_dt)
-            duration = (segment_end - current_start).total_seconds()
-            if duration > 0:
-                yield current_start.date(), duration
-            current_start = segment_end + timedelta(seconds=1)
-
-    aggregated = {}
-    dates_in_payload = set()
-    session_rows = []
-
-    for ev in payload.events:
-        start_dt = datetime.fromtimestamp(ev.timestamp_start / 1000.0, TR_TZ)
-        end_dt = datetime.fromtimestamp(ev.timestamp_end / 1000.0, TR_TZ)
-
-        if end_dt <= start_dt:
-            continue
-
-        # Insert raw session
-        session_rows.append({
-            "user_id": user_id,
-            "device_id": device_id,
-            "package_name": ev.package_name,
-            "started_at": start_dt,
-            "ended_at": end_dt,
-            "source": "android_sync",
-            "payload": None,
-        })
-
-        for usage_date, duration in _split_session(start_dt, end_dt):
-            dates_in_payload.add(usage_date)
-            key = (usage_date, ev.package_name)
-            if key not in aggregated:
-                aggregated[key] = {"duration": 0, "app_name": ev.app_name}
-            aggregated[key]["duration"] += duration
-            if ev.app_name:
-                aggregated[key]["app_name"] = ev.app_name
+    session_rows, aggregated, dates_in_payload = aggregate_events(user_id, device_id, payload.events)
 
     print(
         f"USAGE REPORT step=after_aggregate agg={len(aggregated)} dates={len(dates_in_payload)} "
         f"elapsed_ms={(perf_time.perf_counter()-t0)*1000:.1f}"
     )
 
+    if spool_enabled():
+        # Write-behind: doğrulanmış batch'i diske yaz, DB işini drainer'a bırak
+        try:
+            build_daily_rows(user_id, device_id, aggregated)
+        except ImplausibleUsageError as e:
+            print(f"USAGE REPORT error={e}")
+            raise HTTPException(status_code=422, detail=str(e))
+        seq = ingest_spool.append(user_id, device_id, payload.events)
+        print(
+            f"USAGE REPORT step=spooled seq={seq} elapsed_ms={(perf_time.perf_counter()-t0)*1000:.1f}"
+        )
+        return UsageReportResponse(status="queued", inserted=len(payload.events))
+
     unique_packages = {pkg for (_, pkg) in aggregated.keys()}
     print(f"USAGE REPORT step=unique_packages count={len(unique_packages)}")
-    for pkg in unique_packages:
-        get_or_create_app_entry(db, pkg)
+    get_or_create_app_entries(db, unique_packages)
     print(
         f"USAGE REPORT step=after_catalog elapsed_ms={(perf_time.perf_counter()-t0)*1000:.1f}"
     )
 
-    rows = []
-    for (usage_date, pkg), data in aggregated.items():
-        total_seconds = int(data["duration"])
-        if total_seconds > 16 * 3600:
-            msg = f"implausible daily total pkg={pkg} date={usage_date} total_seconds={total_seconds}"
-            print(f"USAGE REPORT error={msg}")
-            raise HTTPException(status_code=422, detail=msg)
-
-        rows.append({
-            "user_id": user_id,
-            "device_id": device_id,
-            "usage_date": usage_date,
-            "package_name": pkg,
-            "app_name": data["app_name"],
-            "total_seconds": total_seconds,
-            "updated_at": datetime.utcnow()
-        })
-
-    # Insert raw sessions (if any)
-    if session_rows:
-        stmt_sess = insert(AppSession).values(session_rows)
-        stmt_sess = stmt_sess.on_conflict_do_nothing(
-            index_elements=[
-                AppSession.user_id,
-                AppSession.device_id,
-                AppSession.package_name,
-                AppSession.started_at,
-            ]
-        )
-        db.execute(stmt_sess)
-        print(
-            f"USAGE REPORT step=insert_sessions rows={len(session_rows)} elapsed_ms={(perf_time.perf_counter()-t0)*1000:.1f}"
-        )
+    try:
+        rows = build_daily_rows(user_id, device_id, aggregated)
+    except ImplausibleUsageError as e:
+        print(f"USAGE REPORT error={e}")
+        raise HTTPException(status_code=422, detail=str(e))
 
-    if rows:
-        stmt = insert(DailyUsageLog).values(rows)
-        stmt = stmt.on_conflict_do_update(
-            index_elements=[
-                DailyUsageLog.user_id,
-                DailyUsageLog.device_id,
-                DailyUsageLog.usage_date,
-                DailyUsageLog.package_name
-            ],
-            set_={
-                "app_name": stmt.excluded.app_name,
-                "total_seconds": stmt.excluded.total_seconds,
-                "updated_at": datetime.utcnow()
-            }
-        )
-        db.execute(stmt)
+    feature_keys = persist_usage(db, session_rows, rows)
     print(
-        f"USAGE REPORT step=after_upsert rows={len(rows)} elapsed_ms={(perf_time.perf_counter()-t0)*1000:.1f}"
+        f"USAGE REPORT step=after_upsert sessions={len(session_rows)} rows={len(rows)} "
+        f"elapsed_ms={(perf_time.perf_counter()-t0)*1000:.1f}"
     )
 
     try:
@@ -211,77 +124,151 @@ def report_usage(
         db.rollback()
         print(f"DATABASE COMMIT ERROR: {e}") 
         raise HTTPException(status_code=500, detail=f"Database commit failed: {e}")
+    dashboard_cache.invalidate_user(user_id)
     
-    # Arka plan görevleri (taze session ile çalıştır)
-    for d in dates_in_payload:
-        background_tasks.add_task(_calculate_features_background, user_id, d)
+    # Yeni oturumların deltası feature_daily'ye yazıldı; tam hesap sadece gereken
+    # günler için (scheduler aynı (user, gün) isteklerini birleştirip erteler)
+    for key_user, d in feature_keys:
+        feature_scheduler.schedule(key_user, d)
     print("USAGE REPORT step=scheduled_background")
 
     return UsageReportResponse(status="ok", inserted=len(payload.events))
 
 
+@router.post("/report/stream", response_model=UsageReportResponse)
+async def report_usage_stream(
+    request: Request,
+    user_id: UUID,
+    device_id: UUID,
+    db: Session = Depends(get_db),
+):
+    """
+    NDJSON ingest: her satır tek bir UsageEvent. Gövde parça parça okunur,
+    olaylar STREAM_CHUNK_SIZE'lık gruplar halinde yazılıp commit edilir.
+    """
+    t0 = perf_time.perf_counter()
+    writer = ChunkedUsageWriter(db, user_id, device_id, chunk_size=STREAM_CHUNK_SIZE)
+    buffer = b""
+    line_no = 0
+
+    async def _consume(line: bytes):
+        nonlocal line_no
+        line_no += 1
+        line = line.strip()
+        if not line:
+            return
+        try:
+            event = UsageEvent.model_validate_json(line)
+        except ValidationError as e:
+            raise HTTPException(
+                status_code=422,
+                detail=f"line {line_no}: invalid event ({e.error_count()} errors); "
+                       f"{writer.stored} earlier events already stored",
+            )
+        writer.add(event)
+        if writer.is_full:
+            await run_in_threadpool(writer.flush)
+
+    try:
+        async for chunk in request.stream():
+            buffer += chunk
+            *lines, buffer = buffer.split(b"\n")
+            for line in lines:
+                await _consume(line)
+            if len(buffer) > STREAM_MAX_LINE_BYTES:
+                raise HTTPException(status_code=413, detail=f"line {line_no + 1}: exceeds {STREAM_MAX_LINE_BYTES} bytes")
+        await _consume(buffer)
+        await run_in_threadpool(writer.flush)
+    except ImplausibleUsageError as e:
+        print(f"USAGE STREAM error={e}")
+        raise HTTPException(status_code=422, detail=str(e))
+    finally:
+        # Hata olsa bile commit edilmiş parçalar dashboard'u değiştirmiş olabilir
+        if writer.chunks:
+            dashboard_cache.invalidate_user(user_id)
+
+    for key_user, d in writer.feature_keys:
+        feature_scheduler.schedule(key_user, d)
+
+    print(
+        f"USAGE STREAM done events={writer.accepted} chunks={writer.chunks} dates={len(writer.dates)} "
+        f"user={user_id} device={device_id} elapsed_ms={(perf_time.perf_counter()-t0)*1000:.1f}"
+    )
+    return UsageReportResponse(status="ok", inserted=writer.accepted)
+
+
 @router.get("/app_detail", response_model=AppDetailResponse)
 def get_app_detail(
     user_id: UUID,
     package_name: str,
     target_date: date,
+    include_sessions: bool = False,
     db: Session = Depends(get_db)
 ):
     day_start = datetime.combine(target_date, time.min, tzinfo=TR_TZ)
     day_end = datetime.combine(target_date, time.max, tzinfo=TR_TZ)
 
-    sessions = (
-        db.query(AppSession)
-        .filter(AppSession.user_id == user_id)
-        .filter(AppSession.package_name == package_name)
-        .filter(AppSession.started_at <= day_end)
-        .filter(AppSession.ended_at >= day_start)
-        .order_by(AppSession.started_at)
-        .all()
-    )
+    night_window = NightWindow.for_user(db, user_id)
+
+    # Kapsanan gün: toplam, gece süresi ve histogram usage_hourly'nin 24 satırından
+    rollup = hourly_usage(db, user_id, package_name, target_date, night_window)
+
+    # Ham oturumlar sadece istenirse ya da gün rollup'ta kapsanmıyorsa (rollup öncesi
+    # geçmiş, gece penceresi değişmiş eski gün) okunur
+    sessions = []
+    if include_sessions or rollup is None:
+        sessions = (
+            db.query(AppSession.started_at, AppSession.ended_at)
+            .filter(AppSession.user_id == user_id)
+            .filter(AppSession.package_name == package_name)
+            .filter(AppSession.started_at <= day_end)
+            .filter(AppSession.ended_at >= day_start)
+            .order_by(AppSession.started_at)
+            .all()
+        )
 
-    hourly = [0.0] * 24
-    total_minutes = 0.0
-    night_minutes = 0.0
+    total_seconds = 0.0
     session_items = []
-
-    bedtime_start = time(22, 0)
-    bedtime_end = time(7, 0)
-    custom = db.query(UserSettings).filter(UserSettings.user_id == user_id).first()
-    if custom and custom.nightly_start:
-        bedtime_start = custom.nightly_start
-    if custom and custom.nightly_end:
-        bedtime_end = custom.nightly_end
-
+    starts, ends = [], []
     for sess in sessions:
         s = max(sess.started_at, day_start)
         e = min(sess.ended_at, day_end)
         if e <= s:
             continue
 
-        duration_min = (e - s).total_seconds() / 60.0
-        total_minutes += duration_min
-        night_minutes += _night_overlap_minutes(s, e, bedtime_start, bedtime_end)
-
-        # Hourly bucket slicing
-        cursor = s
-        while cursor < e:
-            hour_boundary = (cursor.replace(minute=0, second=0, microsecond=0) + timedelta(hours=1))
-            seg_end = min(hour_boundary, e)
-            seg_min = max((seg_end - cursor).total_seconds(), 0) / 60.0
-            hourly[cursor.hour] += seg_min
-            cursor = seg_end
-
-        session_items.append(
-            SessionUsage(
-                started_at=s,
-                ended_at=e,
-                minutes=int(round(duration_min))
+        total_seconds += (e - s).total_seconds()
+        starts.append(s)
+        ends.append(e)
+        if include_sessions:
+            session_items.append(
+                SessionUsage(
+                    started_at=s,
+                    ended_at=e,
+                    minutes=int(round((e - s).total_seconds() / 60.0))
+                )
             )
-        )
 
-    # App adı: katalogdan ya da session payload'dan
-    catalog = db.query(AppCatalog).filter(AppCatalog.package_name == package_name).first()
+    if rollup is not None:
+        hourly_sec, night_seconds = rollup
+        total_minutes = sum(hourly_sec) / 60.0
+        night_minutes = night_seconds / 60.0
+        hourly = [sec / 60.0 for sec in hourly_sec]
+    else:
+        total_minutes = total_seconds / 60.0
+        # Gece süresi pencere kenarları saat başında olmasa da (ör. 21:30-07:15) kesin
+        night_minutes = night_window.overlap_minutes(starts, ends)
+        hourly = [0.0] * 24
+        for s, e in zip(starts, ends):
+            cursor = s.astimezone(TR_TZ)
+            while cursor < e:
+                hour_boundary = (cursor.replace(minute=0, second=0, microsecond=0) + timedelta(hours=1))
+                seg_end = min(hour_boundary, e)
+                seg_min = max((seg_end - cursor).total_seconds(), 0) / 60.0
+                hourly[cursor.hour] += seg_min
+                cursor = seg_end
+
+    # App adı ve kategori: ortak CatalogIndex'ten
+    catalog = catalog_index.get(db, package_name)
 
     # Uygulama adı: katalog öncelikli, yoksa günlük log'a bak, son çare session payload
     app_name = None
@@ -301,14 +288,10 @@ def get_app_detail(
     if not app_name and sessions:
         app_name = getattr(sessions[0], "app_name", None)
 
-    # Kategori: ilişki varsa direkt, yoksa ID'den çek; katalog yoksa günlük log kategorisini kullanma
+    # Kategori: katalogdaki etiket; katalog yoksa günlük log kategorisini kullanma
     category_name = None
-    if catalog and catalog.category:
-        category_name = catalog.category.display_name
-    elif catalog and catalog.category_id:
-        cat = db.query(AppCategory).filter(AppCategory.id == catalog.category_id).first()
-        if cat:
-            category_name = cat.display_name
+    if catalog and catalog.category_key:
+        category_name = catalog.category_label
 
     if not category_name:
         category_name = display_label_for(DEFAULT_CATEGORY_KEY)
@@ -327,7 +310,11 @@ def get_app_detail(
 
 
 @router.get("/dashboard", response_model=DashboardResponse)
-def get_dashboard(user_id: UUID, db: Session = Depends(get_db)):
+def get_dashboard(
+    user_id: UUID,
+    top_n: Optional[int] = Query(None, ge=1, le=100),
+    db: Session = Depends(get_db),
+):
     user = db.query(User).filter(User.id == user_id).first()
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
@@ -336,70 +323,87 @@ def get_dashboard(user_id: UUID, db: Session = Depends(get_db)):
     today = now.date()
     start_date = today - timedelta(days=6)
 
-    # 1. Katalog Bilgilerini Çek (Paket -> Kategori İsmi eşleşmesi için)
-    # Performans için hepsini memory'e alıyoruz (50k satırsa cache mekanizması gerekir ama şimdilik OK)
-    catalog_query = (
-        db.query(AppCatalog.package_name, AppCategory.display_name)
-        .join(AppCategory, AppCatalog.category_id == AppCategory.id)
-        .all()
-    )
-    # Sözlük yap: { "com.instagram": "Sosyal", ... }
-    category_map = {row.package_name: row.display_name for row in catalog_query}
-
-    logs = (
-        db.query(DailyUsageLog)
-        .filter(DailyUsageLog.user_id == user_id)
-        .filter(DailyUsageLog.usage_date >= start_date)
-        .all()
-    )
+    # Önbellek: rapor/kategori değişikliğinde sürüm anahtarı değişir (bkz. dashboard_cache)
+    cached, cache_key = dashboard_cache.lookup(user_id, today, variant=f"top{top_n or 'all'}")
+    if cached is not None:
+        return cached
+
+    # 1. Paket -> Kategori etiketi: süreç genelindeki CatalogIndex (artımlı yenilenir)
+    catalog_index.ensure_fresh(db)
+
+    # 2. Gün/uygulama toplamları ve sıralama SQL'de (top_n verilirse + "Diğer" kovası)
+    breakdown = daily_app_breakdown(db, user_id, start_date, today, top_n=top_n)
 
     daily_map = {}
     for i in range(7):
         d = start_date + timedelta(days=i)
-        daily_map[d] = {'total': 0, 'apps': []}
-
-    for row in logs:
-        d = row.usage_date
-        minutes = row.total_seconds // 60
-        
-        if d in daily_map:
-            daily_map[d]['total'] += minutes
-            
-            existing_app = next((x for x in daily_map[d]['apps'] if x.package_name == row.package_name), None)
-            
-            # Kategoriyi haritadan bul, yoksa varsayılan kategori (Araçlar) de.
-            cat_name = category_map.get(row.package_name, display_label_for(DEFAULT_CATEGORY_KEY))
-
-            if existing_app:
-                existing_app.minutes += minutes
-            else:
-                daily_map[d]['apps'].append(
-                    AppUsageItem(
-                        package_name=row.package_name,
-                        app_name=row.app_name or row.package_name,
-                        minutes=minutes,
-                        category=cat_name # ARTIK KATEGORİ GİDİYOR
-                    )
-                )
-
-    weekly_breakdown = []
-    sorted_dates = sorted(daily_map.keys())
-
-    for d in sorted_dates:
-        data = daily_map[d]
-        sorted_apps = sorted(data['apps'], key=lambda x: x.minutes, reverse=True)
-        weekly_breakdown.append(DailyStat(
-            date=d.isoformat(),
-            total_minutes=data['total'],
-            apps=sorted_apps
-        ))
+        data = breakdown.get(d, {"total": 0, "apps": []})
+        apps = []
+        for item in data["apps"]:
+            if item["package_name"] is None:
+                apps.append(AppUsageItem(
+                    package_name=OTHER_PACKAGE_NAME,
+                    app_name=f"{OTHER_LABEL} ({item['count']})",
+                    minutes=item["minutes"],
+                    category=OTHER_LABEL,
+                ))
+                continue
+            apps.append(AppUsageItem(
+                package_name=item["package_name"],
+                app_name=item["app_name"] or item["package_name"],
+                minutes=item["minutes"],
+                # Kategori CatalogIndex'ten, yoksa varsayılan kategori (Araçlar)
+                category=catalog_index.label_for(db, item["package_name"]),
+            ))
+        daily_map[d] = {'total': data["total"], 'apps': apps}
+
+    weekly_breakdown = [
+        DailyStat(date=d.isoformat(), total_minutes=data['total'], apps=data['apps'])
+        for d, data in sorted(daily_map.items())
+    ]
 
     today_stat_total = daily_map.get(today, {}).get('total', 0)
 
-    return DashboardResponse(
+    response = DashboardResponse(
         user_name=user.full_name or "Kullanıcı",
         today_total_minutes=today_stat_total,
         weekly_breakdown=weekly_breakdown,
         bedtime_start="21:30",
         bedtime_end="07:00"
-    )
\ No newline at end of file
+    )
+    dashboard_cache.store(cache_key, response)
+    return response
+
+
+@router.get("/history", response_model=UsageHistoryResponse)
+def get_usage_history(
+    user_id: UUID,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    granularity: str = Query("day", pattern="^(day|week|month)$"),
+    db: Session = Depends(get_db),
+):
+    user = db.query(User).filter(User.id == user_id).first()
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+
+    end = end_date or datetime.now(TR_TZ).date()
+    start = start_date or end - timedelta(days=29)
+    if start > end:
+        raise HTTPException(status_code=400, detail="start_date must be on or before end_date")
+    span = (end - start).days + 1
+    if span > MAX_RANGE_DAYS[granularity]:
+        raise HTTPException(
+            status_code=400,
+            detail=f"range too long for granularity={granularity} (max {MAX_RANGE_DAYS[granularity]} days)",
+        )
+
+    # Hafta/ay: tam dönemler rollup tablolarından, kırpılan uçlar daily_usage_log'dan
+    points = usage_history(db, user_id, start, end, granularity)
+    return UsageHistoryResponse(
+        start_date=start,
+        end_date=end,
+        granularity=granularity,
+        total_minutes=sum(p["total_minutes"] for p in points),
+        points=[UsagePeriodStat(**p) for p in points],
+    )
@@ -1,3 +1,4 @@
+from datetime import date
 from typing import Dict, List, Optional
 
 from pydantic import BaseModel
@@ -15,6 +16,7 @@ class RiskDetails(BaseModel):
     data_points: Optional[int] = None
     method: Optional[str] = None
     confidence: Optional[float] = None
+    history_end: Optional[str] = None
 
 
 class RiskAnalysis(BaseModel):
@@ -33,11 +35,27 @@ class ProfilePrediction(BaseModel):
     probabilities: Optional[List[ProfileProbability]] = None
 
 
+class ForecastScenario(BaseModel):
+    scenario: str  # 'baseline' | 'reduced'
+    weekly_total: int
+    weekly_lo: Optional[int] = None
+    weekly_hi: Optional[int] = None
+    daily_series: List[int]
+    daily_lo: Optional[List[int]] = None
+    daily_hi: Optional[List[int]] = None
+
+
 class ForecastResponse(BaseModel):
     daily_avg: int
     weekly_total: int
     daily_series: List[int]
     start_weekday: Optional[int] = None
+    # Baseline tahmin aralığı (%10-%90 kantil); batch modelden gelmeyen tahminlerde yok
+    weekly_lo: Optional[int] = None
+    weekly_hi: Optional[int] = None
+    daily_lo: Optional[List[int]] = None
+    daily_hi: Optional[List[int]] = None
+    scenarios: Optional[List[ForecastScenario]] = None
 
 
 class AIDashboardResponse(BaseModel):
@@ -45,3 +63,7 @@ class AIDashboardResponse(BaseModel):
     user_profile: ProfilePrediction
     forecast: ForecastResponse
     suggestions: List[str]
+    # Anlık görüntünün dayandığı son feature_daily günü (mock veride None)
+    as_of: Optional[date] = None
+    # True: daha yeni feature_daily var, arka planda yeniden hesaplanıyor
+    stale: bool = False
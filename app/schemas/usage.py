@@ -66,4 +66,21 @@ class AppDetailResponse(BaseModel):
     total_minutes: int
     night_minutes: int
     hourly: List[HourlyUsage]
-    sessions: List[SessionUsage] = []
\ No newline at end of file
+    sessions: List[SessionUsage] = []
+
+
+# Range history (day / week / month)
+class UsagePeriodStat(BaseModel):
+    period_start: date
+    period_end: date
+    total_minutes: int
+    active_days: int
+    partial: bool = False
+
+
+class UsageHistoryResponse(BaseModel):
+    start_date: date
+    end_date: date
+    granularity: str
+    total_minutes: int
+    points: List[UsagePeriodStat]
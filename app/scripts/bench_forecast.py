@@ -0,0 +1,107 @@
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import date, timedelta
+
+import numpy as np
+
+current_file_path = os.path.abspath(__file__)
+scripts_dir = os.path.dirname(current_file_path)
+app_dir = os.path.dirname(scripts_dir)
+project_root = os.path.dirname(app_dir)
+
+if project_root not in sys.path:
+    sys.path.append(project_root)
+
+from app.services.forecast_backtest import BACKTEST_MODELS, rolling_origins, run_backtest
+
+
+def make_history(users: int, days: int, seed: int) -> np.ndarray:
+    """Sentetik feature_daily: kullanıcıya özel seviye, hafta sonu etkisi, yavaş trend, gürültü ve boş günler."""
+    rng = np.random.default_rng(seed)
+    t = np.arange(days)
+    level = rng.uniform(60, 300, (users, 1))
+    weekend = rng.uniform(1.0, 1.6, (users, 1))
+    trend = rng.normal(0, 0.4, (users, 1))
+    weekday = (t + rng.integers(0, 7, (users, 1))) % 7
+    base = (level + trend * t) * np.where(weekday >= 5, weekend, 1.0)
+    matrix = np.maximum(base * rng.lognormal(0, 0.25, (users, days)), 0).round()
+    matrix[rng.random((users, days)) < 0.08] = np.nan
+    return matrix
+
+
+def fmt(value, pattern="{:.1f}") -> str:
+    return "-" if value is None else pattern.format(value)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Rolling-origin forecast backtest: MAE/MAPE, fit/predict latency and peak memory per model"
+    )
+    parser.add_argument("--users", type=int, default=200, help="Number of users to sample")
+    parser.add_argument("--days", type=int, default=120, help="History window loaded from feature_daily")
+    parser.add_argument("--origins", type=int, default=8, help="Rolling origins (newest first)")
+    parser.add_argument("--step", type=int, default=7, help="Days between origins")
+    parser.add_argument("--models", default=",".join(BACKTEST_MODELS), help="Comma separated models")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Worker processes")
+    parser.add_argument("--no-memory", action="store_true", help="Skip the tracemalloc pass")
+    parser.add_argument("--synthetic", action="store_true", help="Use generated histories instead of the database")
+    parser.add_argument("--seed", type=int, default=42, help="Random seed (--synthetic)")
+    parser.add_argument("--json", dest="json_path", default=None, help="Also write the report as JSON")
+    args = parser.parse_args()
+
+    models = [m for m in args.models.split(",") if m]
+    unknown = set(models) - set(BACKTEST_MODELS)
+    if unknown:
+        print(f"❌ Unknown model(s): {', '.join(sorted(unknown))}")
+        sys.exit(1)
+
+    t0 = time.perf_counter()
+    if args.synthetic:
+        matrix = make_history(args.users, args.days, args.seed)
+        start = date.today() - timedelta(days=args.days)
+    else:
+        from app.db import SessionLocal
+        from app.services.forecast_backtest import load_matrix
+
+        db = SessionLocal()
+        try:
+            matrix, start = load_matrix(db, args.users, args.days)
+        except Exception as e:
+            print(f"❌ Loading feature_daily failed: {e}")
+            sys.exit(1)
+        finally:
+            db.close()
+    load_s = time.perf_counter() - t0
+
+    origins = rolling_origins(matrix.shape[1], args.origins, args.step, models)
+    if len(matrix) == 0 or not origins:
+        print(f"❌ Not enough history: {len(matrix)} users, {matrix.shape[1]} days")
+        sys.exit(1)
+
+    report = run_backtest(matrix, start, origins, models, workers=args.workers, trace_memory=not args.no_memory)
+    first, last = start + timedelta(days=origins[0]), start + timedelta(days=origins[-1])
+    print(f"users={report['users']} origins={report['origins']} ({first} .. {last}) workers={report['workers']} "
+          f"load={load_s:.1f}s backtest={report['wall_seconds']:.1f}s max_rss={report['max_rss_mb']:.0f}MB")
+    print(f"{'model':<10} {'n':>7} {'mae':>8} {'mape%':>7} {'week_mae':>9} "
+          f"{'pred_p50':>9} {'pred_p95':>9} {'pred_p99':>9} {'fit_p50':>9} {'fit_p95':>9} {'peak_kb':>9}")
+    for name, r in report["models"].items():
+        pred, fit = r["predict_ms"] or {}, r["fit_ms"] or {}
+        print(f"{name:<10} {r['n']:>7} {fmt(r['mae']):>8} {fmt(r['mape']):>7} {fmt(r['weekly_mae']):>9} "
+              f"{fmt(pred.get('p50'), '{:.3f}'):>9} {fmt(pred.get('p95'), '{:.3f}'):>9} "
+              f"{fmt(pred.get('p99'), '{:.3f}'):>9} {fmt(fit.get('p50'), '{:.2f}'):>9} "
+              f"{fmt(fit.get('p95'), '{:.2f}'):>9} {fmt(r['peak_kb'], '{:.0f}'):>9}")
+    print("   Süreler ms; predict tek kullanıcılık çağrı, fit origin başına (pooled: tüm kullanıcılar, online: dilim).")
+
+    if args.json_path:
+        report.update({"start": start.isoformat(), "origin_dates": [(start + timedelta(days=t)).isoformat()
+                                                                     for t in origins]})
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"✅ Report -> {args.json_path}")
+
+
+if __name__ == "__main__":
+    main()
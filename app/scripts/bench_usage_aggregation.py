@@ -0,0 +1,76 @@
+import argparse
+import os
+import random
+import sys
+import timeit
+import uuid
+
+current_file_path = os.path.abspath(__file__)
+scripts_dir = os.path.dirname(current_file_path)
+app_dir = os.path.dirname(scripts_dir)
+project_root = os.path.dirname(app_dir)
+
+if project_root not in sys.path:
+    sys.path.append(project_root)
+
+from app.schemas.usage import UsageEvent
+from app.services.ingest import SESSION_SOURCE, TR_TZ, aggregate_events_loop
+from app.services.usage_aggregation import aggregate_events_vectorized
+
+PACKAGES = [f"com.example.app{i}" for i in range(80)]
+
+
+def make_events(count: int, days: int, seed: int) -> list[UsageEvent]:
+    """Cihaz benzeri rastgele olaylar: çoğu kısa, bir kısmı gece yarısını aşan uzun oturumlar."""
+    rnd = random.Random(seed)
+    base_ms = 1_735_689_600_000  # 2025-01-01T00:00:00Z
+    events = []
+    for _ in range(count):
+        start = base_ms + rnd.randrange(days * 86_400_000)
+        if rnd.random() < 0.05:
+            duration = rnd.randrange(1_800_000, 3 * 3_600_000)
+        else:
+            duration = int(rnd.lognormvariate(11.5, 1.2))
+        if rnd.random() < 0.01:
+            duration = -rnd.randrange(1, 60_000)  # bozuk olay: atlanmalı
+        pkg = rnd.choice(PACKAGES)
+        events.append(UsageEvent(
+            package_name=pkg,
+            app_name=None if rnd.random() < 0.2 else pkg.rsplit(".", 1)[-1].title(),
+            timestamp_start=start,
+            timestamp_end=start + duration,
+            duration_seconds=max(duration // 1000, 0),
+        ))
+    return events
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark usage aggregation: per-event loop vs NumPy")
+    parser.add_argument("--sizes", default="100,1000,10000,50000", help="Comma separated event counts")
+    parser.add_argument("--days", type=int, default=7, help="Days covered by the synthetic backlog")
+    parser.add_argument("--repeat", type=int, default=5, help="Timing repetitions (best is reported)")
+    parser.add_argument("--seed", type=int, default=42, help="Random seed")
+    args = parser.parse_args()
+
+    user_id, device_id = uuid.uuid4(), uuid.uuid4()
+    print(f"{'events':>8} {'loop_ms':>10} {'numpy_ms':>10} {'speedup':>8}  match")
+    for size in [int(s) for s in args.sizes.split(",") if s]:
+        events = make_events(size, args.days, args.seed)
+
+        expected = aggregate_events_loop(user_id, device_id, events)
+        actual = aggregate_events_vectorized(user_id, device_id, events, TR_TZ, SESSION_SOURCE)
+        # dict eşitliği + anahtar sırası (satırlar bu sırayla yazılıyor)
+        match = expected == actual and list(expected[1]) == list(actual[1])
+
+        loop_s = min(timeit.repeat(
+            lambda: aggregate_events_loop(user_id, device_id, events), number=1, repeat=args.repeat))
+        vec_s = min(timeit.repeat(
+            lambda: aggregate_events_vectorized(user_id, device_id, events, TR_TZ, SESSION_SOURCE),
+            number=1, repeat=args.repeat))
+        print(f"{size:>8} {loop_s * 1000:>10.2f} {vec_s * 1000:>10.2f} {loop_s / vec_s:>7.1f}x  {'OK' if match else 'MISMATCH'}")
+        if not match:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
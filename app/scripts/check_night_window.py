@@ -0,0 +1,111 @@
+import argparse
+import os
+import random
+import sys
+from datetime import datetime, time, timedelta, timezone
+
+current_file_path = os.path.abspath(__file__)
+scripts_dir = os.path.dirname(current_file_path)
+app_dir = os.path.dirname(scripts_dir)
+project_root = os.path.dirname(app_dir)
+
+if project_root not in sys.path:
+    sys.path.append(project_root)
+
+from app.services.night_window import NightWindow
+
+TR_TZ = timezone(timedelta(hours=3))
+
+
+def _interval_overlap_minutes(a_start, a_end, b_start, b_end) -> float:
+    if a_end <= b_start or a_start >= b_end:
+        return 0.0
+    overlap_start = max(a_start, b_start)
+    overlap_end = min(a_end, b_end)
+    return max((overlap_end - overlap_start).total_seconds(), 0) / 60.0
+
+
+def reference_overlap_minutes(start_dt, end_dt, win_start_t, win_end_t) -> float:
+    """Eski gün gün yürüyen hesap (analytics/usage router'daki kopyaların aynısı)."""
+    minutes = 0.0
+    cursor = start_dt
+    while cursor < end_dt:
+        day_end = datetime.combine(cursor.date(), time.max, tzinfo=cursor.tzinfo)
+        seg_end = min(day_end, end_dt)
+
+        if win_start_t > win_end_t:
+            win1_start = datetime.combine(cursor.date(), win_start_t, tzinfo=cursor.tzinfo)
+            win1_end = datetime.combine(cursor.date(), time.max, tzinfo=cursor.tzinfo)
+            win2_start = datetime.combine(cursor.date(), time.min, tzinfo=cursor.tzinfo)
+            win2_end = datetime.combine(cursor.date(), win_end_t, tzinfo=cursor.tzinfo)
+            minutes += _interval_overlap_minutes(cursor, seg_end, win1_start, win1_end)
+            minutes += _interval_overlap_minutes(cursor, seg_end, win2_start, win2_end)
+        else:
+            win_start = datetime.combine(cursor.date(), win_start_t, tzinfo=cursor.tzinfo)
+            win_end = datetime.combine(cursor.date(), win_end_t, tzinfo=cursor.tzinfo)
+            minutes += _interval_overlap_minutes(cursor, seg_end, win_start, win_end)
+
+        cursor = seg_end + timedelta(seconds=1)
+    return minutes
+
+
+def random_time(rnd: random.Random) -> time:
+    if rnd.random() < 0.2:
+        return rnd.choice([time(0, 0), time(23, 59), time(22, 0), time(7, 0), time(12, 0)])
+    return time(rnd.randrange(24), rnd.randrange(60))
+
+
+def random_session(rnd: random.Random, base: datetime):
+    start = base + timedelta(microseconds=rnd.randrange(14 * 86_400 * 1_000_000))
+    if rnd.random() < 0.1:
+        # gece yarısına çok yakın başlangıçlar (1 sn boşluk davranışı)
+        start = start.replace(hour=23, minute=59, second=59, microsecond=rnd.randrange(1_000_000))
+    kind = rnd.random()
+    if kind < 0.05:
+        duration = timedelta(0)
+    elif kind < 0.1:
+        duration = -timedelta(seconds=rnd.randrange(1, 3600))
+    elif kind < 0.3:
+        duration = timedelta(hours=rnd.uniform(6, 60))
+    else:
+        duration = timedelta(seconds=rnd.uniform(0.001, 4 * 3600))
+    return start, start + duration
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Randomized check: NightWindow vs the legacy day-by-day overlap loop")
+    parser.add_argument("--cases", type=int, default=2000, help="Random windows to try")
+    parser.add_argument("--sessions", type=int, default=50, help="Sessions per window")
+    parser.add_argument("--seed", type=int, default=7, help="Random seed")
+    args = parser.parse_args()
+
+    rnd = random.Random(args.seed)
+    base = datetime(2025, 1, 1, tzinfo=TR_TZ)
+    mismatches = 0
+    for case in range(args.cases):
+        win_start, win_end = random_time(rnd), random_time(rnd)
+        window = NightWindow.from_times(win_start, win_end)
+        sessions = [random_session(rnd, base) for _ in range(args.sessions)]
+        starts = [s for s, _ in sessions]
+        ends = [e for _, e in sessions]
+
+        per_session = window.overlap_seconds(starts, ends) / 60.0
+        for (s, e), got in zip(sessions, per_session):
+            expected = reference_overlap_minutes(s, e, win_start, win_end)
+            if abs(expected - got) > 1e-6:
+                mismatches += 1
+                print(f"MISMATCH case={case} window={win_start}-{win_end} session={s}..{e} "
+                      f"expected={expected} got={got}")
+
+        total = sum(reference_overlap_minutes(s, e, win_start, win_end) for s, e in sessions)
+        if abs(total - window.overlap_minutes(starts, ends)) > 1e-6:
+            mismatches += 1
+            print(f"MISMATCH case={case} total")
+
+    checked = args.cases * args.sessions
+    print(f"{checked} sessions checked, {mismatches} mismatches")
+    sys.exit(1 if mismatches else 0)
+
+
+if __name__ == "__main__":
+    main()
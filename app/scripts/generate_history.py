@@ -14,9 +14,12 @@ if project_root not in sys.path:
     sys.path.append(project_root)
 
 from app.db import SessionLocal
-from app.models.core import AppSession, AppCatalog, DailyUsageLog, User, Device
-from app.services.categorizer import get_or_create_app_entry
-from app.services.analytics import calculate_daily_features
+from app.models.core import DailyUsageLog, User, Device
+from app.services.bulk_loader import copy_daily_usage, copy_sessions
+from app.services.categorizer import get_or_create_app_entries
+from app.services.feature_batch import rebuild_features
+from app.services.hourly_rollup import rebuild_hourly
+from app.services.period_rollup import rebuild_usage_periods
 
 
 # Default gün sayısı (bugün dahil)
@@ -246,16 +249,15 @@ def create_mock_history(user_uuid_str: str, device_uuid_str: str, label: str, st
                 ts_end = ts_start + timedelta(seconds=duration_sec)
 
                 # 1. SESSION Ekle
-                session = AppSession(
-                    user_id=user_uuid,
-                    device_id=device_uuid,
-                    package_name=pkg,
-                    started_at=ts_start,
-                    ended_at=ts_end,
-                    source="mock_script",
-                    payload={"mock": True}
-                )
-                session_batch.append(session)
+                session_batch.append({
+                    "user_id": user_uuid,
+                    "device_id": device_uuid,
+                    "package_name": pkg,
+                    "started_at": ts_start,
+                    "ended_at": ts_end,
+                    "source": "mock_script",
+                    "payload": {"mock": True},
+                })
 
                 # 2. Günlük Toplamı Hesapla (DailyUsageLog için)
                 if pkg in daily_stats:
@@ -273,55 +275,52 @@ def create_mock_history(user_uuid_str: str, device_uuid_str: str, label: str, st
                 binge_start = datetime.strptime(f"{day_str} {binge_hour}:{binge_minute}", "%Y-%m-%d %H:%M")
                 binge_end = binge_start + timedelta(seconds=binge_sec)
 
-                session = AppSession(
-                    user_id=user_uuid,
-                    device_id=device_uuid,
-                    package_name=binge_pkg,
-                    started_at=binge_start,
-                    ended_at=binge_end,
-                    source="mock_script",
-                    payload={"mock": True, "binge": True}
-                )
-                session_batch.append(session)
+                session_batch.append({
+                    "user_id": user_uuid,
+                    "device_id": device_uuid,
+                    "package_name": binge_pkg,
+                    "started_at": binge_start,
+                    "ended_at": binge_end,
+                    "source": "mock_script",
+                    "payload": {"mock": True, "binge": True},
+                })
                 daily_stats[binge_pkg] = daily_stats.get(binge_pkg, 0) + binge_sec
 
             # Gün bitti, o günün DailyUsageLog kayıtlarını oluştur
             for pkg, total_sec in daily_stats.items():
                 app_name = get_app_name_guess(pkg)
                 
-                log_entry = DailyUsageLog(
-                    user_id=user_uuid,
-                    device_id=device_uuid,
-                    usage_date=day_date_obj, # Date objesi
-                    package_name=pkg,
-                    app_name=app_name,
-                    total_seconds=total_sec,
-                    updated_at=datetime.utcnow()
-                )
-                daily_log_batch.append(log_entry)
+                daily_log_batch.append({
+                    "user_id": user_uuid,
+                    "device_id": device_uuid,
+                    "usage_date": day_date_obj, # Date objesi
+                    "package_name": pkg,
+                    "app_name": app_name,
+                    "total_seconds": total_sec,
+                    "updated_at": datetime.utcnow(),
+                })
 
             current_day += timedelta(days=1)
 
         # Toplu Kayıt İşlemi
         print(f"💾 {len(session_batch)} Session ve {len(daily_log_batch)} Günlük Log kaydediliyor...")
         
-        db.bulk_save_objects(session_batch)
-        db.bulk_save_objects(daily_log_batch)
+        # COPY + staging tablosu; yeniden çalıştırmada çakışan session'lar atlanır
+        copy_sessions(db, session_batch)
+        copy_daily_usage(db, daily_log_batch)
+        # COPY yolu ingest'i atladığı için saatlik rollup aralık bazında yeniden üretilir
+        rebuild_hourly(db, start_date.date(), end_date.date(), user_ids=[user_uuid])
+        rebuild_usage_periods(db, start_date.date(), end_date.date(), user_ids=[user_uuid])
         
         # Katalog Güncelleme (AppCatalog)
         print("📚 Katalog kontrol ediliyor...")
-        for pkg in ALL_PACKAGES:
-            get_or_create_app_entry(db, pkg)
+        get_or_create_app_entries(db, ALL_PACKAGES)
 
         db.commit()
 
         # FeatureDaily yeniden hesapla ki kategoriler doğru yansısın
         print("🧮 FeatureDaily yeniden hesaplanıyor...")
-        day_ptr = start_date.date()
-        end_day = end_date.date()
-        while day_ptr <= end_day:
-            calculate_daily_features(str(user_uuid), day_ptr, db)
-            day_ptr += timedelta(days=1)
+        rebuild_features(db, start_date.date(), end_date.date(), user_ids=[user_uuid])
         print(f"✅ {label} tamamlandı! Dashboard dolu olmalı.")
 
     except Exception as e:
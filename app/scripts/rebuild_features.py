@@ -0,0 +1,49 @@
+import argparse
+import os
+import sys
+import time
+import uuid
+from datetime import date, datetime, timedelta
+
+current_file_path = os.path.abspath(__file__)
+scripts_dir = os.path.dirname(current_file_path)
+app_dir = os.path.dirname(scripts_dir)
+project_root = os.path.dirname(app_dir)
+
+if project_root not in sys.path:
+    sys.path.append(project_root)
+
+from app.db import SessionLocal
+from app.services.feature_batch import rebuild_features
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Rebuild feature_daily with the set-based SQL engine (e.g. after a catalog or rule change)"
+    )
+    parser.add_argument("--days", type=int, default=30, help="Days back from --end (inclusive)")
+    parser.add_argument("--end", type=str, default=None, help="Last date YYYY-MM-DD (default: today)")
+    parser.add_argument("--user", action="append", default=None, help="Limit to user id (repeatable)")
+    parser.add_argument("--users-per-batch", type=int, default=500, help="Users per transaction")
+    args = parser.parse_args()
+
+    end = datetime.strptime(args.end, "%Y-%m-%d").date() if args.end else date.today()
+    start = end - timedelta(days=max(args.days, 1) - 1)
+    user_ids = [uuid.UUID(u) for u in args.user] if args.user else None
+
+    db = SessionLocal()
+    try:
+        t0 = time.perf_counter()
+        written = rebuild_features(db, start, end, user_ids=user_ids, users_per_batch=args.users_per_batch)
+        elapsed = time.perf_counter() - t0
+        print(f"✅ feature_daily rebuilt {start}..{end}: {written} rows in {elapsed:.1f}s")
+    except Exception as e:
+        db.rollback()
+        print(f"❌ Rebuild failed: {e}")
+        sys.exit(1)
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
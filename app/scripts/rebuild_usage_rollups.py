@@ -0,0 +1,55 @@
+import argparse
+import os
+import sys
+import time
+import uuid
+from datetime import date, datetime, timedelta
+
+current_file_path = os.path.abspath(__file__)
+scripts_dir = os.path.dirname(current_file_path)
+app_dir = os.path.dirname(scripts_dir)
+project_root = os.path.dirname(app_dir)
+
+if project_root not in sys.path:
+    sys.path.append(project_root)
+
+from app.db import SessionLocal
+from app.services.hourly_rollup import rebuild_hourly
+from app.services.period_rollup import rebuild_usage_periods
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Backfill usage_hourly / usage_weekly / usage_monthly from raw tables"
+    )
+    parser.add_argument("--days", type=int, default=365, help="Days back from --end (inclusive)")
+    parser.add_argument("--end", type=str, default=None, help="Last date YYYY-MM-DD (default: today)")
+    parser.add_argument("--user", action="append", default=None, help="Limit to user id (repeatable)")
+    parser.add_argument("--skip-hourly", action="store_true", help="Only rebuild weekly/monthly rollups")
+    args = parser.parse_args()
+
+    end = datetime.strptime(args.end, "%Y-%m-%d").date() if args.end else date.today()
+    start = end - timedelta(days=max(args.days, 1) - 1)
+    user_ids = [uuid.UUID(u) for u in args.user] if args.user else None
+
+    db = SessionLocal()
+    try:
+        t0 = time.perf_counter()
+        if not args.skip_hourly:
+            hourly = rebuild_hourly(db, start, end, user_ids=user_ids)
+            print(f"   usage_hourly: {hourly} rows")
+        periods = rebuild_usage_periods(db, start, end, user_ids=user_ids)
+        print(f"   usage_weekly + usage_monthly: {periods} rows")
+        db.commit()
+        elapsed = time.perf_counter() - t0
+        print(f"✅ Rollups rebuilt {start}..{end} in {elapsed:.1f}s")
+    except Exception as e:
+        db.rollback()
+        print(f"❌ Rebuild failed: {e}")
+        sys.exit(1)
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+import argparse
+import os
+import sys
+import time
+import uuid
+
+current_file_path = os.path.abspath(__file__)
+scripts_dir = os.path.dirname(current_file_path)
+app_dir = os.path.dirname(scripts_dir)
+project_root = os.path.dirname(app_dir)
+
+if project_root not in sys.path:
+    sys.path.append(project_root)
+
+from app.db import SessionLocal
+from app.services.forecasting import SCENARIOS, current_model, forecast_users
+from app.services.model_registry import model_registry
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Precompute weekly_forecast (baseline + reduced, with quantile bands) for all users"
+    )
+    parser.add_argument("--user", action="append", default=None, help="Limit to user id (repeatable)")
+    args = parser.parse_args()
+
+    user_ids = [uuid.UUID(u) for u in args.user] if args.user else None
+    model_registry.load_forecast()
+
+    db = SessionLocal()
+    try:
+        t0 = time.perf_counter()
+        written = forecast_users(db, user_ids=user_ids)
+        db.commit()
+        elapsed = time.perf_counter() - t0
+        print(f"✅ weekly_forecast: {written} users x {len(SCENARIOS)} scenarios ({current_model().key}) in {elapsed:.1f}s")
+    except Exception as e:
+        db.rollback()
+        print(f"❌ Forecast failed: {e}")
+        sys.exit(1)
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
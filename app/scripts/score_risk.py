@@ -0,0 +1,46 @@
+import argparse
+import os
+import sys
+import time
+import uuid
+from datetime import date
+
+current_file_path = os.path.abspath(__file__)
+scripts_dir = os.path.dirname(current_file_path)
+app_dir = os.path.dirname(scripts_dir)
+project_root = os.path.dirname(app_dir)
+
+if project_root not in sys.path:
+    sys.path.append(project_root)
+
+from app.db import SessionLocal
+from app.services.risk_scoring import RISK_MODEL_KEY, score_users
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Score rule_v1 risk for all active users (one query, vectorized score, one bulk upsert)"
+    )
+    parser.add_argument("--user", action="append", default=None, help="Limit to user id (repeatable)")
+    parser.add_argument("--as-of", type=date.fromisoformat, default=None, help="as_of_date (YYYY-MM-DD), default today")
+    args = parser.parse_args()
+
+    user_ids = [uuid.UUID(u) for u in args.user] if args.user else None
+
+    db = SessionLocal()
+    try:
+        t0 = time.perf_counter()
+        written = score_users(db, user_ids=user_ids, as_of=args.as_of)
+        db.commit()
+        elapsed = time.perf_counter() - t0
+        print(f"✅ risk_assessment: {written} users ({RISK_MODEL_KEY}) in {elapsed:.1f}s")
+    except Exception as e:
+        db.rollback()
+        print(f"❌ Risk scoring failed: {e}")
+        sys.exit(1)
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
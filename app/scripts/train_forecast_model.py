@@ -0,0 +1,45 @@
+import argparse
+import os
+import sys
+import time
+
+current_file_path = os.path.abspath(__file__)
+scripts_dir = os.path.dirname(current_file_path)
+app_dir = os.path.dirname(scripts_dir)
+project_root = os.path.dirname(app_dir)
+
+if project_root not in sys.path:
+    sys.path.append(project_root)
+
+from app.db import SessionLocal
+from app.services.forecasting import FORECAST_MODEL_DIR, save_pooled_model, train_pooled_model
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Train the pooled (cross-user) ridge forecast model and write forecast.json"
+    )
+    parser.add_argument("--days", type=int, default=180, help="Training window in days")
+    parser.add_argument("--ridge", type=float, default=1.0, help="L2 penalty")
+    parser.add_argument("--out-dir", type=str, default=FORECAST_MODEL_DIR, help="Artifact directory")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        t0 = time.perf_counter()
+        _, metadata = train_pooled_model(db, days=args.days, ridge=args.ridge)
+        path = save_pooled_model(metadata, args.out_dir)
+        elapsed = time.perf_counter() - t0
+    except Exception as e:
+        print(f"❌ Training failed: {e}")
+        sys.exit(1)
+    finally:
+        db.close()
+
+    print(f"✅ forecast {metadata['version']} -> {path} ({elapsed:.1f}s)")
+    print(f"   users={metadata['users']} samples={metadata['samples']}")
+    print("   Kullanmak için FORECAST_MODEL=pooled ayarlayıp sunucuyu yeniden başlatın.")
+
+
+if __name__ == "__main__":
+    main()
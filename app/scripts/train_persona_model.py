@@ -0,0 +1,55 @@
+import argparse
+import os
+import sys
+import time
+
+current_file_path = os.path.abspath(__file__)
+scripts_dir = os.path.dirname(current_file_path)
+app_dir = os.path.dirname(scripts_dir)
+project_root = os.path.dirname(app_dir)
+
+if project_root not in sys.path:
+    sys.path.append(project_root)
+
+import numpy as np
+
+from app.services.persona_model import (
+    PERSONA_MODEL_DIR,
+    PERSONA_TRAIN_PATH,
+    CompiledForest,
+    load_training_rows,
+    save_artifact,
+    train_persona_model,
+)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train the persona classifier and write a versioned artifact")
+    parser.add_argument("--data", type=str, default=PERSONA_TRAIN_PATH, help="Training CSV path")
+    parser.add_argument("--out-dir", type=str, default=PERSONA_MODEL_DIR, help="Artifact directory")
+    args = parser.parse_args()
+
+    try:
+        t0 = time.perf_counter()
+        model, metadata = train_persona_model(args.data)
+
+        # Sunucunun kullandığı düz ağaç formu sklearn ile birebir aynı olmalı
+        _, X = load_training_rows(args.data)
+        diff = float(np.abs(CompiledForest(model).predict_proba(X) - model.predict_proba(X)).max())
+        if diff > 1e-9:
+            raise ValueError(f"compiled predictor mismatch: max |Δp| = {diff}")
+
+        path = save_artifact(model, metadata, args.out_dir)
+        elapsed = time.perf_counter() - t0
+    except Exception as e:
+        print(f"❌ Training failed: {e}")
+        sys.exit(1)
+
+    print(f"✅ persona {metadata['version']} -> {path} ({elapsed:.1f}s)")
+    print(f"   rows={metadata['training_rows']} classes={len(metadata['classes'])} "
+          f"train_accuracy={metadata['train_accuracy']} compiled_max_diff={diff:.1e}")
+    print("   Sunucu açılışta yeni sürümü yükler (yeniden başlatın).")
+
+
+if __name__ == "__main__":
+    main()
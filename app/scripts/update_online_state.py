@@ -0,0 +1,52 @@
+import argparse
+import os
+import sys
+import time
+import uuid
+
+current_file_path = os.path.abspath(__file__)
+scripts_dir = os.path.dirname(current_file_path)
+app_dir = os.path.dirname(scripts_dir)
+project_root = os.path.dirname(app_dir)
+
+if project_root not in sys.path:
+    sys.path.append(project_root)
+
+from app.db import SessionLocal
+from app.services.online_state import ONLINE_MODEL_KEY, ONLINE_STATE_REPLAY_DAYS, advance_states
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Advance per-user online model state (ai_model_state) with newly finalized feature_daily days"
+    )
+    parser.add_argument("--user", action="append", default=None, help="Limit to user id (repeatable)")
+    parser.add_argument(
+        "--rebuild",
+        action="store_true",
+        help=f"Discard existing state and replay the last {ONLINE_STATE_REPLAY_DAYS} days",
+    )
+    args = parser.parse_args()
+
+    user_ids = [uuid.UUID(u) for u in args.user] if args.user else None
+
+    db = SessionLocal()
+    try:
+        t0 = time.perf_counter()
+        result = advance_states(db, user_ids=user_ids, rebuild=args.rebuild)
+        db.commit()
+        elapsed = time.perf_counter() - t0
+        print(
+            f"✅ ai_model_state ({ONLINE_MODEL_KEY}): {result['users']} users, "
+            f"{result['days']} days applied in {elapsed:.1f}s"
+        )
+    except Exception as e:
+        db.rollback()
+        print(f"❌ Online state update failed: {e}")
+        sys.exit(1)
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
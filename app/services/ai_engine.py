@@ -1,15 +1,53 @@
 # app/services/ai_engine.py
+import asyncio
 import os
 import random
+from bisect import bisect_right
 from datetime import date, timedelta
 from statistics import mean
-from typing import Dict, List, Tuple
-import csv
+from typing import Dict, List, Optional, Tuple
 
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 
 from app.models.core import FeatureDaily, UserSettings
-from app.models.risk import RiskAssessment, RiskDimension, RiskLevel
+from app.services.ai_pool import ai_pool, forecast_part, predict_persona
+from app.services.ai_snapshot import HISTORY_WINDOW_DAYS, persist_profile
+from app.services.forecasting import (
+    BASELINE_SCENARIO,
+    LOAD_DAYS,
+    TREND_MODEL_KEY,
+    band_fields,
+    build_forecasts,
+    cached_forecast,
+    current_model,
+    forecast_scenarios,
+    history_signature,
+    persist_forecasts,
+    result_payload,
+    trend_series,
+)
+from app.services.feature_history import FeatureHistory, masked_mean
+from app.services.model_registry import model_registry
+from app.services.online_state import (
+    ONLINE_MODEL_KEY,
+    ONLINE_MODELS_ENABLED,
+    OnlineState,
+    apply_pending,
+    forecast_from_state,
+    load_state,
+    persona_features,
+    settled_before,
+)
+from app.services.persona_model import predict_profile
+from app.services.risk_scoring import (
+    RISK_WINDOW_DAYS,
+    no_data_result,
+    persist_risks,
+    persisted_risk,
+    score_history,
+)
+
 
 class AIEngine:
     def __init__(self, db: Session, user_id: str):
@@ -17,6 +55,10 @@ class AIEngine:
         self.user_id = user_id
         self.has_data = True
         self.settings = self._load_user_settings()
+        # allow_mock -> (en geniş pencere, mock mu); istek başına tek feature_daily sorgusu
+        self._history_cache: Dict[bool, Tuple[FeatureHistory, bool]] = {}
+        # ONLINE_MODELS_ENABLED: geçmişle birlikte okunan artımlı model durumu
+        self._online_state: Optional[OnlineState] = None
 
     def _get_mock_data_if_needed(self):
         """
@@ -27,290 +69,333 @@ class AIEngine:
         #       Rastgele FeatureDaily objeleri (High risk, Low risk vb.) üretip self.history'ye ata.
         pass
 
-    def calculate_risk_score(self, allow_mock: bool = True) -> Dict:
+    def build_dashboard(self, allow_mock: bool = True, use_persisted: bool = True) -> Dict:
+        """
+        Risk + profil + tahmin + öneriler; gerçek veride her parça kalıcı yazılır.
+        `as_of`: girdi geçmişinin son günü (mock veride None).
+        """
+        risk = self.calculate_risk_score(allow_mock=allow_mock, use_persisted=use_persisted)
+        profile = self.determine_profile(allow_mock=allow_mock)
+        forecast = self.predict_next_week(allow_mock=allow_mock)
+        history, using_mock = self._get_history(days=HISTORY_WINDOW_DAYS, allow_mock=allow_mock)
+        return {
+            "risk_analysis": risk,
+            "user_profile": profile,
+            "forecast": forecast,
+            "suggestions": self.get_smart_recommendations(risk["level"], profile["label"]),
+            "as_of": history.date_list()[-1] if history and not using_mock else None,
+            "stale": False,
+        }
+
+    async def build_dashboard_async(self, allow_mock: bool = True) -> Dict:
+        """
+        build_dashboard'un eşzamanlı hali. Geçmiş bir kez yüklenir; risk, profil
+        ve tahmin `ai_pool` süreçlerinde birlikte koşar (parça başına zaman aşımı).
+        Kayıtlı tahmin girdi imzasını tutuyorsa tahmin havuza hiç gitmez; aksi halde
+        havuz bantlı `build_forecasts` satırlarını döner ve bunlar aynen yazılır.
+        Süresi aşan parça kural tabanlı profile / trend tahminine / süreç içi
+        riske düşer. DB okuma-yazmaları event loop dışında (thread havuzunda).
+        """
+        today = date.today()
+        history, using_mock = await run_in_threadpool(self._get_history, HISTORY_WINDOW_DAYS, allow_mock)
+        if not history:
+            return await run_in_threadpool(self.build_dashboard, allow_mock)
+
+        settings = self.settings
+        risk_history = history.last_days(RISK_WINDOW_DAYS, today)
+        risk_args = (risk_history, settings.daily_limit_minutes, settings.weekend_relax_pct, today)
+        if risk_history:
+            risk_job = ai_pool.run("risk", score_history, *risk_args, fallback=lambda: score_history(*risk_args))
+        else:
+            # Risk penceresi boş: 'Veri Yok' işaretçisi, history_end = yüklenen son gün
+            risk_job = asyncio.sleep(0, result=no_data_result(history.date_list()[-1]))
+        profile_features = self._aggregate_profile_features(history)
+        dates = history.date_list()
+
+        # Kayıtlı tahmin girdi imzasını tutuyorsa model hiç çalışmaz
+        online = self._fresh_online_state(history)
+        model_key = ONLINE_MODEL_KEY if online is not None else current_model().key
+        cached = None if using_mock else await run_in_threadpool(self._cached_forecast, history, model_key)
+        if cached is not None or online is not None:
+            # Online durumda tahmin kapalı formdur; havuza gerek yok
+            forecast_job = asyncio.sleep(0, result=None)
+        else:
+            # Havuz build_forecasts satırlarını (baseline + reduced, bantlarıyla) döner; aynen yazılır
+            forecast_history, _ = self._get_history(LOAD_DAYS, allow_mock)
+            forecast_job = ai_pool.run(
+                "forecast", forecast_part, *self._forecast_inputs(forecast_history), today, fallback=lambda: None
+            )
+
+        risk, persona, forecast_rows = await asyncio.gather(
+            risk_job,
+            ai_pool.run("profile", predict_persona, profile_features, fallback=lambda: None),
+            forecast_job,
+        )
+        profile, profile_key = persona or (self._determine_profile_rule(history), "rule")
+
+        to_persist: List[Dict] = []
+        if cached is not None:
+            series, bands = cached
+        elif online is not None:
+            series, start_date = forecast_from_state(online)
+            bands = {}
+            if series:
+                to_persist = [self._forecast_row(history, series, start_date, ONLINE_MODEL_KEY)]
+        elif forecast_rows:
+            series, bands = self._forecast_from_rows(forecast_rows)
+            to_persist = forecast_rows
+        else:
+            series, bands = [], {}
+        if not series and cached is None:
+            series = self._forecast_with_trend(history)
+            # Model yetersiz veri dedi (zaman aşımı değil): trend tahmini işaretçi olarak yazılır
+            if forecast_rows is not None or online is not None:
+                start_date = dates[-1] + timedelta(days=1)
+                to_persist = [self._forecast_row(history, series, start_date, TREND_MODEL_KEY)]
+
+        if not using_mock:
+            def persist():
+                self._persist_risk(risk["score"], risk["level"], risk["details"])
+                self._persist_profile(profile, profile_key, history)
+                if to_persist:
+                    persist_forecasts(self.db, today, to_persist)
+                    self.db.commit()
+
+            await run_in_threadpool(persist)
+
+        return {
+            "risk_analysis": risk,
+            "user_profile": profile,
+            "forecast": {**self._forecast_response(history, series), **bands},
+            "suggestions": self.get_smart_recommendations(risk["level"], profile["label"]),
+            "as_of": dates[-1] if not using_mock else None,
+            "stale": False,
+        }
+
+    def calculate_risk_score(self, allow_mock: bool = True, use_persisted: bool = True) -> Dict:
         """
         Kullanıcının dijital bağımlılık riskini hesaplar.
         Çıktı: 0-100 arası skor ve 'Düşük/Orta/Yüksek' etiketi.
         """
-        history, using_mock = self._get_history(days=14, allow_mock=allow_mock)
+        # Gece batch'i (veya bugünkü önceki istek) yazdıysa kayıtlı satır döner
+        today = date.today()
+        persisted = persisted_risk(self.db, self.user_id, today) if use_persisted else None
+        if persisted:
+            return persisted
+
+        history, using_mock = self._get_history(days=RISK_WINDOW_DAYS, allow_mock=allow_mock)
         settings = self.settings
 
         if not history:
+            # Daha geniş pencerede veri varsa işaretçi yaz: anlık görüntü o güne kadar taze sayılır
+            window, window_mock = self._get_history(days=HISTORY_WINDOW_DAYS, allow_mock=allow_mock)
             self.has_data = False
-            return {"score": 0, "level": "Veri Yok", "details": {}}
-
-        # Ağırlıklar (toplam 1.0)
-        W_NIGHT = 0.40
-        W_LIMIT = 0.30
-        W_MIX = 0.20
-        W_WEEKEND = 0.10
-
-        # 1) Gece kullanımı: 60 dk ve üstü tam risk kabul edildi
-        night_avg = mean([h.night_minutes for h in history])
-        night_score = min(100, int(round((night_avg / 60) * 100)))
-
-        # 2) Günlük limit aşımı: limit yoksa nötr 50 ver; hafta sonu/tatil gevşeme payı ekle
-        limit_score = self._compute_limit_score(
-            history,
-            settings.daily_limit_minutes,
-            settings.weekend_relax_pct or 0,
-        )
+            if not window or window_mock:
+                return no_data_result()
+            result = no_data_result(window.date_list()[-1])
+            self._persist_risk(result["score"], result["level"], result["details"])
+            return result
 
-        # 3) Kategori dağılımı: oyun + sosyal oranı
-        mix_avg = mean([(float(h.gaming_ratio or 0) + float(h.social_ratio or 0)) for h in history])
-        total_avg = mean([h.total_minutes for h in history])
-        mix_score = min(100, int(round(mix_avg * 100)))
-
-        # 4) Hafta sonu/tatil aşırı yükü: hafta içi ortalamaya göre fark
-        weekend_vals = [h.total_minutes for h in history if h.weekend or h.is_holiday]
-        weekday_vals = [h.total_minutes for h in history if not h.weekend and not h.is_holiday]
-        if weekday_vals:
-            weekend_penalty = max(
-                (mean(weekend_vals) - mean(weekday_vals)) / max(mean(weekday_vals), 1),
-                0,
-            ) if weekend_vals else 0
-        else:
-            weekend_penalty = 0
-        weekend_score = min(100, int(round(weekend_penalty * 100)))
-
-        composite = (
-            W_NIGHT * night_score
-            + W_LIMIT * limit_score
-            + W_MIX * mix_score
-            + W_WEEKEND * weekend_score
-        )
-        score = int(round(composite))
-        level = self._map_level(score)
-
-        confidence = min(len(history) / 14.0, 1.0)
-
-        details = {
-            "night_minutes_avg": round(night_avg, 1),
-            "night_score": night_score,
-            "total_minutes_avg": round(total_avg, 1),
-            "limit_score": limit_score,
-            "mix_ratio_avg": round(mix_avg, 2),
-            "mix_score": mix_score,
-            "weekend_score": weekend_score,
-            "weekend_relax_pct": settings.weekend_relax_pct,
-            "data_points": len(history),
-            "method": "rule",
-            "confidence": round(confidence, 2),
-        }
+        # Batch ile aynı vektörel rule_v1 (tek satırlık matris)
+        result = score_history(history, settings.daily_limit_minutes, settings.weekend_relax_pct, today)
 
         # Persist et (idempotent upsert)
         if not using_mock:
-            self._persist_risk(score, level, details)
+            self._persist_risk(result["score"], result["level"], result["details"])
 
-        return {"score": score, "level": level, "details": details}
+        return result
 
     def determine_profile(self, allow_mock: bool = True) -> Dict:
         """
         Kullanıcıyı persona ile eşleştirir.
-        Öncelik: ML sınıflandırıcı (eğitim CSV varsa + sklearn). Yoksa kural tabanlı.
+        Öncelik: ML sınıflandırıcı (açılışta yüklenen artifact). Yoksa kural tabanlı.
         Dönen yapı: {"label": str, "probabilities": List[{label, probability}]}
         """
-        history, _ = self._get_history(days=30, allow_mock=allow_mock)
+        history, using_mock = self._get_history(days=30, allow_mock=allow_mock)
         if not history:
             return {"label": "Profil Belirlenemedi", "probabilities": []}
 
         # ML ile dene
         ml_pred = self._determine_profile_ml(history)
         if ml_pred:
+            if not using_mock:
+                loaded = model_registry.get("persona")
+                self._persist_profile(ml_pred, f"persona-{loaded.metadata.get('version')}", history)
             return ml_pred
 
         # kural tabanlı fallback
-        night_avg = mean([h.night_minutes for h in history])
-        gaming_avg = mean([float(h.gaming_ratio or 0) for h in history])
-        social_avg = mean([float(h.social_ratio or 0) for h in history])
-        weekend_avg = mean([h.total_minutes for h in history if h.weekend]) if any(h.weekend for h in history) else 0
-        weekday_avg = mean([h.total_minutes for h in history if not h.weekend]) if any((not h.weekend) for h in history) else 0
-
-        if night_avg > 45:
-            label = "Gece Kuşu"
-        elif gaming_avg > 0.4:
-            label = "Sıkı Oyuncu"
-        elif social_avg > 0.4:
-            label = "Sosyal Medya Tutkunu"
-        elif weekend_avg > weekday_avg * 1.25 and weekend_avg > 90:
-            label = "Hafta Sonu Odaklı"
-        else:
-            label = "Dengeli Kullanıcı"
-
-        return {"label": label, "probabilities": []}
+        profile = self._determine_profile_rule(history)
+        if not using_mock:
+            self._persist_profile(profile, "rule", history)
+        return profile
 
     def predict_next_week(self, allow_mock: bool = True, use_ml: bool = True) -> Dict:
         """
         Gelecek haftaki tahmini ekran süresi.
-        Varsayılan: küçük veri için hafif bir RandomForest tahmini; veri çok azsa (<5 gün)
-        trend tabanlı fallback.
+        Varsayılan: forecasting servisindeki toplu model (seasonal / pooled); sonuç
+        weekly_forecast'a yazılır ve feature_daily değişmedikçe oradan okunur.
+        Veri çok azsa (<5 gün) trend tabanlı fallback.
         """
-        history, _ = self._get_history(days=30, allow_mock=allow_mock)
+        history, using_mock = self._get_history(days=30, allow_mock=allow_mock)
         if not history:
             return {"daily_avg": 0, "weekly_total": 0, "daily_series": []}
 
-        # kronolojik sıraya al
-        ordered = sorted(history, key=lambda h: h.date)
-
-        # ML tabanlı tahmin (RandomForest)
-        series = None
+        series, bands = None, {}
         if use_ml:
-            series = self._forecast_with_random_forest(ordered)
+            series, bands = self._forecast_with_model(history, persist=not using_mock, allow_mock=allow_mock)
 
         if not series:
-            series = self._forecast_with_trend(ordered)
+            series, bands = self._forecast_with_trend(history), {}
+            if use_ml and not using_mock:
+                # Model için veri az: trend işaretçisi, aksi halde as_of hiç ilerlemez
+                start_date = history.date_list()[-1] + timedelta(days=1)
+                self._persist_forecast(history, series, start_date, TREND_MODEL_KEY)
+
+        return {**self._forecast_response(history, series), **bands}
 
+    def _forecast_response(self, history: FeatureHistory, series: List[int]) -> Dict:
         if not series:
             return {"daily_avg": 0, "weekly_total": 0, "daily_series": [], "start_weekday": None}
-
         weekly_total = sum(series)
         daily_avg = int(round(mean(series)))
-        start_weekday = (ordered[-1].date + timedelta(days=1)).weekday()
+        start_weekday = (history.date_list()[-1] + timedelta(days=1)).weekday()
         return {"daily_avg": daily_avg, "weekly_total": weekly_total, "daily_series": series, "start_weekday": start_weekday}
 
-    def _forecast_with_random_forest(self, ordered: List[FeatureDaily]) -> List[int]:
-        from sklearn.ensemble import RandomForestRegressor
+    def _forecast_with_model(self, history: FeatureHistory, persist: bool, allow_mock: bool) -> Tuple[List[int], Dict]:
+        """(seri, bant/senaryo alanları); online modelde bant yok."""
+        online = self._fresh_online_state(history)
+        model = None if online is not None else current_model()
+        model_key = ONLINE_MODEL_KEY if online is not None else model.key
+        as_of = date.today()
 
-        if len(ordered) < 5:
-            return []
+        if persist:
+            cached = self._cached_forecast(history, model_key)
+            if cached is not None:
+                return cached
+
+        if online is not None:
+            series, start_date = forecast_from_state(online)
+            if series and persist:
+                self._persist_forecast(history, series, start_date, model_key)
+            return series, {}
+
+        # Batch ile aynı build_forecasts, bellekteki geçmişle (bantlar için LOAD_DAYS gün)
+        forecast_history, _ = self._get_history(LOAD_DAYS, allow_mock=allow_mock)
+        results = build_forecasts(*self._forecast_inputs(forecast_history), as_of, model)
+        if not results:
+            return [], {}
+        if persist:
+            persist_forecasts(self.db, as_of, results)
+            self.db.commit()
+        return self._forecast_from_rows(results)
+
+    def _cached_forecast(self, history: FeatureHistory, model_key: str) -> Optional[Tuple[List[int], Dict]]:
+        """Bugünkü kayıtlı tahmin, girdi imzası ve modeli tutuyorsa (seri, bantlar); yoksa None."""
+        as_of = date.today()
+        signature = history_signature(history.date_list(), history.total.astype(int).tolist())
+        cached = cached_forecast(self.db, self.user_id, as_of, signature)
+        if cached and cached["model_key"] == model_key:
+            return cached["daily_series"], band_fields(forecast_scenarios(self.db, self.user_id, as_of))
+        if cached and cached["model_key"] == TREND_MODEL_KEY:
+            # Aynı girdi modele yine yetmez; trend serisi kayıtlı
+            return cached["daily_series"], {}
+        return None
+
+    def _forecast_inputs(self, history: FeatureHistory) -> Tuple[Dict, Dict]:
+        """build_forecasts girdileri (tek kullanıcı): geçmiş ve limit/gevşeme ayarı."""
+        settings = self.settings
+        return (
+            {self.user_id: (history.date_list(), history.total.astype(int).tolist())},
+            {self.user_id: (settings.daily_limit_minutes, settings.weekend_relax_pct)},
+        )
 
-        # Özellikler: önceki gün toplamı, weekday, weekend bayrağı
-        totals = [h.total_minutes for h in ordered]
-        features: List[List[float]] = []
-        targets: List[float] = []
-        for i in range(1, len(ordered)):
-            prev_total = totals[i - 1]
-            wd = ordered[i].weekday
-            weekend = 1 if (ordered[i].weekend or ordered[i].is_holiday) else 0
-            features.append([prev_total, wd, weekend])
-            targets.append(float(totals[i]))
-
-        if len(features) < 3:
-            return []
+    @staticmethod
+    def _forecast_from_rows(rows: List[Dict]) -> Tuple[List[int], Dict]:
+        """build_forecasts satırları -> (baseline serisi, bant/senaryo alanları)."""
+        scenarios = {r["scenario"]: result_payload(r) for r in rows}
+        return scenarios[BASELINE_SCENARIO]["daily_series"], band_fields(scenarios)
+
+    def _forecast_row(self, history: FeatureHistory, series: List[int], start_date: date, model_key: str) -> Dict:
+        """Online model veya trend tahmini için persist_forecasts satırı (bant/senaryo yok)."""
+        dates = history.date_list()
+        return {
+            "user_id": self.user_id,
+            "series": series,
+            "start_date": start_date,
+            "history_end": dates[-1],
+            "signature": history_signature(dates, history.total.astype(int).tolist()),
+            "model_key": model_key,
+        }
 
-        model = RandomForestRegressor(
-            n_estimators=80,
-            max_depth=4,
-            random_state=42,
-        )
-        model.fit(features, targets)
-
-        # İleriye doğru 7 gün tahmin (iteratif, son günün çıktısını bir sonraki giriş yap)
-        series: List[int] = []
-        last_total = totals[-1]
-        last_date = ordered[-1].date
-        for step in range(1, 8):
-            day = last_date + timedelta(days=step)
-            wd = day.weekday()
-            weekend = 1 if wd >= 5 else 0
-            pred = model.predict([[last_total, wd, weekend]])[0]
-            safe_pred = max(int(round(pred)), 0)
-            series.append(safe_pred)
-            last_total = safe_pred
-
-        return series
-
-    def _forecast_with_trend(self, ordered: List[FeatureDaily]) -> List[int]:
-        if len(ordered) < 2:
-            return []
+    def _persist_forecast(self, history: FeatureHistory, series: List[int], start_date: date, model_key: str):
+        persist_forecasts(self.db, date.today(), [self._forecast_row(history, series, start_date, model_key)])
+        self.db.commit()
+
+    def _forecast_with_trend(self, history: FeatureHistory) -> List[int]:
+        return trend_series(history.total)
 
-        totals = [h.total_minutes for h in ordered]
-        deltas = [totals[i] - totals[i - 1] for i in range(1, len(totals))]
-        trend = mean(deltas) if deltas else 0
-        base = mean(totals)
+    def _determine_profile_rule(self, history: FeatureHistory) -> Dict:
+        night_avg = float(history.night.mean())
+        gaming_avg = float(history.gaming.mean())
+        social_avg = float(history.social.mean())
+        weekend_avg = masked_mean(history.total, history.weekend)
+        weekday_avg = masked_mean(history.total, ~history.weekend)
 
-        series: List[int] = []
-        current = base + trend
-        for _ in range(7):
-            series.append(max(int(round(current)), 0))
-            current += trend
+        if night_avg > 45:
+            label = "Gece Kuşu"
+        elif gaming_avg > 0.4:
+            label = "Sıkı Oyuncu"
+        elif social_avg > 0.4:
+            label = "Sosyal Medya Tutkunu"
+        elif weekend_avg > weekday_avg * 1.25 and weekend_avg > 90:
+            label = "Hafta Sonu Odaklı"
+        else:
+            label = "Dengeli Kullanıcı"
 
-        return series
+        return {"label": label, "probabilities": []}
 
-    def _determine_profile_ml(self, history: List[FeatureDaily]) -> Dict | None:
+    def _determine_profile_ml(self, history: FeatureHistory) -> Dict | None:
         """
-        Eğitilmiş bir CSV varsa (varsayılan yol: app/assets/persona_training.csv) LogisticRegression ile
-        sınıflandırma yapar. Başarısız olursa None döner.
-        CSV formatı (header): label,night_avg,total_avg,gaming_ratio,social_ratio,weekend_ratio
+        Açılışta yüklenen persona modeliyle sınıflandırma yapar (bkz. model_registry).
+        Model yüklenmemişse veya tahmin başarısız olursa None döner.
         """
-        train_path = os.getenv("PERSONA_TRAIN_PATH", "app/assets/persona_training.csv")
-        if not os.path.exists(train_path):
+        loaded = model_registry.get("persona")
+        if loaded is None:
             return None
 
-        try:
-            from sklearn.ensemble import HistGradientBoostingClassifier
-        except ImportError:
-            return None
-
-        rows: List[Tuple[str, List[float]]] = []
-        with open(train_path, newline="", encoding="utf-8") as f:
-            reader = csv.DictReader(f)
-            for r in reader:
-                try:
-                    label = r["label"].strip()
-                    feats = [
-                        float(r["night_avg"]),
-                        float(r["total_avg"]),
-                        float(r["gaming_ratio"]),
-                        float(r["social_ratio"]),
-                        float(r.get("weekend_ratio", 0.0)),
-                    ]
-                    rows.append((label, feats))
-                except Exception:
-                    continue
-
-        if len(rows) < 8:
-            return None
-
-        labels = [r[0] for r in rows]
-        X = [r[1] for r in rows]
-
-        model = HistGradientBoostingClassifier(max_depth=5, max_iter=120, random_state=42)
-        model.fit(X, labels)
-
         feats_current = self._aggregate_profile_features(history)
         if not feats_current:
             return None
 
-        pred = model.predict([feats_current])[0]
-        probabilities: List[Dict[str, float]] = []
-        if hasattr(model, "predict_proba"):
-            try:
-                raw = [float(p) for p in model.predict_proba([feats_current])[0]]
-                T = 1.5
-                tempered = [pow(max(p, 1e-6), 1 / T) for p in raw]
-                s = sum(tempered)
-                tempered = [p / s for p in tempered]
-                # blend with uniform to avoid 100%
-                k = len(tempered)
-                alpha = 0.9
-                blended = [alpha * p + (1 - alpha) * (1.0 / k) for p in tempered]
-                s2 = sum(blended)
-                blended = [p / s2 for p in blended]
-                for label, p in zip(model.classes_, blended):
-                    probabilities.append({"label": str(label), "probability": float(p)})
-            except Exception:
-                probabilities = []
-
-        return {"label": str(pred), "probabilities": probabilities}
-
-    def _aggregate_profile_features(self, history: List[FeatureDaily]) -> List[float]:
+        try:
+            return predict_profile(loaded.model, feats_current)
+        except Exception:
+            return None
+
+    def _aggregate_profile_features(self, history: FeatureHistory) -> List[float]:
         if not history:
             return []
 
-        night_avg = mean([h.night_minutes for h in history])
-        total_avg = mean([h.total_minutes for h in history])
-        gaming_avg = mean([float(h.gaming_ratio or 0) for h in history])
-        social_avg = mean([float(h.social_ratio or 0) for h in history])
-        weekend_vals = [h.total_minutes for h in history if h.weekend]
-        weekday_vals = [h.total_minutes for h in history if not h.weekend]
+        online = self._fresh_online_state(history)
+        if online is not None:
+            return persona_features(online)
+
         weekend_ratio = 0.0
-        if weekend_vals and weekday_vals:
-            weekend_ratio = mean(weekend_vals) / max(mean(weekday_vals), 1.0)
+        if history.weekend.any() and (~history.weekend).any():
+            weekend_ratio = masked_mean(history.total, history.weekend) / max(
+                masked_mean(history.total, ~history.weekend), 1.0
+            )
 
-        return [night_avg, total_avg, gaming_avg, social_avg, weekend_ratio]
+        return [
+            float(history.night.mean()),
+            float(history.total.mean()),
+            float(history.gaming.mean()),
+            float(history.social.mean()),
+            weekend_ratio,
+        ]
 
-    def get_smart_recommendations(self, risk_level: str, profile: str) -> List[str]:
+    @staticmethod
+    def get_smart_recommendations(risk_level: str, profile: str) -> List[str]:
         """
         Risk ve Profile göre ebeveyne aksiyon önerileri sunar.
         """
@@ -331,33 +416,55 @@ class AIEngine:
         return recommendations
 
     # --- Internal helpers ---
-    def _load_feature_history(self, days: int) -> List[FeatureDaily]:
-        today = date.today()
-        cutoff = today - timedelta(days=days)
-        return (
-            self.db.query(FeatureDaily)
-            .filter(
-                FeatureDaily.user_id == self.user_id,
-                FeatureDaily.date >= cutoff,
-                FeatureDaily.date < today,  # bugünün verisini dışla
-            )
-            .order_by(FeatureDaily.date.desc())
-            .all()
-        )
-
-    def _get_history(self, days: int, allow_mock: bool) -> Tuple[List[FeatureDaily], bool]:
-        history = self._load_feature_history(days=days)
+    def _get_history(self, days: int, allow_mock: bool) -> Tuple[FeatureHistory, bool]:
+        """
+        Son `days` günün dilimi. İlk çağrıda en geniş pencere (tahmin bantları için
+        LOAD_DAYS) bir kez yüklenir; risk/profil/tahmin aynı diziler üzerinden dilimlenir.
+        """
+        if allow_mock not in self._history_cache:
+            self._history_cache[allow_mock] = self._load_history(max(days, HISTORY_WINDOW_DAYS, LOAD_DAYS), allow_mock)
+        window, using_mock = self._history_cache[allow_mock]
+        history = window.last_days(days, date.today())
+        self.has_data = bool(history) and not using_mock
+        return history, using_mock
+
+    def _load_history(self, days: int, allow_mock: bool) -> Tuple[FeatureHistory, bool]:
+        # bugünün (kısmi) verisi dışarıda
+        history = FeatureHistory.load(self.db, self.user_id, days, date.today())
         if history:
-            self.has_data = True
+            if ONLINE_MODELS_ENABLED:
+                self._online_state = load_state(self.db, self.user_id)
             return history, False
 
         if allow_mock and self._is_mock_enabled():
-            mock_hist = self._build_mock_history(days=days)
-            self.has_data = False
-            return mock_hist, True
+            return FeatureHistory.from_rows(self._build_mock_history(days=days)), True
 
-        self.has_data = False
-        return [], False
+        return history, False
+
+    def _fresh_online_state(self, history: FeatureHistory) -> Optional[OnlineState]:
+        """
+        Online durum, kesinleşmiş son güne kadar ilerlemişse kullanılır; sonraki
+        (henüz kesinleşmemiş) günler bellekteki kopyaya uygulanır.
+        """
+        state = self._online_state
+        if state is None or not history:
+            return None
+        dates = history.date_list()
+        start = bisect_right(dates, state.last_day)
+        pending = dates[start:]
+        if not pending:
+            return state if state.last_day == dates[-1] else None
+        if pending[0] < settled_before(date.today()):
+            return None  # iş henüz kesinleşmiş günlere yetişmedi
+        return apply_pending(
+            state,
+            pending,
+            history.total[start:],
+            history.night[start:],
+            history.gaming[start:],
+            history.social[start:],
+            history.weekend[start:],
+        )
 
     def _load_user_settings(self) -> UserSettings:
         return self.db.query(UserSettings).filter(UserSettings.user_id == self.user_id).first() or UserSettings(
@@ -370,32 +477,10 @@ class AIEngine:
             session_app_seconds=None,
         )
 
-    def _map_level(self, score: int) -> str:
-        if score >= 67:
-            return "Yüksek"
-        if score >= 34:
-            return "Orta"
-        return "Düşük"
-
     def _is_mock_enabled(self) -> bool:
         flag = os.getenv("AI_DEBUG_MOCK", "false").lower() in {"1", "true", "yes"}
         return flag
 
-    def _compute_limit_score(self, history: List[FeatureDaily], limit: int | None, weekend_relax_pct: int) -> int:
-        if not limit or limit <= 0:
-            return 50
-
-        relax = max(weekend_relax_pct or 0, 0) / 100.0
-        scores = []
-        for h in history:
-            day_limit = limit * (1 + relax) if (h.weekend or h.is_holiday) else limit
-            over_pct = max((h.total_minutes - day_limit) / max(day_limit, 1), 0)
-            scores.append(over_pct)
-
-        if not scores:
-            return 50
-        return min(100, int(round(mean(scores) * 100)))
-
     def _build_mock_history(self, days: int) -> List[FeatureDaily]:
         today = date.today()
         items: List[FeatureDaily] = []
@@ -422,60 +507,12 @@ class AIEngine:
         return items
 
     def _persist_risk(self, score: int, level_label: str, details: Dict):
-        as_of = date.today()
-
-        # Meta tablolarda kaydı hazırla
-        dim = self._get_or_create_dimension(key="overall", display_name="Genel Risk")
-        lvl = self._get_or_create_level(level_label)
-
-        prob = round(score / 100, 3)
-
-        entry = (
-            self.db.query(RiskAssessment)
-            .filter_by(user_id=self.user_id, as_of_date=as_of, dimension_id=dim.id)
-            .first()
-        )
-        if not entry:
-            entry = RiskAssessment(
-                user_id=self.user_id,
-                as_of_date=as_of,
-                dimension_id=dim.id,
-            )
-            self.db.add(entry)
-
-        entry.level_id = lvl.id
-        entry.prob = prob
-        entry.model_key = "rule_v1"
-        entry.features = {"score": score, "level": level_label, **details}
-
+        # Batch ile aynı tek INSERT ... ON CONFLICT; meta id'leri risk_meta önbelleğinden
+        persist_risks(self.db, date.today(), [
+            {"user_id": self.user_id, "score": score, "level": level_label, "details": details}
+        ])
         self.db.commit()
 
-    def _get_or_create_dimension(self, key: str, display_name: str) -> RiskDimension:
-        obj = self.db.query(RiskDimension).filter_by(key=key).first()
-        if obj:
-            return obj
-        obj = RiskDimension(key=key, display_name=display_name)
-        self.db.add(obj)
-        self.db.commit()
-        self.db.refresh(obj)
-        return obj
-
-    def _get_or_create_level(self, label: str) -> RiskLevel:
-        label_lower = label.lower()
-        mapping = {
-            "düşük": ("low", 1),
-            "dusuk": ("low", 1),
-            "orta": ("medium", 2),
-            "yüksek": ("high", 3),
-            "yuksek": ("high", 3),
-        }
-        key, rank = mapping.get(label_lower, ("medium", 2))
-
-        obj = self.db.query(RiskLevel).filter_by(key=key).first()
-        if obj:
-            return obj
-        obj = RiskLevel(key=key, rank=rank)
-        self.db.add(obj)
+    def _persist_profile(self, profile: Dict, model_key: str, history: FeatureHistory):
+        persist_profile(self.db, self.user_id, profile, model_key, history.date_list()[-1])
         self.db.commit()
-        self.db.refresh(obj)
-        return obj
\ No newline at end of file
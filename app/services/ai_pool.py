@@ -0,0 +1,137 @@
+# app/services/ai_pool.py
+"""Bounded process pool for the CPU-bound parts of the AI dashboard.
+
+Geçmiş yüklendikten sonra risk, profil ve tahmin birbirinden bağımsızdır.
+`AIEngine.build_dashboard_async` üçünü bu havuza gönderir ve
+`asyncio.gather` ile bekler; böylece model çıkarımı worker'daki diğer
+isteklerin GIL'ini tutmaz.
+
+- İşçiler `spawn` ile başlar (ana süreçteki thread'ler fork'a taşınmaz) ve
+  başlarken `model_registry.load_all(train_on_missing=False)` çağırır: artifact
+  yoksa işçi eğitim yapmaz, persona parçası kural tabanlı fallback'e düşer.
+- Her parça `AI_PART_TIMEOUT_SECONDS` ile sınırlıdır. Süre aşılırsa veya havuz
+  bozulursa çağıranın verdiği fallback (kural tabanlı profil, trend tahmini,
+  süreç içi risk) döner. İptal edilen iş işçide bitene kadar sürer; havuz
+  sınırlı olduğundan taşma olmaz.
+- `AI_PROCESS_WORKERS=0` havuzu kapatır; parçalar varsayılan thread havuzunda koşar.
+"""
+import asyncio
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+from typing import Callable, Dict, List, Optional, Tuple
+
+AI_PROCESS_WORKERS = int(os.getenv("AI_PROCESS_WORKERS", "2"))
+AI_PART_TIMEOUT_SECONDS = float(os.getenv("AI_PART_TIMEOUT_SECONDS", "2.0"))
+
+
+# --- İşçi süreçte çalışan fonksiyonlar (modül seviyesinde: pickle edilebilir) ---
+def _init_worker():
+    from app.services.model_registry import model_registry
+
+    # Her işçide ~3 sn'lik eğitimi tekrarlama; artifact yoksa fallback yeterli
+    model_registry.load_all(train_on_missing=False)
+
+
+def _warmup() -> int:
+    return os.getpid()
+
+
+def predict_persona(features: List[float]) -> Optional[Tuple[Dict, str]]:
+    """Persona tahmini + model_key; model yoksa None (çağıran kural tabanlıya düşer)."""
+    from app.services.model_registry import model_registry
+    from app.services.persona_model import predict_profile
+
+    loaded = model_registry.get("persona")
+    if loaded is None:
+        return None
+    return predict_profile(loaded.model, features), f"persona-{loaded.metadata.get('version')}"
+
+
+def forecast_part(histories: Dict, limits: Dict, as_of: date) -> List[Dict]:
+    """build_forecasts satırları (baseline + reduced, bantlarıyla); yetersiz veride boş liste."""
+    from app.services.forecasting import build_forecasts
+
+    return build_forecasts(histories, limits, as_of)
+
+
+class AIPool:
+    def __init__(self, workers: int = AI_PROCESS_WORKERS, timeout_seconds: float = AI_PART_TIMEOUT_SECONDS):
+        self.workers = max(workers, 0)
+        self.timeout_seconds = timeout_seconds
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+
+        self.submitted: Dict[str, int] = {}
+        self.timeouts: Dict[str, int] = {}
+        self.failures: Dict[str, int] = {}
+
+    def start(self):
+        """Create the pool and spawn every worker now, so the first request doesn't pay the start-up."""
+        executor = self._get_executor()
+        if executor is None:
+            return
+        try:
+            for f in [executor.submit(_warmup) for _ in range(self.workers)]:
+                f.result()
+        except Exception as e:
+            # Açılışı engelleme: istekler havuzu yeniden kurar, olmazsa fallback'e düşer
+            print(f"AI POOL warm-up failed: {e}")
+            self.stop()
+
+    def stop(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    async def run(self, name: str, fn: Callable, *args, fallback: Callable[[], object]):
+        """Run `fn(*args)` in the pool with a timeout; on timeout or pool error return `fallback()`."""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            self.submitted[name] = self.submitted.get(name, 0) + 1
+        try:
+            return await asyncio.wait_for(
+                loop.run_in_executor(self._get_executor(), fn, *args), self.timeout_seconds
+            )
+        except asyncio.TimeoutError:
+            with self._lock:
+                self.timeouts[name] = self.timeouts.get(name, 0) + 1
+            print(f"AI POOL {name} timed out after {self.timeout_seconds}s, using fallback")
+        except Exception as e:
+            with self._lock:
+                self.failures[name] = self.failures.get(name, 0) + 1
+            print(f"AI POOL {name} failed, using fallback: {e}")
+            if self._executor is not None and getattr(self._executor, "_broken", False):
+                self.stop()  # bir sonraki istek yeni havuz kurar
+        return fallback()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "mode": "process" if self.workers else "thread",
+                "running": self._executor is not None,
+                "timeout_seconds": self.timeout_seconds,
+                "submitted": dict(self.submitted),
+                "timeouts": dict(self.timeouts),
+                "failures": dict(self.failures),
+            }
+
+    def _get_executor(self) -> Optional[ProcessPoolExecutor]:
+        if self.workers == 0:
+            return None  # run_in_executor(None, ...) -> varsayılan thread havuzu
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_worker,
+                )
+            return self._executor
+
+
+# Global erişim nesnesi (main.py lifespan'inde başlatılır)
+ai_pool = AIPool()
@@ -0,0 +1,238 @@
+# app/services/ai_snapshot.py
+"""Stale-while-revalidate serving for the AI dashboard.
+
+`/api/ai/dashboard` eskiden her istekte risk + profil + tahmini baştan
+hesaplıyordu. Artık kalıcı anlık görüntü okunur:
+
+- risk: en yeni `risk_assessment` ('overall') satırı,
+- profil: `user_profile` (kullanıcı başına tek satır),
+- tahmin: en yeni `weekly_forecast` (baseline, horizon 1) satırı; aynı günün
+  senaryoları ve kantil bantları yanıta eklenir.
+
+Her parçanın girdi geçmişinin son günü (`history_end`) tutulur; anlık
+görüntünün `as_of`'u bunların en eskisidir. Kullanıcının en yeni feature_daily
+günü (bugün hariç) `as_of`'tan yeniyse yanıt yine hemen döner, ama `ai_refresher`
+arka planda yeniden hesaplamayı tetikler (risk/profil/tahmin ilk ziyaretteki gibi
+`ai_pool` süreçlerinde). Aynı kullanıcı için eşzamanlı istekler tek uçuştaki
+(in-flight) işe katlanır.
+
+Parçalardan biri hiç yoksa (ilk ziyaret, mock veri) çağıran eşzamanlı hesaplar.
+Hesaplanamayan parça da işaretçi yazar (risk penceresi boşsa 'Veri Yok',
+model için veri azsa trend tahmini), böylece `as_of` ilerler ve `stale` her
+istekte yeniden hesaplama tetiklemez.
+"""
+import asyncio
+import json
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import date, timedelta
+from statistics import mean
+from typing import Callable, Dict, List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.db import SessionLocal
+from app.services.forecasting import BASELINE_SCENARIO, TREND_MODEL_KEY, band_fields, forecast_scenarios
+from app.services.risk_scoring import RISK_DIMENSION_KEY, map_level
+
+AI_REFRESH_WORKERS = int(os.getenv("AI_REFRESH_WORKERS", "2"))
+
+# AIEngine'in yüklediği en geniş pencere (profil ve tahmin 30 gün kullanır); daha
+# eski feature günleri hiçbir parçayı ilerletemez, tazelik hesabına girmez
+HISTORY_WINDOW_DAYS = 30
+
+_SNAPSHOT_SQL = text(
+    """
+SELECT
+    (SELECT max(f.date) FROM feature_daily f
+     WHERE f.user_id = :user_id AND f.date >= :window_start AND f.date < :today) AS latest_feature,
+    r.features AS risk_features, r.as_of_date AS risk_as_of,
+    p.label AS profile_label, p.probabilities AS profile_probabilities, p.history_end AS profile_end,
+    w.daily_series, w.start_date AS forecast_start, w.history_end AS forecast_end, w.as_of_date AS forecast_as_of,
+    w.model_key AS forecast_model
+FROM (SELECT 1) AS one
+LEFT JOIN LATERAL (
+    SELECT ra.features, ra.as_of_date
+    FROM risk_assessment ra
+    JOIN risk_dimension d ON d.id = ra.dimension_id
+    WHERE ra.user_id = :user_id AND d.key = :dimension
+    ORDER BY ra.as_of_date DESC
+    LIMIT 1
+) AS r ON TRUE
+LEFT JOIN user_profile p ON p.user_id = :user_id
+LEFT JOIN LATERAL (
+    SELECT wf.daily_series, wf.start_date, wf.history_end, wf.as_of_date, wf.model_key
+    FROM weekly_forecast wf
+    WHERE wf.user_id = :user_id AND wf.horizon_week = 1 AND wf.scenario = :scenario
+    ORDER BY wf.as_of_date DESC
+    LIMIT 1
+) AS w ON TRUE
+"""
+)
+
+_PROFILE_UPSERT_SQL = text(
+    """
+INSERT INTO user_profile (user_id, label, probabilities, model_key, history_end, updated_at)
+VALUES (:user_id, :label, CAST(:probabilities AS jsonb), :model_key, :history_end, NOW())
+ON CONFLICT (user_id) DO UPDATE SET
+    label = EXCLUDED.label,
+    probabilities = EXCLUDED.probabilities,
+    model_key = EXCLUDED.model_key,
+    history_end = EXCLUDED.history_end,
+    updated_at = EXCLUDED.updated_at
+"""
+)
+
+
+def persist_profile(db: Session, user_id, profile: Dict, model_key: str, history_end: date):
+    """Upsert the user's persona snapshot (caller commits)."""
+    db.execute(
+        _PROFILE_UPSERT_SQL,
+        {
+            "user_id": str(user_id),
+            "label": profile["label"],
+            "probabilities": json.dumps(profile.get("probabilities") or [], ensure_ascii=False),
+            "model_key": model_key,
+            "history_end": history_end,
+        },
+    )
+
+
+def load_snapshot(db: Session, user_id, today: Optional[date] = None) -> Optional[Dict]:
+    """
+    Persisted risk/profile/forecast in API shape plus `as_of` and `stale`.
+    Parçalardan biri eksikse None (çağıran eşzamanlı hesaplar).
+    """
+    today = today or date.today()
+    row = db.execute(
+        _SNAPSHOT_SQL,
+        {
+            "user_id": str(user_id),
+            "today": today,
+            "window_start": today - timedelta(days=HISTORY_WINDOW_DAYS),
+            "dimension": RISK_DIMENSION_KEY,
+            "scenario": BASELINE_SCENARIO,
+        },
+    ).first()
+    # Trend işaretçisinde seri boş olabilir ([]); sadece satır yoksa eksik say
+    if row is None or not row.risk_features or not row.profile_label or row.daily_series is None:
+        return None
+
+    features = dict(row.risk_features)
+    score = int(features.pop("score", 0))
+    level = features.pop("level", None) or map_level(score)
+    # Eski satırlarda history_end yok: pencere as_of_date'in bir gün öncesinde biter
+    risk_end = features.get("history_end")
+    risk_end = date.fromisoformat(risk_end) if risk_end else row.risk_as_of - timedelta(days=1)
+
+    series: List[int] = [int(v) for v in row.daily_series]
+    forecast = {
+        "daily_avg": int(round(mean(series))) if series else 0,
+        "weekly_total": sum(series),
+        "daily_series": series,
+        "start_weekday": row.forecast_start.weekday() if row.forecast_start else None,
+    }
+    if row.forecast_model != TREND_MODEL_KEY:
+        # Bantlar ve 'reduced' senaryosu aynı as_of_date'in satırlarında
+        forecast.update(band_fields(forecast_scenarios(db, user_id, row.forecast_as_of)))
+
+    ends = [d for d in (risk_end, row.profile_end, row.forecast_end) if d is not None]
+    as_of = min(ends) if ends else None
+    stale = row.latest_feature is not None and (as_of is None or row.latest_feature > as_of)
+    return {
+        "risk_analysis": {"score": score, "level": level, "details": features},
+        "user_profile": {"label": row.profile_label, "probabilities": row.profile_probabilities or []},
+        "forecast": forecast,
+        "as_of": as_of,
+        "stale": stale,
+    }
+
+
+def refresh_user(user_id) -> Dict:
+    """
+    Recompute and persist every dashboard part for one user (own session).
+    İlk ziyaretle aynı `build_dashboard_async` yolu: model parçaları `ai_pool`
+    süreçlerinde zaman aşımıyla koşar, bu thread sadece event loop'u ve DB'yi sürer.
+    """
+    from app.services.ai_engine import AIEngine  # döngüsel import'u önlemek için
+
+    db = SessionLocal()
+    try:
+        dashboard = asyncio.run(AIEngine(db, user_id).build_dashboard_async(allow_mock=False))
+        db.commit()
+        return {"as_of": dashboard["as_of"]}
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+class AIRefresher:
+    """Single-flight background recompute: kullanıcı başına en fazla bir iş uçuşta."""
+
+    def __init__(self, runner: Callable[[str], object] = refresh_user, workers: int = AI_REFRESH_WORKERS):
+        self.runner = runner
+        self.workers = max(workers, 1)
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._inflight: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+
+        self.requested = 0
+        self.coalesced = 0
+        self.executed = 0
+        self.failed = 0
+
+    def trigger(self, user_id) -> bool:
+        """Schedule a recompute unless one is already running for the user. True if newly scheduled."""
+        key = str(user_id)
+        with self._lock:
+            self.requested += 1
+            if key in self._inflight:
+                self.coalesced += 1
+                return False
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="ai-refresh")
+            future = self._executor.submit(self._run, key)
+            self._inflight[key] = future
+        return True
+
+    def is_refreshing(self, user_id) -> bool:
+        with self._lock:
+            return str(user_id) in self._inflight
+
+    def stop(self, wait: bool = True):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait, cancel_futures=not wait)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "requested": self.requested,
+                "coalesced": self.coalesced,
+                "executed": self.executed,
+                "failed": self.failed,
+                "inflight": len(self._inflight),
+                "workers": self.workers,
+            }
+
+    def _run(self, key: str):
+        try:
+            self.runner(key)
+            with self._lock:
+                self.executed += 1
+        except Exception as e:
+            with self._lock:
+                self.failed += 1
+            print(f"AI REFRESH failed user={key}: {e}")
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+
+# Global erişim nesnesi (main.py lifespan'inde kapatılır)
+ai_refresher = AIRefresher()
@@ -3,8 +3,9 @@ from datetime import date, datetime, time, timedelta, timezone
 from sqlalchemy.orm import Session
 from sqlalchemy import and_
 
-from app.models.core import AppSession, FeatureDaily, UserSettings, AppCatalog, AppCategory
-from app.services.categorizer import get_or_create_app_entry
+from app.models.core import AppSession, FeatureDaily, AppCatalog, AppCategory
+from app.services.categorizer import resolve_catalog
+from app.services.night_window import NightWindow
 from app.services.category_constants import CATEGORY_KEYS, DEFAULT_CATEGORY_KEY, canonicalize_category_key
 
 def calculate_daily_features(user_id: str, target_date: date, db: Session):
@@ -19,7 +20,12 @@ def calculate_daily_features(user_id: str, target_date: date, db: Session):
     start_of_day = datetime.combine(target_date, time.min, tzinfo=tr_tz)
     end_of_day = datetime.combine(target_date, time.max, tzinfo=tr_tz)
     
-    sessions = db.query(AppSession).filter(
+    # ORM nesnesi yerine kolon satırları: katalog commit'i sonrası expire/refresh olmasınlar
+    sessions = db.query(
+        AppSession.package_name,
+        AppSession.started_at,
+        AppSession.ended_at,
+    ).filter(
         AppSession.user_id == user_id,
         AppSession.started_at >= start_of_day,
         AppSession.started_at <= end_of_day
@@ -37,6 +43,10 @@ def calculate_daily_features(user_id: str, target_date: date, db: Session):
         feature_entry.gaming_ratio = 0
         feature_entry.social_ratio = 0
         feature_entry.session_count = 0
+        feature_entry.total_seconds = 0
+        feature_entry.night_seconds = 0
+        feature_entry.gaming_seconds = 0
+        feature_entry.social_seconds = 0
         feature_entry.weekday = target_date.weekday()
         feature_entry.weekend = target_date.weekday() >= 5
         feature_entry.is_holiday = feature_entry.weekend
@@ -44,48 +54,15 @@ def calculate_daily_features(user_id: str, target_date: date, db: Session):
         db.commit()
         return
 
-    # 2. Kullanıcı Ayarlarını (Uyku Saati) Çek
-    settings = db.query(UserSettings).filter(UserSettings.user_id == user_id).first()
-    
-    # Varsayılan Uyku Aralığı: 22:00 - 07:00
-    bedtime_start = settings.nightly_start if settings and settings.nightly_start else time(22, 0)
-    bedtime_end = settings.nightly_end if settings and settings.nightly_end else time(7, 0)
+    # 2. Kullanıcı Ayarlarını (Uyku Saati) Çek - varsayılan 22:00 - 07:00
+    night_window = NightWindow.for_user(db, user_id)
 
     # 3. Metrikleri Hesapla
     total_minutes = 0
-    night_minutes = 0
     cat_durations = {key: 0 for key in CATEGORY_KEYS}
 
-    def overlap_minutes(start_dt: datetime, end_dt: datetime, win_start_t: time, win_end_t: time) -> float:
-        """Gece aralığı gün aşsa bile oturumun kesişen dakikasını hesapla."""
-        minutes = 0.0
-        cursor = start_dt
-        while cursor < end_dt:
-            day_end = datetime.combine(cursor.date(), time.max, tzinfo=cursor.tzinfo)
-            seg_end = min(day_end, end_dt)
-
-            if win_start_t > win_end_t:
-                # Gece yarısını geçen aralık: [win_start, 24:00) ve [00:00, win_end)
-                win1_start = datetime.combine(cursor.date(), win_start_t, tzinfo=cursor.tzinfo)
-                win1_end = datetime.combine(cursor.date(), time.max, tzinfo=cursor.tzinfo)
-                win2_start = datetime.combine(cursor.date(), time.min, tzinfo=cursor.tzinfo)
-                win2_end = datetime.combine(cursor.date(), win_end_t, tzinfo=cursor.tzinfo)
-                minutes += _interval_overlap_minutes(cursor, seg_end, win1_start, win1_end)
-                minutes += _interval_overlap_minutes(cursor, seg_end, win2_start, win2_end)
-            else:
-                win_start = datetime.combine(cursor.date(), win_start_t, tzinfo=cursor.tzinfo)
-                win_end = datetime.combine(cursor.date(), win_end_t, tzinfo=cursor.tzinfo)
-                minutes += _interval_overlap_minutes(cursor, seg_end, win_start, win_end)
-
-            cursor = seg_end + timedelta(seconds=1)
-        return minutes
-
-    def _interval_overlap_minutes(a_start: datetime, a_end: datetime, b_start: datetime, b_end: datetime) -> float:
-        if a_end <= b_start or a_start >= b_end:
-            return 0.0
-        overlap_start = max(a_start, b_start)
-        overlap_end = min(a_end, b_end)
-        return max((overlap_end - overlap_start).total_seconds(), 0) / 60.0
+    # Kategori bilgisi: ortak CatalogIndex'ten (eksik paketler kataloğa eklenir)
+    catalog = resolve_catalog(db, {sess.package_name for sess in sessions})
 
     for sess in sessions:
         duration_sec = (sess.ended_at - sess.started_at).total_seconds()
@@ -96,14 +73,15 @@ def calculate_daily_features(user_id: str, target_date: date, db: Session):
         total_minutes += duration_min
 
         # Kategori
-        app_entry = get_or_create_app_entry(db, sess.package_name)
-        cat_key = DEFAULT_CATEGORY_KEY
-        if app_entry.category and app_entry.category.key:
-            cat_key = canonicalize_category_key(app_entry.category.key)
+        app_entry = catalog.get(sess.package_name)
+        cat_key = app_entry.category_key if app_entry and app_entry.category_key else DEFAULT_CATEGORY_KEY
         cat_durations[cat_key] = cat_durations.get(cat_key, 0) + duration_min
 
-        # Gece kesişimi (gerçek overlap)
-        night_minutes += overlap_minutes(sess.started_at, sess.ended_at, bedtime_start, bedtime_end)
+    # Gece kesişimi (gerçek overlap), tüm oturumlar tek seferde
+    night_minutes = night_window.overlap_minutes(
+        [sess.started_at for sess in sessions],
+        [sess.ended_at for sess in sessions],
+    )
 
     # 4. Oranları Hesapla
     total_m = max(total_minutes, 1) # Sıfıra bölünme hatası önlemi
@@ -122,6 +100,10 @@ def calculate_daily_features(user_id: str, target_date: date, db: Session):
     feature_entry.gaming_ratio = round(gaming_ratio, 2)
     feature_entry.social_ratio = round(social_ratio, 2)
     feature_entry.session_count = len(sessions)
+    feature_entry.total_seconds = total_minutes * 60
+    feature_entry.night_seconds = night_minutes * 60
+    feature_entry.gaming_seconds = cat_durations.get("games", 0) * 60
+    feature_entry.social_seconds = cat_durations.get("social", 0) * 60
     
     # Tarihsel Özellikler
     feature_entry.weekday = target_date.weekday() # 0-6
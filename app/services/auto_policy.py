@@ -4,10 +4,11 @@ from typing import List, Optional
 
 from sqlalchemy.orm import Session
 
-from app.models.core import FeatureDaily, UserSettings, DailyUsageLog, AppCatalog
+from app.models.core import FeatureDaily, UserSettings, DailyUsageLog
 from app.models.policy import PolicyRule
-from app.services.categorizer import get_or_create_app_entry
-from app.services.category_constants import canonicalize_category_key
+from app.services.categorizer import resolve_catalog
+from app.services.hourly_rollup import rebuild_night_window
+from app.services.night_window import NightWindow
 
 RISK_CATEGORIES = {"games", "social", "video", "short_video", "short-video", "video_short"}
 
@@ -102,15 +103,10 @@ def _aggregate_apps(db: Session, user_id: str, days: int):
     return app_totals, total_minutes
 
 
-def _categorize(db: Session, package: str) -> Optional[str]:
-    entry = db.query(AppCatalog).filter_by(package_name=package).first()
-    if entry and entry.category and entry.category.key:
-        return canonicalize_category_key(entry.category.key)
-    # fallback: create/lookup
-    entry = get_or_create_app_entry(db, package)
-    if entry.category and entry.category.key:
-        return canonicalize_category_key(entry.category.key)
-    return None
+def _categorize_many(db: Session, packages: List[str]) -> dict:
+    """Paket -> canonical kategori key; ortak CatalogIndex'ten (yoksa kataloğa eklenir)."""
+    entries = resolve_catalog(db, packages)
+    return {pkg: entries[pkg].category_key if pkg in entries else None for pkg in packages}
 
 
 def _generate_auto_policy(db: Session, user_id: str, birth_date: Optional[date], persist: bool) -> AutoPolicyResult:
@@ -141,11 +137,14 @@ def _generate_auto_policy(db: Session, user_id: str, birth_date: Optional[date],
     app_totals, total_minutes = _aggregate_apps(db, user_id, result.window_days or 7)
     app_limits = []
     if total_minutes > 0:
-        for pkg, mins in sorted(app_totals.items(), key=lambda x: x[1], reverse=True):
+        ranked = sorted(app_totals.items(), key=lambda x: x[1], reverse=True)
+        candidates = [pkg for pkg, mins in ranked if not (mins / total_minutes < 0.1 and mins < 60)]
+        categories = _categorize_many(db, candidates)
+        for pkg, mins in ranked:
             share = mins / total_minutes
             if share < 0.1 and mins < 60:
                 continue
-            cat = _categorize(db, pkg)
+            cat = categories.get(pkg)
             risk = cat in RISK_CATEGORIES
             if share > 0.35 or (risk and share > 0.25):
                 limit_val = mins * 0.7
@@ -170,11 +169,14 @@ def _generate_auto_policy(db: Session, user_id: str, birth_date: Optional[date],
         if not settings:
             settings = UserSettings(user_id=user_id)
             db.add(settings)
+        night_before = NightWindow.from_settings(settings)
         settings.daily_limit_minutes = stage1
         settings.weekend_relax_pct = weekend_relax_pct
         settings.nightly_start = bedtime_start_t
         settings.nightly_end = bedtime_end_t
         db.flush()
+        if NightWindow.from_settings(settings) != night_before:
+            rebuild_night_window(db, user_id)
 
         now = datetime.utcnow()
         # stage2 rule stored as future-effective limit (optional for reference)
@@ -0,0 +1,164 @@
+# app/services/bulk_loader.py
+"""PostgreSQL COPY based bulk loader for app_session and daily_usage_log.
+
+Satırlar `COPY ... FROM STDIN` ile geçici bir staging tablosuna akıtılır, sonra
+tek bir `INSERT ... SELECT ... ON CONFLICT` ile asıl tabloya birleştirilir.
+Çakışma davranışı normal ingest yoluyla aynıdır:
+
+- app_session: `unique_session_entry` çakışmasında satır atlanır.
+- daily_usage_log: `pk_daily_usage` çakışmasında toplam ezilir (replace) ya da
+  mevcut değere eklenir (accumulate). Staging'de aynı anahtar birden fazla
+  geçerse replace modunda son satır, accumulate modunda toplam kullanılır.
+
+Staging tabloları bağlantıya özel TEMP tablolardır ve commit'te boşalır; commit
+çağırana aittir. psycopg (v3) sürücüsü gerektirir.
+"""
+import os
+from typing import Iterable, List
+
+from sqlalchemy.orm import Session
+
+# Bu satır sayısının üstünde ingest yolu VALUES yerine COPY kullanır
+BULK_COPY_THRESHOLD = int(os.getenv("BULK_COPY_THRESHOLD", "2000"))
+
+SESSION_COLUMNS = ("user_id", "device_id", "package_name", "started_at", "ended_at", "source", "payload")
+DAILY_COLUMNS = ("user_id", "device_id", "usage_date", "package_name", "app_name", "total_seconds", "updated_at")
+
+_STAGE_SESSION_DDL = """
+CREATE TEMP TABLE IF NOT EXISTS _stage_app_session (
+    user_id UUID NOT NULL,
+    device_id UUID NOT NULL,
+    package_name TEXT NOT NULL,
+    started_at TIMESTAMPTZ,
+    ended_at TIMESTAMPTZ,
+    source VARCHAR,
+    payload JSONB
+) ON COMMIT DELETE ROWS
+"""
+
+_STAGE_DAILY_DDL = """
+CREATE TEMP TABLE IF NOT EXISTS _stage_daily_usage (
+    ord BIGSERIAL,
+    user_id UUID NOT NULL,
+    device_id UUID NOT NULL,
+    usage_date DATE NOT NULL,
+    package_name TEXT NOT NULL,
+    app_name TEXT,
+    total_seconds INT,
+    updated_at TIMESTAMPTZ
+) ON COMMIT DELETE ROWS
+"""
+
+_MERGE_SESSIONS = """
+INSERT INTO app_session (user_id, device_id, package_name, started_at, ended_at, source, payload)
+SELECT user_id, device_id, package_name, started_at, ended_at, source, payload
+FROM _stage_app_session
+ON CONFLICT ON CONSTRAINT unique_session_entry DO NOTHING
+"""
+
+_SESSION_RETURNING = "RETURNING user_id, package_name, started_at, ended_at, device_id"
+
+_MERGE_DAILY_REPLACE = """
+INSERT INTO daily_usage_log (user_id, device_id, usage_date, package_name, app_name, total_seconds, updated_at)
+SELECT DISTINCT ON (user_id, device_id, usage_date, package_name)
+       user_id, device_id, usage_date, package_name, app_name, total_seconds, updated_at
+FROM _stage_daily_usage
+ORDER BY user_id, device_id, usage_date, package_name, ord DESC
+ON CONFLICT ON CONSTRAINT pk_daily_usage DO UPDATE SET
+    app_name = EXCLUDED.app_name,
+    total_seconds = EXCLUDED.total_seconds,
+    updated_at = EXCLUDED.updated_at
+"""
+
+_MERGE_DAILY_ACCUMULATE = """
+INSERT INTO daily_usage_log (user_id, device_id, usage_date, package_name, app_name, total_seconds, updated_at)
+SELECT user_id, device_id, usage_date, package_name,
+       (ARRAY_AGG(app_name ORDER BY ord DESC))[1],
+       SUM(total_seconds),
+       MAX(updated_at)
+FROM _stage_daily_usage
+GROUP BY user_id, device_id, usage_date, package_name
+ON CONFLICT ON CONSTRAINT pk_daily_usage DO UPDATE SET
+    app_name = EXCLUDED.app_name,
+    total_seconds = daily_usage_log.total_seconds + EXCLUDED.total_seconds,
+    updated_at = EXCLUDED.updated_at
+"""
+
+
+def copy_supported(db: Session) -> bool:
+    """COPY only works through the psycopg (v3) driver."""
+    bind = db.get_bind()
+    return bind.dialect.name == "postgresql" and bind.dialect.driver == "psycopg"
+
+
+def should_use_copy(db: Session, row_count: int) -> bool:
+    return row_count >= BULK_COPY_THRESHOLD and copy_supported(db)
+
+
+def copy_sessions(db: Session, rows: Iterable[dict], returning: bool = False):
+    """
+    Bulk insert raw sessions.
+
+    Varsayılan olarak eklenen satır sayısını döner; returning=True ise yeni eklenen
+    satırların (user_id, package_name, started_at, ended_at, device_id) listesini döner.
+    """
+    from psycopg.types.json import Jsonb
+
+    def _values(row):
+        payload = row.get("payload")
+        return (
+            row["user_id"],
+            row["device_id"],
+            row["package_name"],
+            row.get("started_at"),
+            row.get("ended_at"),
+            row.get("source"),
+            Jsonb(payload) if payload is not None else None,
+        )
+
+    cur = _raw_cursor(db)
+    try:
+        cur.execute(_STAGE_SESSION_DDL)
+        cur.execute("TRUNCATE _stage_app_session")
+        _copy_rows(cur, "_stage_app_session", SESSION_COLUMNS, (_values(r) for r in rows))
+        if returning:
+            cur.execute(_MERGE_SESSIONS + _SESSION_RETURNING)
+            inserted = cur.fetchall()
+        else:
+            cur.execute(_MERGE_SESSIONS)
+            inserted = cur.rowcount
+        cur.execute("TRUNCATE _stage_app_session")
+        return inserted
+    finally:
+        cur.close()
+
+
+def copy_daily_usage(db: Session, rows: Iterable[dict], accumulate: bool = False) -> int:
+    """Bulk upsert daily totals with the same semantics as ingest.upsert_daily_usage."""
+    cur = _raw_cursor(db)
+    try:
+        cur.execute(_STAGE_DAILY_DDL)
+        cur.execute("TRUNCATE _stage_daily_usage")
+        _copy_rows(
+            cur,
+            "_stage_daily_usage",
+            DAILY_COLUMNS,
+            (tuple(r.get(c) for c in DAILY_COLUMNS) for r in rows),
+        )
+        cur.execute(_MERGE_DAILY_ACCUMULATE if accumulate else _MERGE_DAILY_REPLACE)
+        merged = cur.rowcount
+        cur.execute("TRUNCATE _stage_daily_usage")
+        return merged
+    finally:
+        cur.close()
+
+
+def _copy_rows(cur, table: str, columns: List[str], rows: Iterable[tuple]):
+    with cur.copy(f"COPY {table} ({', '.join(columns)}) FROM STDIN") as copy:
+        for values in rows:
+            copy.write_row(values)
+
+
+def _raw_cursor(db: Session):
+    # Session'ın mevcut transaction'ındaki DBAPI bağlantısını kullan (aynı commit/rollback)
+    return db.connection().connection.cursor()
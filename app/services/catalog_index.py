@@ -0,0 +1,173 @@
+# app/services/catalog_index.py
+"""Process-wide package -> (app_name, category key, display label) index.
+
+Dashboard her istekte tüm `app_catalog` x `app_category` join'ini belleğe
+alıyordu. Bu servis kataloğu bir kez yükler ve sonra sadece değişen satırları
+çeker:
+
+- `app_catalog.updated_at` watermark'ı; her yenilemede `updated_at > watermark
+  - güvenlik payı` satırları okunur (uzun süren transaction'lar commit'te daha
+  eski bir NOW() ile görünebildiği için pay bırakılır).
+- `app_category` küçük olduğu için her yenilemede tamamen okunur (etiket değişimi).
+- Silinen satırları yakalamak için seyrek aralıklarla tam yeniden yükleme.
+- Bu süreçte categorizer'ın yazdığı satırlar commit sonrası `apply_entries`
+  ile hemen indekse işlenir.
+
+Kompakt form: paket başına (app_name, category_id) tuple'ı; kategori id'leri
+ayrı küçük bir sözlükte key/etikete çözülür.
+"""
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, NamedTuple, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from app.models.core import AppCatalog, AppCategory
+from app.services.category_constants import (
+    DEFAULT_CATEGORY_KEY,
+    canonicalize_category_key,
+    display_label_for,
+)
+
+CATALOG_INDEX_REFRESH_SECONDS = float(os.getenv("CATALOG_INDEX_REFRESH_SECONDS", "30"))
+CATALOG_INDEX_FULL_RELOAD_SECONDS = float(os.getenv("CATALOG_INDEX_FULL_RELOAD_SECONDS", "3600"))
+CATALOG_INDEX_SAFETY_SECONDS = float(os.getenv("CATALOG_INDEX_SAFETY_SECONDS", "120"))
+
+
+class CatalogEntry(NamedTuple):
+    package_name: str
+    app_name: Optional[str]
+    category_key: Optional[str]  # kategorisiz paketlerde None
+    category_label: str
+
+
+class CatalogIndex:
+    def __init__(
+        self,
+        refresh_seconds: float = CATALOG_INDEX_REFRESH_SECONDS,
+        full_reload_seconds: float = CATALOG_INDEX_FULL_RELOAD_SECONDS,
+        safety_seconds: float = CATALOG_INDEX_SAFETY_SECONDS,
+    ):
+        self.refresh_seconds = refresh_seconds
+        self.full_reload_seconds = full_reload_seconds
+        self.safety = timedelta(seconds=safety_seconds)
+
+        self._apps: Dict[str, Tuple[Optional[str], Optional[int]]] = {}
+        # category_id -> (canonical key, display label)
+        self._categories: Dict[int, Tuple[str, str]] = {}
+        self._watermark: Optional[datetime] = None
+        self._checked_at = 0.0
+        self._loaded_at = 0.0
+        self._lock = threading.Lock()
+
+        self.full_loads = 0
+        self.incremental_refreshes = 0
+        self.rows_refreshed = 0
+
+    # --- lookups ---
+    def get(self, db: Session, package_name: str) -> Optional[CatalogEntry]:
+        self.ensure_fresh(db)
+        return self._entry(package_name)
+
+    def get_many(self, db: Session, packages: Iterable[str]) -> Dict[str, CatalogEntry]:
+        self.ensure_fresh(db)
+        found = {}
+        for pkg in packages:
+            entry = self._entry(pkg)
+            if entry is not None:
+                found[pkg] = entry
+        return found
+
+    def label_for(self, db: Session, package_name: str) -> str:
+        """Display label; katalogda yoksa varsayılan kategori etiketi."""
+        entry = self.get(db, package_name)
+        return entry.category_label if entry else display_label_for(DEFAULT_CATEGORY_KEY)
+
+    # --- maintenance ---
+    def ensure_fresh(self, db: Session):
+        now = time.monotonic()
+        if self._loaded_at and now - self._checked_at < self.refresh_seconds:
+            return
+        with self._lock:
+            now = time.monotonic()
+            if self._loaded_at and now - self._checked_at < self.refresh_seconds:
+                return
+            if not self._loaded_at or now - self._loaded_at >= self.full_reload_seconds:
+                self._full_load(db)
+                self._loaded_at = now
+            else:
+                self._refresh(db)
+            self._checked_at = now
+
+    def invalidate(self):
+        """Bir sonraki erişimde tam yeniden yükleme zorla."""
+        with self._lock:
+            self._loaded_at = 0.0
+
+    def apply_entries(self, entries: Iterable[AppCatalog]):
+        """Bu süreçte az önce commit edilmiş katalog satırlarını hemen indekse yaz."""
+        with self._lock:
+            for e in entries:
+                self._apps[e.package_name] = (e.app_name, e.category_id)
+                if e.category is not None:
+                    self._categories[e.category.id] = _category_tuple(e.category.key, e.category.display_name)
+
+    def stats(self) -> Dict:
+        return {
+            "packages": len(self._apps),
+            "categories": len(self._categories),
+            "watermark": self._watermark.isoformat() if self._watermark else None,
+            "full_loads": self.full_loads,
+            "incremental_refreshes": self.incremental_refreshes,
+            "rows_refreshed": self.rows_refreshed,
+        }
+
+    # --- internals ---
+    def _entry(self, package_name: str) -> Optional[CatalogEntry]:
+        app = self._apps.get(package_name)
+        if app is None:
+            return None
+        app_name, category_id = app
+        key, label = self._categories.get(category_id) or (None, display_label_for(DEFAULT_CATEGORY_KEY))
+        return CatalogEntry(package_name, app_name, key, label)
+
+    def _load_categories(self, db: Session):
+        self._categories = {
+            row.id: _category_tuple(row.key, row.display_name)
+            for row in db.query(AppCategory.id, AppCategory.key, AppCategory.display_name).all()
+        }
+
+    def _full_load(self, db: Session):
+        self._load_categories(db)
+        rows = db.query(
+            AppCatalog.package_name, AppCatalog.app_name, AppCatalog.category_id, AppCatalog.updated_at
+        ).all()
+        self._apps = {r.package_name: (r.app_name, r.category_id) for r in rows}
+        self._watermark = max((r.updated_at for r in rows if r.updated_at is not None), default=None)
+        self.full_loads += 1
+
+    def _refresh(self, db: Session):
+        self._load_categories(db)
+        query = db.query(
+            AppCatalog.package_name, AppCatalog.app_name, AppCatalog.category_id, AppCatalog.updated_at
+        )
+        if self._watermark is not None:
+            query = query.filter(AppCatalog.updated_at > self._watermark - self.safety)
+        rows = query.all()
+        for r in rows:
+            self._apps[r.package_name] = (r.app_name, r.category_id)
+            if r.updated_at is not None and (self._watermark is None or r.updated_at > self._watermark):
+                self._watermark = r.updated_at
+        self.incremental_refreshes += 1
+        self.rows_refreshed += len(rows)
+
+
+def _category_tuple(key: Optional[str], display_name: Optional[str]) -> Tuple[str, str]:
+    canonical = canonicalize_category_key(key)
+    return canonical, display_name or display_label_for(canonical)
+
+
+# Global erişim nesnesi
+catalog_index = CatalogIndex()
@@ -1,7 +1,9 @@
 # app/services/categorizer.py
 import os
+from typing import Dict, Iterable, List
 import pandas as pd
-from sqlalchemy.orm import Session
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session, joinedload
 from app.models.core import AppCatalog, AppCategory
 from app.services.category_constants import (
     CATEGORY_KEYS,
@@ -10,6 +12,8 @@ from app.services.category_constants import (
     canonicalize_category_key,
     display_label_for,
 )
+from app.services.catalog_index import CatalogEntry, catalog_index
+from app.services.dashboard_cache import dashboard_cache
 
 class CategoryDataset:
     _instance = None
@@ -82,103 +86,150 @@ dataset_loader = CategoryDataset()
 
 def get_or_create_app_entry(db: Session, package_name: str) -> AppCatalog:
     """
-    Uygulamayı katalogda bulur. Yoksa:
-    1. Dataset'e bakar.
-    2. Bulamazsa tahmin eder.
-    3. DB'ye kaydeder ve döner.
+    Tekil paket için geriye dönük uyumlu sarmalayıcı.
+    Toplu işlerde doğrudan get_or_create_app_entries kullanılmalı.
     """
-    # Dataset verisini baştan hazırla (varsa kullanırız)
-    dataset_category = dataset_loader.lookup_category(package_name)
-    predicted_category_key = canonicalize_category_key(dataset_category) if dataset_category else None
-    dataset_app_name = dataset_loader.lookup_app_name(package_name)
+    return get_or_create_app_entries(db, [package_name])[package_name]
 
-    # 1. Önce DB'ye bak (En hızlısı)
-    entry = db.query(AppCatalog).filter_by(package_name=package_name).first()
-    if entry:
-        updated = False
 
+def get_or_create_app_entries(db: Session, packages: Iterable[str], commit: bool = True) -> Dict[str, AppCatalog]:
+    """
+    Paketleri katalogda toplu olarak çözer ve {paket: AppCatalog} döner.
+    1. Mevcut kayıtlar tek bir IN sorgusuyla çekilir (generic isim / kategori düzeltmeleri yapılır).
+    2. Eksik paketler dataset'ten veya isimden tahminle hazırlanır.
+    3. Hepsi tek bir INSERT ... ON CONFLICT DO NOTHING ile yazılır, tek commit atılır.
+    commit=False: sadece flush; commit (ve indeks güncellemesi) çağırana kalır.
+    """
+    pkgs = sorted({p for p in packages if p is not None})
+    if not pkgs:
+        return {}
+
+    entries = {e.package_name: e for e in _query_catalog(db, pkgs)}
+    missing = [p for p in pkgs if p not in entries]
+
+    # Dataset tahminleri (varsa kullanırız)
+    dataset_keys: Dict[str, str | None] = {}
+    dataset_names: Dict[str, str | None] = {}
+    for pkg in pkgs:
+        dataset_category = dataset_loader.lookup_category(pkg)
+        dataset_keys[pkg] = canonicalize_category_key(dataset_category) if dataset_category else None
+        dataset_names[pkg] = dataset_loader.lookup_app_name(pkg)
+
+    # Hangi kategori key'lerine ihtiyaç olduğunu topla
+    wanted_keys: Dict[str, str] = {}
+    for pkg, entry in entries.items():
+        if entry.category is not None:
+            current_key = canonicalize_category_key(entry.category.key)
+            if current_key != entry.category.key:
+                wanted_keys[pkg] = current_key
+        elif entry.category_id is None and dataset_keys[pkg]:
+            wanted_keys[pkg] = dataset_keys[pkg]
+    for pkg in missing:
+        # Dataset'te de yoksa isminden tahmin et (Fallback)
+        wanted_keys[pkg] = canonicalize_category_key(dataset_keys[pkg] or _predict_category_fallback(pkg))
+
+    categories = _ensure_categories(db, set(wanted_keys.values()))
+    changed = False
+    # Mevcut bir paketin kategorisi/etiketi değişirse dashboard önbelleği geçersiz olur
+    recategorized = any(c in db.dirty for c in categories.values())
+
+    # 1. Mevcut kayıtları düzelt
+    for pkg, entry in entries.items():
         # Eğer isim generic ise dataset veya tahminle düzelt
         if _is_generic_name(entry.app_name):
-            candidate = dataset_app_name or _guess_app_name(package_name)
+            candidate = dataset_names[pkg] or _guess_app_name(pkg)
             if candidate and not _is_generic_name(candidate):
                 entry.app_name = candidate
-                updated = True
+                changed = True
+
+        target_key = wanted_keys.get(pkg)
+        if target_key and target_key in categories:
+            if entry.category_id != categories[target_key].id:
+                recategorized = True
+            entry.category_id = categories[target_key].id
+            changed = True
+
+    # 2. Eksikleri tek INSERT ile kataloğa kaydet
+    if missing:
+        rows = []
+        for pkg in missing:
+            category_obj = categories.get(wanted_keys[pkg])
+            rows.append({
+                "package_name": pkg,
+                "app_name": dataset_names[pkg] or _guess_app_name(pkg),
+                "category_id": category_obj.id if category_obj else None,
+            })
+        stmt = insert(AppCatalog).values(rows)
+        stmt = stmt.on_conflict_do_nothing(index_elements=[AppCatalog.package_name])
+        db.execute(stmt)
+        changed = True
+
+    if not changed and not db.dirty:
+        catalog_index.apply_entries(entries.values())
+        return entries
+
+    if not commit:
+        # Transaction çağıranda: commit edilmemiş satırlar indekse yazılmaz, artımlı
+        # yenileme (updated_at) onları commit sonrası alır
+        db.flush()
+        if recategorized:
+            dashboard_cache.bump_generation()
+        return {e.package_name: e for e in _query_catalog(db, pkgs)}
 
-        # Mevcut kategori canonical mı? Değilse eşle
-        if entry.category is not None:
-            current_key = canonicalize_category_key(entry.category.key)
-            if current_key != entry.category.key:
-                target_obj = db.query(AppCategory).filter_by(key=current_key).first()
-                if not target_obj:
-                    clean_name = display_label_for(current_key)
-                    target_obj = AppCategory(key=current_key, display_name=clean_name)
-                    db.add(target_obj)
-                    db.flush()
-                entry.category_id = target_obj.id
-                updated = True
-
-        # Kategorisi boşsa dataset tahminini yaz
-        if entry.category_id is None and predicted_category_key:
-            category_obj = db.query(AppCategory).filter_by(key=predicted_category_key).first()
-            if not category_obj:
-                clean_name = display_label_for(predicted_category_key)
-                category_obj = AppCategory(key=predicted_category_key, display_name=clean_name)
-                db.add(category_obj)
-                db.flush()
-            else:
-                desired_label = display_label_for(predicted_category_key)
-                if category_obj.display_name != desired_label:
-                    category_obj.display_name = desired_label
-                    db.flush()
-            entry.category_id = category_obj.id
-            updated = True
-
-        if updated:
-            db.commit()
-            db.refresh(entry)
-
-        return entry
-    
-    # 3. Dataset'te de yoksa, isminden tahmin et (Fallback)
-    if not predicted_category_key:
-        predicted_category_key = _predict_category_fallback(package_name)
-
-    if predicted_category_key:
-        predicted_category_key = canonicalize_category_key(predicted_category_key)
-
-    # 4. Kategori Objesini DB'den çek veya yarat
-    category_obj = None
-    if predicted_category_key:
-        # Normalize et (lowercase) ve kullanıcıya güzel isim ver (game_action -> Game Action)
-        predicted_category_key = canonicalize_category_key(predicted_category_key)
-        clean_name = display_label_for(predicted_category_key)
-        
-        category_obj = db.query(AppCategory).filter_by(key=predicted_category_key).first()
-        if not category_obj:
-            category_obj = AppCategory(key=predicted_category_key, display_name=clean_name)
-            db.add(category_obj)
-            db.flush() # ID oluşsun diye
-        elif category_obj.display_name != clean_name:
-            category_obj.display_name = clean_name
-            db.flush()
-
-    # 5. Uygulama ismini belirle: dataset'te varsa onu kullan, yoksa tahmin et
-    if dataset_app_name:
-        app_name_guess = dataset_app_name
-    else:
-        app_name_guess = _guess_app_name(package_name)
-    
-    # 6. Kataloğa Kaydet
-    entry = AppCatalog(
-        package_name=package_name,
-        app_name=app_name_guess,
-        category_id=category_obj.id if category_obj else None
-    )
-    db.add(entry)
     db.commit()
-    db.refresh(entry)
-    
-    return entry
+    if recategorized:
+        dashboard_cache.bump_generation()
+    # Commit sonrası nesneler expire olur; tek sorguyla taze haliyle geri yükle
+    fresh = {e.package_name: e for e in _query_catalog(db, pkgs)}
+    catalog_index.apply_entries(fresh.values())
+    return fresh
+
+
+def resolve_catalog(db: Session, packages: Iterable[str]) -> Dict[str, CatalogEntry]:
+    """
+    Paket -> CatalogEntry, ortak CatalogIndex üzerinden.
+    Sadece indekste olmayan paketler için DB'ye gidilir (yoksa kataloğa eklenir).
+    """
+    pkgs = {p for p in packages if p is not None}
+    found = catalog_index.get_many(db, pkgs)
+    missing = pkgs - found.keys()
+    if missing:
+        get_or_create_app_entries(db, missing)
+        found.update(catalog_index.get_many(db, missing))
+    return found
+
+
+def _query_catalog(db: Session, packages: List[str]) -> List[AppCatalog]:
+    return (
+        db.query(AppCatalog)
+        .options(joinedload(AppCatalog.category))
+        .filter(AppCatalog.package_name.in_(packages))
+        .all()
+    )
+
+
+def _ensure_categories(db: Session, keys: Iterable[str]) -> Dict[str, AppCategory]:
+    """Verilen canonical key'ler için AppCategory satırlarını bulur, eksikleri toplu yaratır."""
+    keys = sorted(set(keys))
+    if not keys:
+        return {}
+
+    found = {c.key: c for c in db.query(AppCategory).filter(AppCategory.key.in_(keys)).all()}
+    absent = [k for k in keys if k not in found]
+    if absent:
+        stmt = insert(AppCategory).values(
+            [{"key": k, "display_name": display_label_for(k)} for k in absent]
+        )
+        stmt = stmt.on_conflict_do_nothing(index_elements=[AppCategory.key])
+        db.execute(stmt)
+        found = {c.key: c for c in db.query(AppCategory).filter(AppCategory.key.in_(keys)).all()}
+
+    # Görünen isimleri Türkçe etiketlerle hizala
+    for key, category_obj in found.items():
+        desired_label = display_label_for(key)
+        if category_obj.display_name != desired_label:
+            category_obj.display_name = desired_label
+    return found
 
 def _predict_category_fallback(package_name: str) -> str:
     """
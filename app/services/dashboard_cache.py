@@ -0,0 +1,295 @@
+# app/services/dashboard_cache.py
+"""Per-user snapshot cache for the assembled `DashboardResponse`.
+
+Anahtar: `dash:{gen}:{user_id}:{uver}:{today}[:{variant}]`
+
+- `gen`: global nesil; katalog kategorisi değişince artar (tüm kullanıcıların
+  kategori etiketleri etkilenir).
+- `uver`: kullanıcı sürümü; o kullanıcı için yeni kullanım yazılınca artar.
+  Okuma anında alınan sürümle yazıldığı için, hesaplama sırasında gelen bir
+  invalidation eski sonucu geçersiz bırakır (yarış durumunda bayat veri dönmez).
+- `today`: gün dönünce pencere kayar, eski anahtar TTL ile düşer.
+
+Backend seçimi `DASHBOARD_CACHE_BACKEND` ile: `memory` (süreç içi LRU + TTL),
+`redis` (RESP protokolü konuşan herhangi bir sunucu) veya `off`. Birden fazla
+worker süreci varsa invalidation'ın hepsine ulaşması için `redis` gerekir.
+Redis hatası isteği bozmaz; önbellek atlanır ve `errors` sayacı artar.
+"""
+import os
+import socket
+import threading
+import time
+from collections import OrderedDict
+from datetime import date
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+from uuid import UUID
+
+from app.schemas.usage import DashboardResponse
+
+DASHBOARD_CACHE_BACKEND = os.getenv("DASHBOARD_CACHE_BACKEND", "memory").lower()
+DASHBOARD_CACHE_TTL_SECONDS = int(os.getenv("DASHBOARD_CACHE_TTL_SECONDS", "60"))
+DASHBOARD_CACHE_MAX_ENTRIES = int(os.getenv("DASHBOARD_CACHE_MAX_ENTRIES", "10000"))
+DASHBOARD_CACHE_REDIS_URL = os.getenv("DASHBOARD_CACHE_REDIS_URL", "redis://localhost:6379/0")
+
+_GEN_KEY = "dash:gen"
+
+
+def _user_version_key(user_id: UUID) -> str:
+    return f"dash:uver:{user_id}"
+
+
+class LRUTTLBackend:
+    """In-process LRU with per-entry TTL. Sayaçlar (version) TTL'siz tutulur."""
+
+    name = "memory"
+
+    def __init__(self, max_entries: int = DASHBOARD_CACHE_MAX_ENTRIES):
+        self.max_entries = max(max_entries, 1)
+        self._data: "OrderedDict[str, Tuple[float, bytes]]" = OrderedDict()
+        self._counters: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def get_counters(self, keys: List[str]) -> List[int]:
+        with self._lock:
+            return [self._counters.get(k, 0) for k in keys]
+
+    def incr(self, key: str) -> int:
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + 1
+            return self._counters[key]
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            expires_at, value = item
+            if expires_at <= time.monotonic():
+                del self._data[key]
+                self.evictions += 1
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: bytes, ttl_seconds: int):
+        with self._lock:
+            self._data[key] = (time.monotonic() + ttl_seconds, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def size(self) -> int:
+        with self._lock:
+            return len(self._data)
+
+
+class RedisBackend:
+    """
+    Minimal RESP client (GET/SET EX/MGET/INCR) over a single socket.
+
+    redis-py bağımlılığı eklememek için sadece ihtiyaç duyulan komutlar;
+    RESP konuşan yerel bir stand-in (redis, valkey, KeyDB, test sunucusu) yeterli.
+    Tahliye (eviction) sunucunun maxmemory politikasına aittir.
+    """
+
+    name = "redis"
+
+    def __init__(self, url: str = DASHBOARD_CACHE_REDIS_URL, timeout: float = 0.5):
+        parsed = urlparse(url)
+        self.host = parsed.hostname or "localhost"
+        self.port = parsed.port or 6379
+        self.password = parsed.password
+        self.db = int((parsed.path or "/0").lstrip("/") or 0)
+        self.timeout = timeout
+        self._sock: Optional[socket.socket] = None
+        self._reader = None
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    # --- cache API ---
+    def get_counters(self, keys: List[str]) -> List[int]:
+        return [int(v) if v is not None else 0 for v in self._call("MGET", *keys)]
+
+    def incr(self, key: str) -> int:
+        return int(self._call("INCR", key))
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self._call("GET", key)
+
+    def set(self, key: str, value: bytes, ttl_seconds: int):
+        self._call("SET", key, value, "EX", str(ttl_seconds))
+
+    def size(self) -> Optional[int]:
+        return None
+
+    # --- RESP ---
+    def _call(self, *args):
+        with self._lock:
+            try:
+                self._ensure_connected()
+                self._send(args)
+                return self._read_reply()
+            except (OSError, ConnectionError):
+                self._close()
+                raise
+
+    def _ensure_connected(self):
+        if self._sock is not None:
+            return
+        sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        self._sock = sock
+        self._reader = sock.makefile("rb")
+        if self.password:
+            self._send(("AUTH", self.password))
+            self._read_reply()
+        if self.db:
+            self._send(("SELECT", str(self.db)))
+            self._read_reply()
+
+    def _send(self, args):
+        parts = [f"*{len(args)}\r\n".encode()]
+        for arg in args:
+            data = arg if isinstance(arg, bytes) else str(arg).encode()
+            parts.append(f"${len(data)}\r\n".encode() + data + b"\r\n")
+        self._sock.sendall(b"".join(parts))
+
+    def _read_reply(self):
+        line = self._reader.readline()
+        if not line:
+            raise ConnectionError("redis connection closed")
+        kind, payload = line[:1], line[1:-2]
+        if kind == b"+":
+            return payload.decode()
+        if kind == b"-":
+            raise RedisError(payload.decode())
+        if kind == b":":
+            return int(payload)
+        if kind == b"$":
+            length = int(payload)
+            if length < 0:
+                return None
+            data = self._reader.read(length + 2)
+            return data[:-2]
+        if kind == b"*":
+            count = int(payload)
+            if count < 0:
+                return None
+            return [self._read_reply() for _ in range(count)]
+        raise ConnectionError(f"unexpected RESP reply: {line!r}")
+
+    def _close(self):
+        try:
+            if self._sock is not None:
+                self._sock.close()
+        finally:
+            self._sock = None
+            self._reader = None
+
+
+class RedisError(Exception):
+    """Error reply from the RESP server."""
+
+
+class DashboardCache:
+    def __init__(self, backend=None, ttl_seconds: int = DASHBOARD_CACHE_TTL_SECONDS):
+        self.backend = backend
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.invalidations = 0
+        self.generation_bumps = 0
+        self.errors = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.backend is not None
+
+    def lookup(
+        self, user_id: UUID, today: date, variant: str = ""
+    ) -> Tuple[Optional[DashboardResponse], Optional[str]]:
+        """
+        Return (cached response or None, key to store a fresh response under).
+        Anahtar okuma anındaki sürümlerle kurulur; `store` aynı anahtarı kullanmalıdır.
+        `variant` aynı kullanıcı için farklı yanıt biçimlerini (ör. top_n) ayırır.
+        """
+        if not self.enabled:
+            return None, None
+        try:
+            gen, uver = self.backend.get_counters([_GEN_KEY, _user_version_key(user_id)])
+            key = f"dash:{gen}:{user_id}:{uver}:{today.isoformat()}"
+            if variant:
+                key = f"{key}:{variant}"
+            raw = self.backend.get(key)
+        except Exception as e:
+            self._error("lookup", e)
+            return None, None
+        if raw is None:
+            self.misses += 1
+            return None, key
+        self.hits += 1
+        return DashboardResponse.model_validate_json(raw), key
+
+    def store(self, key: Optional[str], response: DashboardResponse):
+        if not self.enabled or key is None:
+            return
+        try:
+            self.backend.set(key, response.model_dump_json().encode(), self.ttl_seconds)
+            self.stores += 1
+        except Exception as e:
+            self._error("store", e)
+
+    def invalidate_user(self, user_id: UUID):
+        """Kullanıcının yeni verisi yazıldı: sürümü artır, mevcut girdi bir daha okunmaz."""
+        if not self.enabled:
+            return
+        try:
+            self.backend.incr(_user_version_key(user_id))
+            self.invalidations += 1
+        except Exception as e:
+            self._error("invalidate", e)
+
+    def bump_generation(self):
+        """Katalog kategorileri değişti: tüm kullanıcıların girdilerini geçersiz kıl."""
+        if not self.enabled:
+            return
+        try:
+            self.backend.incr(_GEN_KEY)
+            self.generation_bumps += 1
+        except Exception as e:
+            self._error("bump_generation", e)
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            "backend": self.backend.name if self.enabled else "off",
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 3) if lookups else None,
+            "stores": self.stores,
+            "evictions": getattr(self.backend, "evictions", 0) if self.enabled else 0,
+            "invalidations": self.invalidations,
+            "generation_bumps": self.generation_bumps,
+            "errors": self.errors,
+            "entries": self.backend.size() if self.enabled else 0,
+        }
+
+    def _error(self, op: str, e: Exception):
+        self.errors += 1
+        print(f"DASHBOARD CACHE {op} failed: {e}")
+
+
+def _build_backend():
+    if DASHBOARD_CACHE_BACKEND == "redis":
+        return RedisBackend(DASHBOARD_CACHE_REDIS_URL)
+    if DASHBOARD_CACHE_BACKEND == "memory":
+        return LRUTTLBackend(DASHBOARD_CACHE_MAX_ENTRIES)
+    return None
+
+
+# Global erişim nesnesi
+dashboard_cache = DashboardCache(_build_backend())
@@ -0,0 +1,92 @@
+# app/services/dashboard_query.py
+"""SQL-side per-day app breakdown for the dashboard.
+
+Günlük toplamlar ve uygulama sıralaması Postgres'te yapılır:
+(usage_date, package_name) bazında cihazlar arası GROUP BY, ardından gün
+içinde ROW_NUMBER ile sıralama. `top_n` verilirse gün başına sadece ilk N
+uygulama ve geri kalanların toplamı olan tek bir "Diğer" satırı döner; böylece
+yüzlerce uygulaması olan kullanıcılarda da yanıt boyutu ve CPU sınırlı kalır.
+
+Dakikalar eski Python yoluyla aynı hesaplanır: her cihaz satırı için
+`total_seconds // 60`, sonra toplam.
+"""
+from datetime import date
+from typing import Dict, List, Optional
+from uuid import UUID
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+OTHER_PACKAGE_NAME = "other"
+OTHER_LABEL = "Diğer"
+
+_BREAKDOWN_SQL = text(
+    """
+WITH per_app AS (
+    SELECT usage_date,
+           package_name,
+           SUM(COALESCE(total_seconds, 0) / 60) AS minutes,
+           (ARRAY_AGG(app_name ORDER BY updated_at DESC NULLS LAST))[1] AS app_name
+    FROM daily_usage_log
+    WHERE user_id = :user_id
+      AND usage_date BETWEEN :start_date AND :end_date
+    GROUP BY usage_date, package_name
+),
+ranked AS (
+    SELECT usage_date,
+           package_name,
+           app_name,
+           minutes,
+           ROW_NUMBER() OVER (PARTITION BY usage_date ORDER BY minutes DESC, package_name) AS rn,
+           SUM(minutes) OVER (PARTITION BY usage_date) AS day_total
+    FROM per_app
+)
+SELECT usage_date, package_name, app_name, minutes, day_total, rn
+FROM ranked
+WHERE CAST(:top_n AS int) IS NULL OR rn <= :top_n
+UNION ALL
+SELECT usage_date, NULL, NULL, SUM(minutes), MAX(day_total), MAX(rn)
+FROM ranked
+WHERE CAST(:top_n AS int) IS NOT NULL AND rn > :top_n
+GROUP BY usage_date
+ORDER BY usage_date, rn
+"""
+)
+
+
+def daily_app_breakdown(
+    db: Session,
+    user_id: UUID,
+    start_date: date,
+    end_date: date,
+    top_n: Optional[int] = None,
+) -> Dict[date, dict]:
+    """
+    {usage_date: {"total": dakika, "apps": [dict, ...]}} for days that have data.
+
+    Uygulamalar dakikaya göre azalan sıradadır; `top_n` verilmişse son eleman
+    `package_name=None` olan "Diğer" kovasıdır (kaç uygulamayı topladığı `count`).
+    """
+    rows = db.execute(
+        _BREAKDOWN_SQL,
+        {"user_id": user_id, "start_date": start_date, "end_date": end_date, "top_n": top_n},
+    ).all()
+
+    days: Dict[date, dict] = {}
+    for row in rows:
+        day = days.setdefault(row.usage_date, {"total": int(row.day_total or 0), "apps": []})
+        apps: List[dict] = day["apps"]
+        if row.package_name is None:
+            apps.append({
+                "package_name": None,
+                "app_name": None,
+                "minutes": int(row.minutes or 0),
+                "count": int(row.rn) - (top_n or 0),
+            })
+        else:
+            apps.append({
+                "package_name": row.package_name,
+                "app_name": row.app_name,
+                "minutes": int(row.minutes or 0),
+            })
+    return days
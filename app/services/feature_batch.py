@@ -0,0 +1,209 @@
+# app/services/feature_batch.py
+"""Set-based feature_daily computation for many (user, date) pairs.
+
+`analytics.calculate_daily_features` tek kullanıcı/gün için ORM ile çalışır.
+Buradaki motor aynı metrikleri (toplam dakika, gece dakikası, oyun/sosyal oranı,
+oturum sayısı) istenen tüm (user_id, tarih) çiftleri için tek bir SQL ifadesinde
+hesaplar ve feature_daily'ye toplu upsert eder.
+
+- Oturum, başladığı yerel güne yazılır (TR saati, Python yoluyla aynı).
+- Gece dakikası, oturumun tstzrange'i ile kullanıcının gece penceresi
+  (varsayılan 22:00-07:00, gece yarısını aşabilir) aralıklarının kesişimidir.
+- Kategori, app_catalog/app_category üzerinden; alias'lı eski key'ler de sayılır.
+"""
+from datetime import date, timedelta
+from typing import Iterable, List, Optional, Tuple
+from uuid import UUID
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.models.core import User
+from app.services.category_constants import (
+    CATEGORY_ALIASES,
+    CATEGORY_KEYS,
+    canonicalize_category_key,
+)
+
+# TR_TZ (UTC+3) ile aynı; Postgres tarafında isimli bölge kullanılıyor
+LOCAL_TZ_NAME = "Europe/Istanbul"
+
+# Bir SQL ifadesinde işlenecek en fazla (user, gün) çifti
+MAX_PAIRS_PER_STATEMENT = 20_000
+
+
+def _keys_for(canonical: str) -> List[str]:
+    candidates = set(CATEGORY_KEYS) | set(CATEGORY_ALIASES)
+    return sorted(k for k in candidates if canonicalize_category_key(k) == canonical)
+
+
+GAMING_KEYS = _keys_for("games")
+SOCIAL_KEYS = _keys_for("social")
+
+
+_FEATURE_UPSERT_SQL = text(
+    """
+WITH targets AS (
+    SELECT DISTINCT t.user_id, t.day
+    FROM unnest(CAST(:user_ids AS uuid[]), CAST(:days AS date[])) AS t(user_id, day)
+),
+bounds AS (
+    SELECT tg.user_id,
+           tg.day,
+           tstzrange(tg.day::timestamp AT TIME ZONE :tz, (tg.day + 1)::timestamp AT TIME ZONE :tz, '[)') AS day_range,
+           COALESCE(us.nightly_start, TIME '22:00') AS night_start,
+           COALESCE(us.nightly_end, TIME '07:00') AS night_end
+    FROM targets tg
+    LEFT JOIN user_settings us ON us.user_id = tg.user_id
+),
+sess AS (
+    SELECT b.user_id,
+           b.day,
+           s.started_at,
+           EXTRACT(EPOCH FROM (s.ended_at - s.started_at)) AS seconds,
+           COALESCE(n.night_seconds, 0) AS night_seconds,
+           k.key AS category_key
+    FROM bounds b
+    JOIN app_session s
+      ON s.user_id = b.user_id
+     AND b.day_range @> s.started_at
+    LEFT JOIN app_catalog c ON c.package_name = s.package_name
+    LEFT JOIN app_category k ON k.id = c.category_id
+    LEFT JOIN LATERAL (
+        SELECT SUM(EXTRACT(EPOCH FROM upper(w.overlap) - lower(w.overlap))) AS night_seconds
+        FROM (
+            SELECT tstzrange(s.started_at, s.ended_at) * tstzrange(
+                       (g.d + b.night_start) AT TIME ZONE :tz,
+                       (g.d + b.night_end
+                            + CASE WHEN b.night_start > b.night_end THEN INTERVAL '1 day' ELSE INTERVAL '0' END
+                       ) AT TIME ZONE :tz
+                   ) AS overlap
+            FROM generate_series(
+                     (s.started_at AT TIME ZONE :tz)::date - 1,
+                     (s.ended_at AT TIME ZONE :tz)::date,
+                     INTERVAL '1 day'
+                 ) AS g(d)
+            WHERE s.ended_at > s.started_at
+        ) w
+        WHERE NOT isempty(w.overlap)
+    ) n ON TRUE
+),
+agg AS (
+    SELECT b.user_id,
+           b.day,
+           COALESCE(SUM(ss.seconds) FILTER (WHERE ss.seconds > 0), 0)::float8 AS total_seconds,
+           COALESCE(SUM(ss.night_seconds) FILTER (WHERE ss.seconds > 0), 0)::float8 AS night_seconds,
+           COALESCE(SUM(ss.seconds) FILTER (WHERE ss.seconds > 0 AND ss.category_key = ANY(:gaming_keys)), 0)::float8 AS gaming_seconds,
+           COALESCE(SUM(ss.seconds) FILTER (WHERE ss.seconds > 0 AND ss.category_key = ANY(:social_keys)), 0)::float8 AS social_seconds,
+           COUNT(ss.started_at) AS session_count
+    FROM bounds b
+    LEFT JOIN sess ss ON ss.user_id = b.user_id AND ss.day = b.day
+    GROUP BY b.user_id, b.day
+)
+INSERT INTO feature_daily (
+    user_id, date, total_minutes, night_minutes, gaming_ratio, social_ratio,
+    session_count, weekday, weekend, is_holiday,
+    total_seconds, night_seconds, gaming_seconds, social_seconds
+)
+SELECT a.user_id,
+       a.day,
+       FLOOR(a.total_seconds / 60)::int,
+       FLOOR(a.night_seconds / 60)::int,
+       ROUND((a.gaming_seconds / GREATEST(a.total_seconds, 60))::numeric, 2),
+       ROUND((a.social_seconds / GREATEST(a.total_seconds, 60))::numeric, 2),
+       a.session_count,
+       EXTRACT(ISODOW FROM a.day)::smallint - 1,
+       EXTRACT(ISODOW FROM a.day) >= 6,
+       EXTRACT(ISODOW FROM a.day) >= 6,
+       a.total_seconds, a.night_seconds, a.gaming_seconds, a.social_seconds
+FROM agg a
+ON CONFLICT (user_id, date) DO UPDATE SET
+    total_minutes = EXCLUDED.total_minutes,
+    night_minutes = EXCLUDED.night_minutes,
+    gaming_ratio = EXCLUDED.gaming_ratio,
+    social_ratio = EXCLUDED.social_ratio,
+    session_count = EXCLUDED.session_count,
+    weekday = EXCLUDED.weekday,
+    weekend = EXCLUDED.weekend,
+    is_holiday = EXCLUDED.is_holiday,
+    total_seconds = EXCLUDED.total_seconds,
+    night_seconds = EXCLUDED.night_seconds,
+    gaming_seconds = EXCLUDED.gaming_seconds,
+    social_seconds = EXCLUDED.social_seconds
+"""
+)
+
+
+_LOCK_USERS_SQL = text(
+    """
+SELECT pg_advisory_xact_lock(k)
+FROM (
+    SELECT DISTINCT hashtext('feature_daily:' || u) AS k
+    FROM unnest(CAST(:user_ids AS text[])) AS u
+    ORDER BY k
+) AS keys
+"""
+)
+
+
+def lock_feature_users(db: Session, user_ids: Iterable) -> None:
+    """
+    Kullanıcı başına transaction advisory lock (commit/rollback'te bırakılır).
+
+    Tam hesap ile ingest deltası aynı kullanıcının feature_daily satırlarını
+    sırayla yazsın: kilidi alan tam hesap, sonraki ifadesinde daha önce commit
+    edilmiş oturumları görür; delta ise tam hesabın commit'inden sonra üstüne
+    eklenir. Kilitler anahtar sırasıyla alınır (deadlock olmasın).
+    """
+    ids = sorted({str(u) for u in user_ids})
+    if ids:
+        db.execute(_LOCK_USERS_SQL, {"user_ids": ids})
+
+
+def compute_features_batch(db: Session, targets: Iterable[Tuple[UUID, date]]) -> int:
+    """
+    Recompute feature_daily for every (user_id, date) in `targets`.
+
+    Oturumu olmayan günler de 0'larla yazılır (Python yolu gibi idempotent).
+    Dönen değer upsert edilen satır sayısıdır; commit çağırana aittir.
+    """
+    pairs = sorted({(str(u), d) for u, d in targets})
+    lock_feature_users(db, {u for u, _ in pairs})
+    written = 0
+    for i in range(0, len(pairs), MAX_PAIRS_PER_STATEMENT):
+        chunk = pairs[i:i + MAX_PAIRS_PER_STATEMENT]
+        result = db.execute(
+            _FEATURE_UPSERT_SQL,
+            {
+                "user_ids": [u for u, _ in chunk],
+                "days": [d for _, d in chunk],
+                "tz": LOCAL_TZ_NAME,
+                "gaming_keys": GAMING_KEYS,
+                "social_keys": SOCIAL_KEYS,
+            },
+        )
+        written += result.rowcount or 0
+    return written
+
+
+def rebuild_features(
+    db: Session,
+    start: date,
+    end: date,
+    user_ids: Optional[List[UUID]] = None,
+    users_per_batch: int = 500,
+) -> int:
+    """
+    Rebuild [start, end] for the given users (default: all users).
+    Her kullanıcı grubu ayrı transaction'da yazılır; uzun süren kilitler oluşmaz.
+    """
+    if user_ids is None:
+        user_ids = [row.id for row in db.query(User.id).all()]
+
+    days = [start + timedelta(days=i) for i in range((end - start).days + 1)]
+    written = 0
+    for i in range(0, len(user_ids), users_per_batch):
+        group = user_ids[i:i + users_per_batch]
+        written += compute_features_batch(db, [(u, d) for u in group for d in days])
+        db.commit()
+    return written
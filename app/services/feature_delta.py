@@ -0,0 +1,228 @@
+# app/services/feature_delta.py
+"""Incremental feature_daily updates from newly inserted sessions.
+
+Ingest, `app_session`'a gerçekten eklenen satırları (ON CONFLICT'e takılmayanlar,
+RETURNING ile) buraya verir. Her oturumun katkısı başladığı yerel güne
+eklenir: toplam/gece/oyun/sosyal saniye ve session_count. Dakika ve oran
+kolonları bu saniye kolonlarından aynı ifadede türetilir, böylece günün tüm
+oturumlarını yeniden taramak gerekmez.
+
+- Saniye kolonları NULL olan eski satırlara delta uygulanmaz; bu anahtarlar
+  tam hesap için geri döndürülür.
+- Kategori değişiklikleri gibi deltaların göremediği durumlar için son
+  günler periyodik olarak `feature_batch` ile yeniden hesaplanır (onarım işi;
+  sadece o günlerde oturumu olan kullanıcılar).
+- Delta ve tam hesap kullanıcı başına advisory lock (`lock_feature_users`)
+  altında yazar; eşzamanlı tam hesap commit edilmiş bir deltayı ezmez.
+"""
+import os
+from collections import defaultdict
+from datetime import date, datetime, time, timedelta, timezone
+from typing import Dict, Iterable, List, Sequence, Set, Tuple
+from uuid import UUID
+
+import numpy as np
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.db import SessionLocal
+from app.models.core import UserSettings
+from app.services.catalog_index import catalog_index
+from app.services.category_constants import canonicalize_category_key
+from app.services.feature_batch import lock_feature_users, rebuild_features
+from app.services.night_window import NightWindow, to_epoch_us
+from app.services.periodic import PeriodicJob
+from app.services.usage_aggregation import TR_OFFSET_US, US_PER_DAY, US_PER_SECOND, local_day_to_date
+
+# incremental: ingest deltaları uygular; recompute: eski davranış (gün başına tam hesap)
+FEATURE_UPDATE_MODE = os.getenv("FEATURE_UPDATE_MODE", "incremental").lower()
+FEATURE_REPAIR_INTERVAL_SECONDS = float(os.getenv("FEATURE_REPAIR_INTERVAL_SECONDS", "3600"))
+FEATURE_REPAIR_DAYS = int(os.getenv("FEATURE_REPAIR_DAYS", "2"))
+
+# (user_id, package_name, started_at, ended_at, device_id) - ingest RETURNING sırası
+SessionRow = Tuple[UUID, str, object, object, UUID]
+FeatureKey = Tuple[UUID, date]
+
+TR_TZ = timezone(timedelta(microseconds=TR_OFFSET_US))  # ingest.TR_TZ ile aynı
+
+_RECENT_USERS_SQL = text(
+    """
+SELECT DISTINCT user_id
+FROM app_session
+WHERE started_at >= :start AND started_at < :end
+"""
+)
+
+# İndekste olmayan paketler (spool'un commit edilmemiş katalog satırları, başka
+# süreçte eklenenler) aynı transaction'da DB'den okunur
+_CATEGORY_SQL = text(
+    """
+SELECT c.package_name, k.key
+FROM app_catalog c
+JOIN app_category k ON k.id = c.category_id
+WHERE c.package_name = ANY(CAST(:packages AS text[]))
+"""
+)
+
+_DELTA_UPSERT_SQL = text(
+    """
+INSERT INTO feature_daily AS f (
+    user_id, date, total_minutes, night_minutes, gaming_ratio, social_ratio, session_count,
+    weekday, weekend, is_holiday, total_seconds, night_seconds, gaming_seconds, social_seconds
+)
+SELECT d.user_id, d.day,
+       FLOOR(d.total_seconds / 60)::int,
+       FLOOR(d.night_seconds / 60)::int,
+       ROUND((d.gaming_seconds / GREATEST(d.total_seconds, 60))::numeric, 2),
+       ROUND((d.social_seconds / GREATEST(d.total_seconds, 60))::numeric, 2),
+       d.session_count,
+       EXTRACT(ISODOW FROM d.day)::smallint - 1,
+       EXTRACT(ISODOW FROM d.day) >= 6,
+       EXTRACT(ISODOW FROM d.day) >= 6,
+       d.total_seconds, d.night_seconds, d.gaming_seconds, d.social_seconds
+FROM unnest(
+    CAST(:user_ids AS uuid[]), CAST(:days AS date[]),
+    CAST(:total AS float8[]), CAST(:night AS float8[]),
+    CAST(:gaming AS float8[]), CAST(:social AS float8[]),
+    CAST(:counts AS int[])
+) AS d(user_id, day, total_seconds, night_seconds, gaming_seconds, social_seconds, session_count)
+ON CONFLICT (user_id, date) DO UPDATE SET
+    total_seconds = f.total_seconds + EXCLUDED.total_seconds,
+    night_seconds = f.night_seconds + EXCLUDED.night_seconds,
+    gaming_seconds = f.gaming_seconds + EXCLUDED.gaming_seconds,
+    social_seconds = f.social_seconds + EXCLUDED.social_seconds,
+    session_count = COALESCE(f.session_count, 0) + EXCLUDED.session_count,
+    total_minutes = FLOOR((f.total_seconds + EXCLUDED.total_seconds) / 60)::int,
+    night_minutes = FLOOR((f.night_seconds + EXCLUDED.night_seconds) / 60)::int,
+    gaming_ratio = ROUND(((f.gaming_seconds + EXCLUDED.gaming_seconds)
+                          / GREATEST(f.total_seconds + EXCLUDED.total_seconds, 60))::numeric, 2),
+    social_ratio = ROUND(((f.social_seconds + EXCLUDED.social_seconds)
+                          / GREATEST(f.total_seconds + EXCLUDED.total_seconds, 60))::numeric, 2)
+WHERE f.total_seconds IS NOT NULL
+  AND f.night_seconds IS NOT NULL
+  AND f.gaming_seconds IS NOT NULL
+  AND f.social_seconds IS NOT NULL
+RETURNING f.user_id, f.date
+"""
+)
+
+
+def incremental_enabled() -> bool:
+    return FEATURE_UPDATE_MODE == "incremental"
+
+
+def apply_session_deltas(db: Session, inserted: Sequence[SessionRow]) -> Set[FeatureKey]:
+    """
+    Add the contribution of freshly inserted sessions to feature_daily.
+
+    Dönen küme deltanın uygulanamadığı (saniye kolonları boş eski satır)
+    anahtarlardır; çağıran bunlar için tam hesap planlamalıdır. Commit çağırana aittir.
+    """
+    rows = [r for r in inserted if r[2] is not None and r[3] is not None]
+    if not rows:
+        return set()
+
+    start_us = np.fromiter((to_epoch_us(r[2]) for r in rows), dtype=np.int64, count=len(rows))
+    end_us = np.fromiter((to_epoch_us(r[3]) for r in rows), dtype=np.int64, count=len(rows))
+    seconds = np.maximum(end_us - start_us, 0) / US_PER_SECOND
+    local_day = (start_us + TR_OFFSET_US) // US_PER_DAY
+
+    # Gece: kullanıcı başına derlenmiş pencere, kullanıcının tüm oturumlarına tek seferde
+    night = np.zeros(len(rows), dtype=np.float64)
+    by_user: Dict[UUID, List[int]] = defaultdict(list)
+    for i, r in enumerate(rows):
+        by_user[r[0]].append(i)
+    windows = _night_windows(db, by_user.keys())
+    for user_id, positions in by_user.items():
+        pos = np.asarray(positions)
+        night[pos] = windows.get(user_id, NightWindow.from_times()).overlap_seconds_us(start_us[pos], end_us[pos])
+
+    categories = _category_keys(db, {r[1] for r in rows})
+
+    totals: Dict[FeatureKey, List[float]] = {}
+    day_cache: Dict[int, date] = {}
+    for i, r in enumerate(rows):
+        d = int(local_day[i])
+        usage_date = day_cache.get(d) or day_cache.setdefault(d, local_day_to_date(d))
+        acc = totals.setdefault((r[0], usage_date), [0.0, 0.0, 0.0, 0.0, 0])
+        acc[4] += 1
+        if seconds[i] <= 0:
+            continue
+        category = categories.get(r[1])
+        acc[0] += float(seconds[i])
+        acc[1] += float(night[i])
+        if category == "games":
+            acc[2] += float(seconds[i])
+        elif category == "social":
+            acc[3] += float(seconds[i])
+
+    keys = list(totals)
+    # Eşzamanlı tam hesap (onarım / scheduler) bu kullanıcıların satırlarını ezmesin
+    lock_feature_users(db, {u for u, _ in keys})
+    result = db.execute(
+        _DELTA_UPSERT_SQL,
+        {
+            "user_ids": [str(u) for u, _ in keys],
+            "days": [d for _, d in keys],
+            "total": [totals[k][0] for k in keys],
+            "night": [totals[k][1] for k in keys],
+            "gaming": [totals[k][2] for k in keys],
+            "social": [totals[k][3] for k in keys],
+            "counts": [totals[k][4] for k in keys],
+        },
+    )
+    applied = {(UUID(str(u)), d) for u, d in result.all()}
+    return {(UUID(str(u)), d) for u, d in keys} - applied
+
+
+def _night_windows(db: Session, user_ids: Iterable[UUID]) -> Dict[UUID, NightWindow]:
+    settings = db.query(UserSettings).filter(UserSettings.user_id.in_(list(user_ids))).all()
+    return {s.user_id: NightWindow.from_settings(s) for s in settings}
+
+
+def _category_keys(db: Session, packages: Set[str]) -> Dict[str, str]:
+    entries = catalog_index.get_many(db, packages)
+    keys = {pkg: e.category_key for pkg, e in entries.items() if e.category_key}
+    # Kısıtlı indeks yenilemesine güvenme: eksikler aynı transaction'dan (flush edilmiş satırlar dahil)
+    missing = packages - keys.keys()
+    if missing:
+        for row in db.execute(_CATEGORY_SQL, {"packages": sorted(missing)}):
+            keys[row.package_name] = canonicalize_category_key(row.key)
+    return keys
+
+
+def repair_recent_features(days: int = FEATURE_REPAIR_DAYS) -> int:
+    """
+    Periyodik onarım: son `days` yerel günü (TR), bu aralıkta oturumu olan
+    kullanıcılar için set-based motorla yeniden hesapla.
+    """
+    end = datetime.now(TR_TZ).date()
+    start = end - timedelta(days=max(days, 1) - 1)
+    db = SessionLocal()
+    try:
+        user_ids = [
+            row.user_id
+            for row in db.execute(
+                _RECENT_USERS_SQL,
+                {
+                    "start": datetime.combine(start, time(), TR_TZ),
+                    "end": datetime.combine(end + timedelta(days=1), time(), TR_TZ),
+                },
+            )
+        ]
+        if not user_ids:
+            return 0
+        return rebuild_features(db, start, end, user_ids=user_ids)
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+# Global erişim nesnesi (main.py lifespan'inde başlatılır)
+feature_repair_job = PeriodicJob(
+    "feature_repair",
+    FEATURE_REPAIR_INTERVAL_SECONDS,
+    repair_recent_features,
+)
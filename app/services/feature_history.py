@@ -0,0 +1,100 @@
+# app/services/feature_history.py
+"""Columnar, per-request view of a user's feature_daily window.
+
+AIEngine risk (14 gün), profil (30 gün) ve tahmin (30 gün) için her seferinde
+ayrı sorgu atıp FeatureDaily nesneleri üzerinde `statistics.mean` ile
+dolaşıyordu. `FeatureHistory` en geniş pencereyi tek sorguda sadece gereken
+kolonlarla okur ve NumPy dizilerinde tutar (tarih sırasına göre artan);
+analizler `last_days` ile dilimleyip vektörel istatistik kullanır.
+"""
+from dataclasses import dataclass, fields
+from datetime import date, timedelta
+from typing import Iterable, List
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from app.models.core import FeatureDaily
+
+
+@dataclass(frozen=True)
+class FeatureHistory:
+    dates: np.ndarray        # datetime64[D]
+    total: np.ndarray        # float64 dakika
+    night: np.ndarray        # float64 dakika
+    gaming: np.ndarray       # float64 oran
+    social: np.ndarray       # float64 oran
+    weekday: np.ndarray      # int8 (0=Pzt)
+    weekend: np.ndarray      # bool
+    holiday: np.ndarray      # bool
+
+    @classmethod
+    def empty(cls) -> "FeatureHistory":
+        return cls.from_rows([])
+
+    @classmethod
+    def from_rows(cls, rows: Iterable) -> "FeatureHistory":
+        """FeatureDaily nesneleri veya aynı adlı kolonlara sahip satırlar (sırasız)."""
+        rows = sorted(rows, key=lambda r: r.date)
+        n = len(rows)
+        return cls(
+            dates=np.array([r.date for r in rows], dtype="datetime64[D]").reshape(n),
+            total=np.fromiter((r.total_minutes or 0 for r in rows), dtype=np.float64, count=n),
+            night=np.fromiter((r.night_minutes or 0 for r in rows), dtype=np.float64, count=n),
+            gaming=np.fromiter((float(r.gaming_ratio or 0) for r in rows), dtype=np.float64, count=n),
+            social=np.fromiter((float(r.social_ratio or 0) for r in rows), dtype=np.float64, count=n),
+            weekday=np.fromiter((r.weekday if r.weekday is not None else r.date.weekday() for r in rows),
+                                dtype=np.int8, count=n),
+            weekend=np.fromiter((bool(r.weekend) for r in rows), dtype=bool, count=n),
+            holiday=np.fromiter((bool(r.is_holiday) for r in rows), dtype=bool, count=n),
+        )
+
+    @classmethod
+    def load(cls, db: Session, user_id, days: int, today: date) -> "FeatureHistory":
+        """[today - days, today) aralığı; bugünün (kısmi) verisi dışarıda."""
+        cutoff = today - timedelta(days=days)
+        rows = (
+            db.query(
+                FeatureDaily.date,
+                FeatureDaily.total_minutes,
+                FeatureDaily.night_minutes,
+                FeatureDaily.gaming_ratio,
+                FeatureDaily.social_ratio,
+                FeatureDaily.weekday,
+                FeatureDaily.weekend,
+                FeatureDaily.is_holiday,
+            )
+            .filter(
+                FeatureDaily.user_id == user_id,
+                FeatureDaily.date >= cutoff,
+                FeatureDaily.date < today,
+            )
+            .order_by(FeatureDaily.date)
+            .all()
+        )
+        return cls.from_rows(rows)
+
+    def __len__(self) -> int:
+        return len(self.dates)
+
+    def __bool__(self) -> bool:
+        return len(self.dates) > 0
+
+    def last_days(self, days: int, today: date) -> "FeatureHistory":
+        """Satırları `today - days` ve sonrası olan dilim (diziler kopyalanmaz)."""
+        start = int(np.searchsorted(self.dates, np.datetime64(today - timedelta(days=days), "D")))
+        return FeatureHistory(**{f.name: getattr(self, f.name)[start:] for f in fields(self)})
+
+    @property
+    def off_day(self) -> np.ndarray:
+        """Hafta sonu veya tatil."""
+        return self.weekend | self.holiday
+
+    def date_list(self) -> List[date]:
+        return self.dates.astype(object).tolist()
+
+
+def masked_mean(values: np.ndarray, mask: np.ndarray) -> float:
+    """Mean over `mask`; boş maske için 0."""
+    n = int(mask.sum())
+    return float(values[mask].sum() / n) if n else 0.0
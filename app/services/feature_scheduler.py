@@ -0,0 +1,226 @@
+# app/services/feature_scheduler.py
+"""Coalescing, debounced scheduler for feature_daily recomputation.
+
+Her rapor, payload'daki her gün için bir yeniden hesaplama ister. 15 dakikada
+bir senkronize olan bir cihaz aynı (user_id, tarih) satırını gün içinde
+onlarca kez hesaplatırdı. Scheduler bekleyen işleri anahtar bazında tekilleştirir:
+
+- Aynı anahtar bekliyorsa yeni istek sadece süreyi öteler (debounce),
+  ama ilk istekten en fazla `max_delay` saniye sonra mutlaka çalışır.
+- Anahtar o an çalışıyorsa bitişinde bir kez daha kuyruğa alınır.
+- İşler sınırlı bir thread havuzunda, `batch_size`'lık gruplar halinde koşar.
+"""
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+from typing import Callable, Dict, List, Optional, Set, Tuple
+from uuid import UUID
+
+from app.db import SessionLocal
+from app.services.analytics import calculate_daily_features
+from app.services.feature_batch import compute_features_batch
+
+FEATURE_DEBOUNCE_SECONDS = float(os.getenv("FEATURE_DEBOUNCE_SECONDS", "30"))
+FEATURE_MAX_DELAY_SECONDS = float(os.getenv("FEATURE_MAX_DELAY_SECONDS", "300"))
+FEATURE_WORKERS = int(os.getenv("FEATURE_WORKERS", "2"))
+FEATURE_BATCH_SIZE = int(os.getenv("FEATURE_BATCH_SIZE", "50"))
+
+JobKey = Tuple[UUID, date]
+
+
+def recompute_features(keys: List[JobKey]):
+    """
+    Varsayılan runner: tüm grubu tek SQL ifadesiyle hesapla (feature_batch).
+    Toplu ifade hata verirse anahtarlar tek tek Python yoluyla denenir.
+    """
+    db = SessionLocal()
+    try:
+        compute_features_batch(db, keys)
+        db.commit()
+        return 0
+    except Exception as e:
+        db.rollback()
+        print(f"FEATURE SCHEDULER batch SQL failed size={len(keys)}, falling back per key: {e}")
+    finally:
+        db.close()
+
+    failures = 0
+    for user_id, target_date in keys:
+        db = SessionLocal()
+        try:
+            calculate_daily_features(user_id, target_date, db)
+        except Exception as e:
+            failures += 1
+            db.rollback()
+            print(f"FEATURE SCHEDULER job failed user={user_id} date={target_date}: {e}")
+        finally:
+            db.close()
+    return failures
+
+
+class FeatureScheduler:
+    def __init__(
+        self,
+        runner: Callable[[List[JobKey]], Optional[int]] = recompute_features,
+        debounce_seconds: float = FEATURE_DEBOUNCE_SECONDS,
+        max_delay_seconds: float = FEATURE_MAX_DELAY_SECONDS,
+        workers: int = FEATURE_WORKERS,
+        batch_size: int = FEATURE_BATCH_SIZE,
+    ):
+        self.runner = runner
+        self.debounce_seconds = debounce_seconds
+        self.max_delay_seconds = max(max_delay_seconds, debounce_seconds)
+        self.workers = max(workers, 1)
+        self.batch_size = max(batch_size, 1)
+
+        # key -> (ilk istek zamanı, çalışma zamanı) monotonic saniye
+        self._pending: Dict[JobKey, Tuple[float, float]] = {}
+        self._running: Set[JobKey] = set()
+        self._rerun: Set[JobKey] = set()
+        self._cv = threading.Condition()
+        self._slots = threading.BoundedSemaphore(self.workers)
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._dispatcher: Optional[threading.Thread] = None
+        self._stopping = False
+
+        self.requested = 0
+        self.coalesced = 0
+        self.executed = 0
+        self.failed = 0
+        self.batches = 0
+
+    # --- lifecycle ---
+    def start(self):
+        with self._cv:
+            if self._dispatcher is not None:
+                return
+            self._stopping = False
+            self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="feature-worker")
+            self._dispatcher = threading.Thread(
+                target=self._dispatch_loop, args=(self._pool,), name="feature-dispatcher", daemon=True
+            )
+            self._dispatcher.start()
+
+    def stop(self, flush: bool = True, timeout: float = 30.0):
+        """
+        Dispatcher'ı durdur; flush=True ise bekleyen işleri beklemeden hemen çalıştır.
+        Havuzu dispatcher kendisi kapatır: süre aşılırsa arka planda bitirmeye devam eder.
+        """
+        with self._cv:
+            dispatcher = self._dispatcher
+            if dispatcher is None:
+                return
+            if flush:
+                now = time.monotonic()
+                self._pending = {k: (first, now) for k, (first, _) in self._pending.items()}
+            else:
+                self._pending.clear()
+                self._rerun.clear()
+            self._stopping = True
+            self._cv.notify_all()
+        dispatcher.join(timeout)
+        if dispatcher.is_alive():
+            print(f"FEATURE SCHEDULER stop timed out after {timeout}s; dispatcher keeps flushing in background")
+
+    # --- API ---
+    def schedule(self, user_id: UUID, target_date: date):
+        key = (user_id, target_date)
+        if self._dispatcher is None:
+            self.start()
+        with self._cv:
+            self.requested += 1
+            now = time.monotonic()
+            if key in self._pending:
+                self.coalesced += 1
+                first, _ = self._pending[key]
+                self._pending[key] = (first, min(now + self.debounce_seconds, first + self.max_delay_seconds))
+            elif key in self._running:
+                self.coalesced += 1
+                self._rerun.add(key)
+            else:
+                self._pending[key] = (now, now + self.debounce_seconds)
+            self._cv.notify()
+
+    def stats(self) -> Dict:
+        with self._cv:
+            return {
+                "requested": self.requested,
+                "coalesced": self.coalesced,
+                "executed": self.executed,
+                "failed": self.failed,
+                "batches": self.batches,
+                "pending": len(self._pending),
+                "running": len(self._running),
+                "debounce_seconds": self.debounce_seconds,
+                "max_delay_seconds": self.max_delay_seconds,
+                "workers": self.workers,
+            }
+
+    # --- internals ---
+    def _dispatch_loop(self, pool: ThreadPoolExecutor):
+        try:
+            self._dispatch(pool)
+        finally:
+            # Havuz sadece dispatcher çıktıktan sonra kapanır; kapalı havuza submit olmaz
+            pool.shutdown(wait=True)
+            with self._cv:
+                if self._dispatcher is threading.current_thread():
+                    self._dispatcher = None
+                    self._pool = None
+
+    def _dispatch(self, pool: ThreadPoolExecutor):
+        while True:
+            with self._cv:
+                due = self._take_due()
+                while not due:
+                    # Koşan bir işin yeniden çalıştırma isteği (_rerun) varsa o iş bitince
+                    # _pending'e düşer; dispatcher onu da çalıştırmadan çıkmamalı
+                    if self._stopping and not self._pending and not self._rerun:
+                        return
+                    timeout = None
+                    if self._pending:
+                        timeout = max(min(d for _, d in self._pending.values()) - time.monotonic(), 0)
+                    self._cv.wait(timeout)
+                    due = self._take_due()
+
+            for i in range(0, len(due), self.batch_size):
+                chunk = due[i:i + self.batch_size]
+                # Havuz doluysa burada bekle; kuyruk sınırsız büyümesin
+                self._slots.acquire()
+                pool.submit(self._run, chunk)
+
+    def _take_due(self) -> List[JobKey]:
+        now = time.monotonic()
+        due = [k for k, (_, run_at) in self._pending.items() if run_at <= now]
+        for k in due:
+            del self._pending[k]
+            self._running.add(k)
+        return due
+
+    def _run(self, keys: List[JobKey]):
+        failures = 0
+        try:
+            failures = self.runner(keys) or 0
+        except Exception as e:
+            failures = len(keys)
+            print(f"FEATURE SCHEDULER batch failed size={len(keys)}: {e}")
+        finally:
+            self._slots.release()
+            with self._cv:
+                self.batches += 1
+                self.executed += len(keys) - failures
+                self.failed += failures
+                now = time.monotonic()
+                for k in keys:
+                    self._running.discard(k)
+                    if k in self._rerun:
+                        self._rerun.discard(k)
+                        run_at = now if self._stopping else now + self.debounce_seconds
+                        self._pending[k] = (now, run_at)
+                self._cv.notify()
+
+
+# Global erişim nesnesi
+feature_scheduler = FeatureScheduler()
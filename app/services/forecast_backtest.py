@@ -0,0 +1,270 @@
+# app/services/forecast_backtest.py
+"""Rolling-origin backtest of the forecast models: accuracy and cost.
+
+Her başlangıç noktası (origin) t için modele yalnızca t'den önceki günler
+verilir ve [t, t + 7) gerçek değerleriyle karşılaştırılır. Modeller:
+
+- seasonal: `SeasonalModel` (eğitim yok)
+- pooled: `PooledRidgeModel`, her origin'de yalnızca t öncesi veriyle yeniden
+  eğitilir (ana süreçte, tüm kullanıcılarla)
+- online: `holt_winters_online_v1`, t öncesindeki tüm günler baştan oynatılır
+- trend: AIEngine'in trend fallback'i (`trend_series`)
+
+Bir (kullanıcı, origin) çifti, son INPUT_DAYS günde en az MIN_HISTORY_DAYS
+gözlem varsa, t-1 günü gözlenmişse (üretimde tahmin son gözlenen günden sonra
+başlar) ve hedef haftada en az bir gözlem varsa sayılır; tüm modeller aynı
+çiftlerle ölçülür.
+
+Doğruluk: günlük MAE / MAPE (gerçek > 0 olan günler) ve haftalık toplam MAE
+(hedef haftası tam gözlenmişse). Maliyet: fit ve tek kullanıcılık predict
+gecikmeleri ve tracemalloc tepe belleği. Kullanıcılar süreçlere bölünür.
+"""
+import multiprocessing
+import resource
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, timedelta
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.services.forecasting import (
+    HISTORY_DAYS,
+    HORIZON_DAYS,
+    MIN_HISTORY_DAYS,
+    PooledRidgeModel,
+    SeasonalModel,
+    fit_pooled,
+    trend_series,
+)
+from app.services.online_state import OnlineState, forecast_from_state, initial_vector, update_day
+
+BACKTEST_MODELS = ("seasonal", "pooled", "online", "trend")
+INPUT_DAYS = HISTORY_DAYS + 2  # AIEngine tahmin penceresi (30 gün)
+POOLED_MIN_DAYS = HISTORY_DAYS + HORIZON_DAYS
+
+_SAMPLE_USERS_SQL = text(
+    """
+SELECT user_id
+FROM feature_daily
+WHERE date >= :start AND date < :end
+GROUP BY user_id
+HAVING count(*) >= :min_days
+ORDER BY md5(user_id::text)
+LIMIT :limit
+"""
+)
+
+_MATRIX_SQL = text(
+    """
+SELECT user_id, date, total_minutes
+FROM feature_daily
+WHERE user_id = ANY(CAST(:user_ids AS uuid[]))
+  AND date >= :start AND date < :end
+"""
+)
+
+
+def load_matrix(db: Session, users: int, days: int, end: Optional[date] = None) -> Tuple[np.ndarray, date]:
+    """
+    (users, days) total_minutes matrisi ve ilk sütunun tarihi; eksikler NaN.
+    Kullanıcılar id özetine göre sabit sırada örneklenir (aynı argümanlar aynı küme).
+    """
+    end = end or date.today()
+    start = end - timedelta(days=days)
+    user_ids = [
+        str(r.user_id)
+        for r in db.execute(
+            _SAMPLE_USERS_SQL, {"start": start, "end": end, "min_days": MIN_HISTORY_DAYS, "limit": users}
+        )
+    ]
+    matrix = np.full((len(user_ids), days), np.nan)
+    index = {u: i for i, u in enumerate(user_ids)}
+    for r in db.execute(_MATRIX_SQL, {"user_ids": user_ids, "start": start, "end": end}):
+        matrix[index[str(r.user_id)], (r.date - start).days] = float(r.total_minutes or 0)
+    return matrix, start
+
+
+def rolling_origins(width: int, count: int, step: int = 7, models: Sequence[str] = BACKTEST_MODELS) -> List[int]:
+    """En yeniden geriye `count` origin (sütun indeksi), artan sırada."""
+    first = POOLED_MIN_DAYS if "pooled" in models else INPUT_DAYS
+    last = width - HORIZON_DAYS
+    return sorted(range(last, first - 1, -step)[:count])
+
+
+def run_backtest(
+    matrix: np.ndarray,
+    start: date,
+    origins: List[int],
+    models: Sequence[str] = BACKTEST_MODELS,
+    workers: int = 1,
+    trace_memory: bool = True,
+    ridge: float = 1.0,
+) -> Dict:
+    """Backtest every model over `origins`; kullanıcılar `workers` sürece bölünür."""
+    fit_ms: Dict[str, List[float]] = {m: [] for m in models}
+    pooled: Dict[int, np.ndarray] = {}
+    if "pooled" in models:
+        for t in origins:
+            t0 = time.perf_counter()
+            try:
+                pooled[t], _ = fit_pooled(matrix[:, :t], start, ridge)
+            except ValueError:
+                continue
+            fit_ms["pooled"].append((time.perf_counter() - t0) * 1000)
+
+    chunks = [c for c in np.array_split(matrix, max(workers, 1)) if len(c)]
+    args = [(c, start, origins, tuple(models), pooled, trace_memory) for c in chunks]
+    t0 = time.perf_counter()
+    if workers > 1 and len(chunks) > 1:
+        # spawn: ana süreçteki DB bağlantıları çocuklara taşınmaz
+        with ProcessPoolExecutor(len(chunks), mp_context=multiprocessing.get_context("spawn")) as pool:
+            parts = list(pool.map(backtest_chunk, *zip(*args)))
+    else:
+        parts = [backtest_chunk(*a) for a in args]
+    wall_s = time.perf_counter() - t0
+
+    report = {"users": int(matrix.shape[0]), "origins": len(origins), "workers": len(chunks), "wall_seconds": wall_s,
+              "max_rss_mb": max(p["max_rss_kb"] for p in parts) / 1024 if parts else 0.0, "models": {}}
+    for m in models:
+        acc = {k: sum(p["models"][m][k] for p in parts)
+               for k in ("n", "abs_sum", "days", "ape_sum", "ape_days", "week_abs_sum", "weeks")}
+        predict = np.concatenate([p["models"][m]["predict_ms"] for p in parts]) if parts else np.empty(0)
+        fits = fit_ms[m] + [v for p in parts for v in p["models"][m]["fit_ms"]]
+        report["models"][m] = {
+            "n": acc["n"],
+            "mae": acc["abs_sum"] / acc["days"] if acc["days"] else None,
+            "mape": 100 * acc["ape_sum"] / acc["ape_days"] if acc["ape_days"] else None,
+            "weekly_mae": acc["week_abs_sum"] / acc["weeks"] if acc["weeks"] else None,
+            "predict_ms": _percentiles(predict),
+            "fit_ms": _percentiles(np.array(fits)) if fits else None,
+            "peak_kb": max(p["models"][m]["peak_kb"] for p in parts) if parts else None,
+        }
+    return report
+
+
+def backtest_chunk(
+    chunk: np.ndarray,
+    start: date,
+    origins: List[int],
+    models: Tuple[str, ...],
+    pooled: Dict[int, np.ndarray],
+    trace_memory: bool,
+) -> Dict:
+    """İşçi süreç: bir kullanıcı diliminin tüm origin'lerdeki hataları ve süreleri."""
+    out = {m: {"n": 0, "abs_sum": 0.0, "days": 0, "ape_sum": 0.0, "ape_days": 0, "week_abs_sum": 0.0,
+               "weeks": 0, "predict_ms": [], "fit_ms": [], "peak_kb": 0.0, "traced": False} for m in models}
+
+    for t in origins:
+        window = chunk[:, t - INPUT_DAYS:t]
+        target = chunk[:, t:t + HORIZON_DAYS]
+        eligible = np.flatnonzero(
+            (np.sum(~np.isnan(window), axis=1) >= MIN_HISTORY_DAYS)
+            & ~np.isnan(window[:, -1])
+            & np.any(~np.isnan(target), axis=1)
+        )
+        if len(eligible) == 0:
+            continue
+        origin_day = start + timedelta(days=t)
+
+        for m in models:
+            if m == "pooled" and t not in pooled:
+                continue
+            stats = out[m]
+            if trace_memory and not stats["traced"]:
+                # Ayrı, zamanlanmayan tur: tracemalloc ölçülen süreleri bozmasın
+                tracemalloc.start()
+                _predict_all(m, chunk, t, start, pooled, {"fit_ms": []}, eligible, window, origin_day)
+                stats["peak_kb"] = tracemalloc.get_traced_memory()[1] / 1024
+                tracemalloc.stop()
+                stats["traced"] = True
+            preds, timings = _predict_all(m, chunk, t, start, pooled, stats, eligible, window, origin_day)
+            stats["predict_ms"].append(timings * 1000)
+            _accumulate(stats, preds, target[eligible])
+
+    for m in models:
+        ms = out[m]["predict_ms"]
+        out[m]["predict_ms"] = np.concatenate(ms) if ms else np.empty(0)
+    return {"models": out, "max_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss}
+
+
+def _predict_all(model, chunk, t, start, pooled, stats, eligible, window, origin_day) -> Tuple[np.ndarray, np.ndarray]:
+    """Tahminler (eligible, 7) ve kullanıcı başına predict süreleri (sn)."""
+    predict = _predictor(model, chunk, t, start, pooled, stats)
+    timings = np.empty(len(eligible))
+    preds = np.empty((len(eligible), HORIZON_DAYS))
+    for j, i in enumerate(eligible):
+        t0 = time.perf_counter()
+        preds[j] = predict(i, window[i], origin_day)
+        timings[j] = time.perf_counter() - t0
+    return preds, timings
+
+
+def _predictor(model: str, chunk: np.ndarray, t: int, start: date, pooled: Dict[int, np.ndarray], stats: Dict):
+    """(kullanıcı satırı, pencere, origin günü) -> 7 günlük tahmin; fit süresi stats'a yazılır."""
+    if model == "seasonal":
+        seasonal = SeasonalModel()
+        return lambda i, w, day: np.round(seasonal.predict(w[None, -HISTORY_DAYS:], np.array([day.weekday()]))[0])
+    if model == "pooled":
+        ridge = PooledRidgeModel(pooled[t])
+        return lambda i, w, day: np.round(ridge.predict(w[None, -HISTORY_DAYS:], np.array([day.weekday()]))[0])
+    if model == "trend":
+        return lambda i, w, day: _pad(trend_series(w[~np.isnan(w)]))
+    if model == "online":
+        t0 = time.perf_counter()
+        S, n_days = _replay(chunk[:, :t], start)
+        stats["fit_ms"].append((time.perf_counter() - t0) * 1000)
+        last_day = start + timedelta(days=t - 1)
+        return lambda i, w, day: np.array(forecast_from_state(OnlineState(last_day, int(n_days[i]), S[i]))[0])
+    raise ValueError(f"unknown model: {model}")
+
+
+def _replay(history: np.ndarray, start: date) -> Tuple[np.ndarray, np.ndarray]:
+    """advance_states ile aynı adımlar: her gün, o gün gözlenen kullanıcılara vektörel uygulanır."""
+    n_users, width = history.shape
+    S = np.tile(initial_vector(), (n_users, 1))
+    n_days = np.zeros(n_users, dtype=np.int64)
+    last_col = np.zeros(n_users, dtype=np.int64)
+    for col in range(width):
+        idx = np.flatnonzero(~np.isnan(history[:, col]))
+        if len(idx) == 0:
+            continue
+        day = start + timedelta(days=col)
+        total = history[idx, col]
+        zeros = np.zeros(len(idx))
+        sub = S[idx]
+        update_day(sub, n_days[idx], col - last_col[idx], day.weekday(), total=total, night=zeros,
+                   gaming=zeros, social=zeros, weekend=np.full(len(idx), day.weekday() >= 5))
+        S[idx] = sub
+        n_days[idx] += 1
+        last_col[idx] = col
+    return S, n_days
+
+
+def _accumulate(stats: Dict, preds: np.ndarray, actual: np.ndarray):
+    observed = ~np.isnan(actual)
+    err = np.abs(np.where(observed, preds - actual, 0.0))
+    positive = observed & (np.nan_to_num(actual) > 0)
+    full = observed.all(axis=1)
+
+    stats["n"] += len(preds)
+    stats["abs_sum"] += float(err.sum())
+    stats["days"] += int(observed.sum())
+    stats["ape_sum"] += float((err[positive] / actual[positive]).sum())
+    stats["ape_days"] += int(positive.sum())
+    stats["week_abs_sum"] += float(np.abs(preds[full].sum(axis=1) - actual[full].sum(axis=1)).sum())
+    stats["weeks"] += int(full.sum())
+
+
+def _pad(series: List[int]) -> np.ndarray:
+    return np.array(series, dtype=np.float64) if series else np.zeros(HORIZON_DAYS)
+
+
+def _percentiles(values_ms: np.ndarray) -> Optional[Dict[str, float]]:
+    if len(values_ms) == 0:
+        return None
+    p50, p95, p99 = np.percentile(values_ms, [50, 95, 99])
+    return {"p50": float(p50), "p95": float(p95), "p99": float(p99), "count": int(len(values_ms))}
@@ -0,0 +1,654 @@
+# app/services/forecasting.py
+"""Next-week screen time forecasting with pluggable, batched models.
+
+Eskiden her istek kullanıcı başına 80 ağaçlı bir RandomForest eğitip 7 kez
+tek satırlık `predict` çağırıyordu. Artık:
+
+- Girdi kullanıcı x gün matrisidir (eksik gün NaN); modeller tüm kullanıcıları
+  ve 7 günlük ufku tek seferde vektörel tahmin eder.
+- `seasonal_v1`: kapalı form - son 7 günün seviyesi x haftanın günü katsayısı
+  (az gözlemde 1'e büzülür) + sönümlü doğrusal eğilim. Eğitim gerektirmez.
+- `pooled_ridge_v1`: tüm kullanıcılar üzerinde eğitilmiş global ridge modeli
+  (ufuk başına ayrı katsayı, "direct" çok adımlı tahmin). Girdiler kullanıcının
+  28 günlük ortalamasına bölünür, böylece farklı ölçekteki kullanıcılar ortak
+  modelden yararlanır. `app/scripts/train_forecast_model.py` katsayıları
+  `FORECAST_MODEL_DIR/forecast.json`'a yazar, model_registry açılışta yükler.
+- Sonuç `weekly_forecast`'a yazılır (as_of_date = bugün, horizon_week = 1,
+  scenario = 'baseline'). `history_signature` girdi geçmişinin özetidir;
+  feature_daily değişmedikçe istek kayıtlı satırdan döner.
+- Tahmin aralıkları: her kullanıcının son `BAND_ORIGINS` haftası için model
+  geriye dönük çalıştırılır (tüm kullanıcılar tek matriste), gerçekleşen /
+  tahmin oranı artıklarının kantilleri (`BAND_QUANTILES`) alınır ve az gözlemde
+  tüm kullanıcıların ortak kantillerine büzülür. Günlük bantlar `daily_lo/hi`,
+  haftalık toplam bandı `yhat_lo/hi` kolonlarına yazılır.
+- Senaryolar: 'baseline' ve 'reduced' (politika uygulanmış: günlük limit +
+  hafta sonu gevşemesi ile kırpılmış; limit yoksa %`REDUCED_DEFAULT_PCT` azaltma).
+"""
+import hashlib
+import json
+import os
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional, Sequence, Tuple
+from uuid import UUID
+
+import numpy as np
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+FORECAST_MODEL = os.getenv("FORECAST_MODEL", "seasonal").lower()  # seasonal | pooled
+FORECAST_MODEL_DIR = os.getenv("FORECAST_MODEL_DIR", "var/models")
+FORECAST_MANIFEST = "forecast.json"
+
+HORIZON_DAYS = 7
+HISTORY_DAYS = 28
+MIN_HISTORY_DAYS = 5
+BASELINE_SCENARIO = "baseline"
+REDUCED_SCENARIO = "reduced"
+SCENARIOS = (BASELINE_SCENARIO, REDUCED_SCENARIO)
+TARGET = "total_minutes"
+# Model için yetersiz veride (< MIN_HISTORY_DAYS) yazılan trend tahmini; bant/senaryo yok
+TREND_MODEL_KEY = "trend_v1"
+
+# Tahmin aralıkları (artık kantilleri)
+BAND_QUANTILES = (0.1, 0.9)
+BAND_ORIGINS = 3            # geriye dönük test haftası
+BAND_SHRINK = 7.0           # ortak kantillere çeken sanal gözlem sayısı
+BAND_DEFAULT = (-0.35, 0.35)  # hiç artık yoksa oran bandı
+REDUCED_DEFAULT_PCT = 10
+
+# Bantlar için yüklenen geçmiş: imza penceresi + geriye dönük test haftaları
+LOAD_DAYS = HISTORY_DAYS + 2 + 7 * BAND_ORIGINS
+
+_HISTORY_SQL = text(
+    """
+SELECT user_id, date, total_minutes
+FROM feature_daily
+WHERE user_id = ANY(CAST(:user_ids AS uuid[]))
+  AND date >= :start AND date < :end
+"""
+)
+
+_ALL_HISTORY_SQL = text(
+    """
+SELECT user_id, date, total_minutes
+FROM feature_daily
+WHERE date >= :start AND date < :end
+"""
+)
+
+_LIMITS_SQL = text(
+    """
+SELECT user_id, daily_limit_minutes, weekend_relax_pct
+FROM user_settings
+WHERE user_id = ANY(CAST(:user_ids AS uuid[]))
+"""
+)
+
+_SCENARIOS_SQL = text(
+    """
+SELECT scenario, yhat, yhat_lo, yhat_hi, daily_series, daily_lo, daily_hi, start_date
+FROM weekly_forecast
+WHERE user_id = :user_id AND as_of_date = :as_of AND horizon_week = 1
+ORDER BY scenario
+"""
+)
+
+_CACHED_SQL = text(
+    """
+SELECT yhat, daily_series, start_date, history_signature, model_key
+FROM weekly_forecast
+WHERE user_id = :user_id AND as_of_date = :as_of
+  AND horizon_week = 1 AND scenario = :scenario
+"""
+)
+
+_UPSERT_SQL = text(
+    """
+INSERT INTO weekly_forecast AS w (
+    user_id, as_of_date, horizon_week, scenario, target, yhat, yhat_lo, yhat_hi,
+    model_key, daily_series, daily_lo, daily_hi, start_date, history_end, history_signature, created_at
+)
+SELECT u.user_id, :as_of, 1, u.scenario, :target, u.yhat, u.yhat_lo, u.yhat_hi,
+       u.model_key, CAST(u.daily_series AS jsonb), CAST(u.daily_lo AS jsonb), CAST(u.daily_hi AS jsonb),
+       u.start_date, u.history_end, u.signature, NOW()
+FROM unnest(
+    CAST(:user_ids AS uuid[]), CAST(:scenarios AS text[]), CAST(:yhats AS int[]),
+    CAST(:yhat_los AS int[]), CAST(:yhat_his AS int[]), CAST(:model_keys AS text[]),
+    CAST(:series AS text[]), CAST(:daily_los AS text[]), CAST(:daily_his AS text[]),
+    CAST(:start_dates AS date[]), CAST(:history_ends AS date[]), CAST(:signatures AS text[])
+) AS u(user_id, scenario, yhat, yhat_lo, yhat_hi, model_key, daily_series, daily_lo, daily_hi,
+       start_date, history_end, signature)
+ON CONFLICT (user_id, as_of_date, horizon_week, scenario) DO UPDATE SET
+    target = EXCLUDED.target,
+    yhat = EXCLUDED.yhat,
+    yhat_lo = EXCLUDED.yhat_lo,
+    yhat_hi = EXCLUDED.yhat_hi,
+    model_key = EXCLUDED.model_key,
+    daily_series = EXCLUDED.daily_series,
+    daily_lo = EXCLUDED.daily_lo,
+    daily_hi = EXCLUDED.daily_hi,
+    start_date = EXCLUDED.start_date,
+    history_end = EXCLUDED.history_end,
+    history_signature = EXCLUDED.history_signature,
+    created_at = EXCLUDED.created_at
+"""
+)
+
+
+# --- Models ---
+class SeasonalModel:
+    """Closed-form level x weekday factor + damped trend (no training)."""
+
+    key = "seasonal_v1"
+    shrink = 2.0        # haftanın günü katsayısını 1'e çeken sanal gözlem sayısı
+    trend_damping = 0.5
+
+    def predict(self, Y: np.ndarray, first_weekday: np.ndarray) -> np.ndarray:
+        """
+        Y: (users, HISTORY_DAYS) son sütun en yeni gün, eksikler NaN.
+        first_weekday: (users,) tahminin ilk gününün haftanın günü (0=Pzt).
+        Döner: (users, HORIZON_DAYS) dakika.
+        """
+        n_users, width = Y.shape
+        observed = ~np.isnan(Y)
+        overall = _nanmean(Y, axis=1)
+        level = _nanmean(Y[:, -7:], axis=1)
+        level = np.where(np.isnan(level), overall, level)
+
+        # Sütun -> haftanın günü (son sütun first_weekday - 1)
+        offsets = np.arange(width) - width
+        col_wd = (first_weekday[:, None] + offsets[None, :]) % 7
+        factors = np.ones((n_users, 7))
+        for wd in range(7):
+            mask = observed & (col_wd == wd)
+            n = mask.sum(axis=1)
+            wd_mean = np.where(n > 0, np.where(mask, Y, 0.0).sum(axis=1) / np.maximum(n, 1), 0.0)
+            raw = np.where(overall > 0, wd_mean / np.maximum(overall, 1e-9), 1.0)
+            factors[:, wd] = (n * raw + self.shrink) / (n + self.shrink)
+        factors = np.clip(factors, 0.3, 3.0)
+
+        # Gözlenen günler üzerinden OLS eğimi (dakika / gün)
+        x = np.where(observed, np.arange(width)[None, :], np.nan)
+        x_mean = _nanmean(x, axis=1)
+        y_mean = overall
+        cov = np.nansum((x - x_mean[:, None]) * (Y - y_mean[:, None]), axis=1)
+        var = np.nansum((x - x_mean[:, None]) ** 2, axis=1)
+        slope = np.where(var > 0, cov / np.maximum(var, 1e-9), 0.0) * self.trend_damping
+
+        # Seviye son 7 günün ortası (~3 gün önce) için geçerli
+        steps = np.arange(1, HORIZON_DAYS + 1) + 3
+        base = level[:, None] + slope[:, None] * steps[None, :]
+        horizon_wd = (first_weekday[:, None] + np.arange(HORIZON_DAYS)[None, :]) % 7
+        out = np.maximum(base, 0.0) * np.take_along_axis(factors, horizon_wd, axis=1)
+        return np.nan_to_num(out, nan=0.0)
+
+
+class PooledRidgeModel:
+    """Global ridge regression, one coefficient vector per horizon step (direct strategy)."""
+
+    key = "pooled_ridge_v1"
+
+    def __init__(self, coef: np.ndarray, version: Optional[str] = None):
+        self.coef = np.asarray(coef, dtype=np.float64)  # (HORIZON_DAYS, n_features)
+        self.version = version
+
+    @staticmethod
+    def design(Y: np.ndarray, first_weekday: np.ndarray, h: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Features for horizon step h (0-based) and the per-user scale they are divided by."""
+        scale = _nanmean(Y, axis=1)
+        scale = np.where(np.isnan(scale) | (scale <= 0), 1.0, scale)
+        filled = np.where(np.isnan(Y), scale[:, None], Y) / scale[:, None]
+        last = filled[:, -1]
+        mean7 = filled[:, -7:].mean(axis=1)
+        same_wd = filled[:, h - 7]  # hedef günden tam bir hafta önce
+        wd = (first_weekday + h) % 7
+        onehot = np.eye(7)[wd]
+        X = np.column_stack([last, mean7, same_wd, onehot])
+        return X, scale
+
+    def predict(self, Y: np.ndarray, first_weekday: np.ndarray) -> np.ndarray:
+        out = np.empty((Y.shape[0], HORIZON_DAYS))
+        for h in range(HORIZON_DAYS):
+            X, scale = self.design(Y, first_weekday, h)
+            out[:, h] = X @ self.coef[h] * scale
+        return np.maximum(np.nan_to_num(out, nan=0.0), 0.0)
+
+
+def current_model():
+    """FORECAST_MODEL=pooled ise yüklü pooled model, yoksa seasonal."""
+    if FORECAST_MODEL == "pooled":
+        from app.services.model_registry import model_registry
+
+        loaded = model_registry.get("forecast")
+        if loaded is not None:
+            return loaded.model
+    return SeasonalModel()
+
+
+# --- Training (pooled) ---
+def train_pooled_model(db: Session, days: int = 180, ridge: float = 1.0) -> Tuple[PooledRidgeModel, Dict]:
+    """Fit the pooled ridge model on every user's feature_daily over the last `days` days."""
+    end = date.today()
+    start = end - timedelta(days=days)
+    rows = db.execute(_ALL_HISTORY_SQL, {"start": start, "end": end}).all()
+    if not rows:
+        raise ValueError("no feature_daily rows to train on")
+
+    users, matrix = _to_matrix(rows, start, end)
+    coef, samples = fit_pooled(matrix, start, ridge)
+
+    trained_at = datetime.utcnow()
+    metadata = {
+        "name": "forecast",
+        "model_key": PooledRidgeModel.key,
+        "version": f"{trained_at:%Y%m%d%H%M%S}",
+        "trained_at": trained_at.isoformat() + "Z",
+        "train_start": start.isoformat(),
+        "train_end": end.isoformat(),
+        "users": len(users),
+        "samples": samples,
+        "ridge": ridge,
+        "coef": coef.tolist(),
+    }
+    return PooledRidgeModel(coef, metadata["version"]), metadata
+
+
+def fit_pooled(matrix: np.ndarray, start: date, ridge: float = 1.0) -> Tuple[np.ndarray, int]:
+    """
+    Ridge coefficients from a (users, days) matrix whose first column is `start`
+    (eksikler NaN). Döner: (coef (HORIZON_DAYS, n_features), örnek sayısı).
+    """
+    n_users, width = matrix.shape
+    # Kaydırmalı pencereler: her başlangıç noktası t için [t-HISTORY_DAYS, t) girdi, [t, t+7) hedef
+    windows = []
+    targets = []
+    weekdays = []
+    for t in range(HISTORY_DAYS, width - HORIZON_DAYS + 1):
+        windows.append(matrix[:, t - HISTORY_DAYS:t])
+        targets.append(matrix[:, t:t + HORIZON_DAYS])
+        weekdays.append(np.full(n_users, (start + timedelta(days=t)).weekday()))
+    if not windows:
+        raise ValueError(f"need at least {HISTORY_DAYS + HORIZON_DAYS} days of history")
+
+    Y = np.concatenate(windows)
+    T = np.concatenate(targets)
+    wd = np.concatenate(weekdays)
+    keep = np.sum(~np.isnan(Y), axis=1) >= MIN_HISTORY_DAYS
+    Y, T, wd = Y[keep], T[keep], wd[keep]
+
+    coefs = []
+    samples = 0
+    for h in range(HORIZON_DAYS):
+        X, scale = PooledRidgeModel.design(Y, wd, h)
+        y = T[:, h] / scale
+        ok = ~np.isnan(y)
+        X, y = X[ok], y[ok]
+        samples += len(y)
+        A = X.T @ X + ridge * np.eye(X.shape[1])
+        coefs.append(np.linalg.solve(A, X.T @ y))
+    return np.vstack(coefs), int(samples)
+
+
+def save_pooled_model(metadata: Dict, model_dir: str = FORECAST_MODEL_DIR) -> str:
+    os.makedirs(model_dir, exist_ok=True)
+    path = os.path.join(model_dir, FORECAST_MANIFEST)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(metadata, f, indent=2)
+    os.replace(tmp_path, path)
+    return path
+
+
+def load_pooled_model(model_dir: str = FORECAST_MODEL_DIR) -> Optional[Tuple[PooledRidgeModel, Dict]]:
+    path = os.path.join(model_dir, FORECAST_MANIFEST)
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as f:
+        metadata = json.load(f)
+    return PooledRidgeModel(metadata["coef"], metadata.get("version")), metadata
+
+
+# --- Forecast + persistence ---
+def history_signature(dates: Sequence[date], totals: Sequence[int]) -> str:
+    """Girdi geçmişinin özeti: aynı feature_daily satırları aynı imzayı verir."""
+    payload = ",".join(f"{d.isoformat()}={int(t or 0)}" for d, t in sorted(zip(dates, totals)))
+    return hashlib.sha1(payload.encode()).hexdigest()[:16]
+
+
+def forecast_series(dates: Sequence[date], totals: Sequence[int], model=None) -> Tuple[List[int], date]:
+    """Tek kullanıcı: (7 günlük dakika serisi, başlangıç günü). Yetersiz veri -> ([], start)."""
+    start_date = max(dates) + timedelta(days=1)
+    if len(dates) < MIN_HISTORY_DAYS:
+        return [], start_date
+    Y = _window_matrix([(dates, totals)], start_date)
+    model = model or current_model()
+    pred = model.predict(Y, np.array([start_date.weekday()]))[0]
+    return [int(round(v)) for v in pred], start_date
+
+
+def trend_series(totals: np.ndarray) -> List[int]:
+    """Trend fallback: ortalama + ortalama günlük değişim, 7 gün ileri (gözlenen günler sırasıyla)."""
+    if len(totals) < 2:
+        return []
+    trend = float(np.diff(totals).mean())
+    base = float(totals.mean())
+
+    series: List[int] = []
+    current = base + trend
+    for _ in range(HORIZON_DAYS):
+        series.append(max(int(round(current)), 0))
+        current += trend
+    return series
+
+
+def cached_forecast(db: Session, user_id, as_of: date, signature: str) -> Optional[Dict]:
+    """Bugün için kayıtlı ve girdi imzası tutan tahmin; yoksa None."""
+    row = db.execute(
+        _CACHED_SQL, {"user_id": user_id, "as_of": as_of, "scenario": BASELINE_SCENARIO}
+    ).first()
+    if row is None or row.history_signature != signature or row.daily_series is None:
+        return None
+    return {"daily_series": list(row.daily_series), "start_date": row.start_date, "model_key": row.model_key}
+
+
+def forecast_scenarios(db: Session, user_id, as_of: date) -> Dict[str, Dict]:
+    """Kayıtlı senaryolar (bantlarıyla) -> {scenario: scenario_payload}."""
+    rows = db.execute(_SCENARIOS_SQL, {"user_id": str(user_id), "as_of": as_of}).all()
+    return {r.scenario: scenario_payload(r) for r in rows if r.daily_series is not None}
+
+
+def scenario_payload(row) -> Dict:
+    """weekly_forecast satırı -> API şekli (ForecastScenario)."""
+    return {
+        "scenario": row.scenario,
+        "weekly_total": int(row.yhat if row.yhat is not None else sum(row.daily_series)),
+        "weekly_lo": row.yhat_lo,
+        "weekly_hi": row.yhat_hi,
+        "daily_series": [int(v) for v in row.daily_series],
+        "daily_lo": [int(v) for v in row.daily_lo] if row.daily_lo is not None else None,
+        "daily_hi": [int(v) for v in row.daily_hi] if row.daily_hi is not None else None,
+    }
+
+
+def result_payload(result: Dict) -> Dict:
+    """build_forecasts satırı -> scenario_payload ile aynı şekil (kaydedilmeyen yol, ör. mock)."""
+    return {
+        "scenario": result["scenario"],
+        "weekly_total": sum(result["series"]),
+        "weekly_lo": result.get("lo"),
+        "weekly_hi": result.get("hi"),
+        "daily_series": result["series"],
+        "daily_lo": result.get("daily_lo"),
+        "daily_hi": result.get("daily_hi"),
+    }
+
+
+def band_fields(scenarios: Dict[str, Dict]) -> Dict:
+    """ForecastResponse ekleri: baseline bantları + tüm senaryolar; baseline yoksa boş."""
+    baseline = scenarios.get(BASELINE_SCENARIO)
+    if not baseline:
+        return {}
+    return {
+        "weekly_lo": baseline["weekly_lo"],
+        "weekly_hi": baseline["weekly_hi"],
+        "daily_lo": baseline["daily_lo"],
+        "daily_hi": baseline["daily_hi"],
+        "scenarios": [scenarios[k] for k in SCENARIOS if k in scenarios],
+    }
+
+
+def persist_forecasts(db: Session, as_of: date, results: List[Dict]) -> int:
+    """
+    Bulk upsert forecast rows (caller commits).
+    results: user_id, series, start_date, history_end, signature, model_key;
+    opsiyonel: scenario (varsayılan baseline), lo, hi, daily_lo, daily_hi.
+    """
+    if not results:
+        return 0
+
+    def as_json(values):
+        return json.dumps(values) if values is not None else None
+
+    db.execute(
+        _UPSERT_SQL,
+        {
+            "as_of": as_of,
+            "target": TARGET,
+            "user_ids": [str(r["user_id"]) for r in results],
+            "scenarios": [r.get("scenario", BASELINE_SCENARIO) for r in results],
+            "yhats": [int(sum(r["series"])) for r in results],
+            "yhat_los": [r.get("lo") for r in results],
+            "yhat_his": [r.get("hi") for r in results],
+            "model_keys": [r["model_key"] for r in results],
+            "series": [json.dumps(r["series"]) for r in results],
+            "daily_los": [as_json(r.get("daily_lo")) for r in results],
+            "daily_his": [as_json(r.get("daily_hi")) for r in results],
+            "start_dates": [r["start_date"] for r in results],
+            "history_ends": [r["history_end"] for r in results],
+            "signatures": [r["signature"] for r in results],
+        },
+    )
+    return len(results)
+
+
+def forecast_bands(model, histories: List[Tuple[Sequence[date], Sequence[int]]], start_date: date) -> Dict[str, np.ndarray]:
+    """
+    Point forecast + quantile bands for users sharing `start_date`.
+
+    Son BAND_ORIGINS haftanın her biri için model o haftanın başından önceki
+    pencereyle çalıştırılır; gerçekleşen/tahmin - 1 oranları günlük (users, 7k)
+    ve haftalık (users, k) artık matrislerine dizilir. Kullanıcı kantilleri
+    n / (n + BAND_SHRINK) ağırlıkla ortak kantillerle harmanlanır.
+    Döner: pred, daily_lo, daily_hi (users, 7) ve week_lo, week_hi (users,).
+    """
+    n_users = len(histories)
+    # Tek matris: [start - HISTORY_DAYS - 7k, start); her pencere bunun dilimi
+    span = HISTORY_DAYS + 7 * BAND_ORIGINS
+    M = _day_matrix(histories, start_date - timedelta(days=span), span)
+    pred = model.predict(M[:, -HISTORY_DAYS:], np.full(n_users, start_date.weekday()))
+
+    daily_res = np.full((n_users, HORIZON_DAYS * BAND_ORIGINS), np.nan)
+    weekly_res = np.full((n_users, BAND_ORIGINS), np.nan)
+    for k in range(1, BAND_ORIGINS + 1):
+        origin = start_date - timedelta(days=7 * k)
+        col = span - 7 * k
+        Y = M[:, col - HISTORY_DAYS:col]
+        enough = np.sum(~np.isnan(Y), axis=1) >= MIN_HISTORY_DAYS
+        past = model.predict(Y, np.full(n_users, origin.weekday()))
+        actual = M[:, col:col + HORIZON_DAYS]
+        ok = enough[:, None] & ~np.isnan(actual) & (past >= 1)
+        ratio = np.where(ok, np.nan_to_num(actual) / np.maximum(past, 1) - 1, np.nan)
+        daily_res[:, (k - 1) * HORIZON_DAYS:k * HORIZON_DAYS] = ratio
+        # Haftalık: gözlenen günler üzerinden toplam oranı (en az 4 gün)
+        act_sum = np.where(ok, np.nan_to_num(actual), 0.0).sum(axis=1)
+        pred_sum = np.where(ok, past, 0.0).sum(axis=1)
+        weekly_res[:, k - 1] = np.where(ok.sum(axis=1) >= 4, act_sum / np.maximum(pred_sum, 1) - 1, np.nan)
+
+    d_lo, d_hi = _shrunk_quantiles(daily_res)
+    w_lo, w_hi = _shrunk_quantiles(weekly_res)
+    week = pred.sum(axis=1)
+    return {
+        "pred": pred,
+        "daily_lo": np.maximum(pred * (1 + d_lo[:, None]), 0.0),
+        "daily_hi": pred * (1 + d_hi[:, None]),
+        "week_lo": np.maximum(week * (1 + w_lo), 0.0),
+        "week_hi": week * (1 + w_hi),
+    }
+
+
+def reduced_caps(limits: List[Tuple[Optional[int], Optional[int]]], start_date: date) -> np.ndarray:
+    """(users, 7) günlük üst sınır; limit yoksa NaN. Hafta sonu weekend_relax_pct kadar gevşer."""
+    weekend = np.array([(start_date + timedelta(days=h)).weekday() >= 5 for h in range(HORIZON_DAYS)])
+    caps = np.full((len(limits), HORIZON_DAYS), np.nan)
+    for i, (limit, relax_pct) in enumerate(limits):
+        if limit and limit > 0:
+            relax = max(relax_pct or 0, 0) / 100.0
+            caps[i] = np.where(weekend, limit * (1 + relax), float(limit))
+    return caps
+
+
+def apply_reduced(values: np.ndarray, caps: np.ndarray) -> np.ndarray:
+    """Politika uygulanmış senaryo: limitli kullanıcıda kırp, limitsizde sabit yüzde azalt."""
+    factor = 1 - REDUCED_DEFAULT_PCT / 100.0
+    return np.where(np.isnan(caps), values * factor, np.minimum(values, np.nan_to_num(caps)))
+
+
+def build_forecasts(
+    histories: Dict[UUID, Tuple[List[date], List[int]]],
+    limits: Dict[UUID, Tuple[Optional[int], Optional[int]]],
+    as_of: date,
+    model=None,
+) -> List[Dict]:
+    """
+    Baseline + reduced rows (persist_forecasts formatında) for every user with
+    at least MIN_HISTORY_DAYS; saf fonksiyon, DB'ye dokunmaz.
+    """
+    sig_start = as_of - timedelta(days=HISTORY_DAYS + 2)
+    eligible = []
+    for user_id, (dates, totals) in histories.items():
+        recent = [(d, t) for d, t in zip(dates, totals) if d >= sig_start]
+        if len(recent) >= MIN_HISTORY_DAYS:
+            eligible.append((user_id, dates, totals, recent))
+    if not eligible:
+        return []
+
+    model = model or current_model()
+    # Başlangıç günü kullanıcıya göre değişebilir; aynı başlangıçlılar tek matriste
+    groups: Dict[date, List[int]] = {}
+    for i, (_, _, _, recent) in enumerate(eligible):
+        groups.setdefault(max(d for d, _ in recent) + timedelta(days=1), []).append(i)
+
+    results: List[Dict] = []
+    for start_date, idx in groups.items():
+        bands = forecast_bands(model, [(eligible[i][1], eligible[i][2]) for i in idx], start_date)
+        caps = reduced_caps([limits.get(eligible[i][0], (None, None)) for i in idx], start_date)
+        week_caps = np.where(np.isnan(caps).any(axis=1), np.nan, np.nansum(caps, axis=1))[:, None]
+        scenario_values = {
+            BASELINE_SCENARIO: (bands["pred"], bands["daily_lo"], bands["daily_hi"], bands["week_lo"], bands["week_hi"]),
+            REDUCED_SCENARIO: (
+                apply_reduced(bands["pred"], caps),
+                apply_reduced(bands["daily_lo"], caps),
+                apply_reduced(bands["daily_hi"], caps),
+                apply_reduced(bands["week_lo"][:, None], week_caps)[:, 0],
+                apply_reduced(bands["week_hi"][:, None], week_caps)[:, 0],
+            ),
+        }
+        for j, i in enumerate(idx):
+            user_id, _, _, recent = eligible[i]
+            dates = [d for d, _ in recent]
+            common = {
+                "user_id": user_id,
+                "start_date": start_date,
+                "history_end": max(dates),
+                "signature": history_signature(dates, [t for _, t in recent]),
+                "model_key": model.key,
+            }
+            for scenario, (pred, d_lo, d_hi, w_lo, w_hi) in scenario_values.items():
+                series = [int(round(v)) for v in pred[j]]
+                total = sum(series)
+                results.append({
+                    **common,
+                    "scenario": scenario,
+                    "series": series,
+                    "daily_lo": [int(round(v)) for v in d_lo[j]],
+                    "daily_hi": [int(round(v)) for v in d_hi[j]],
+                    # Yuvarlama sonrası da lo <= toplam <= hi
+                    "lo": min(int(round(w_lo[j])), total),
+                    "hi": max(int(round(w_hi[j])), total),
+                })
+    return results
+
+
+def forecast_users(db: Session, user_ids: Optional[List[UUID]] = None, as_of: Optional[date] = None) -> int:
+    """
+    Batch: verilen (veya geçmişi olan tüm) kullanıcılar için tek geçmiş sorgusu,
+    tek limit sorgusu, vektörel tahmin + bantlar ve tek upsert (baseline + reduced).
+    Commit çağırana aittir.
+    """
+    as_of = as_of or date.today()
+    start = as_of - timedelta(days=LOAD_DAYS)
+    if user_ids is None:
+        rows = db.execute(_ALL_HISTORY_SQL, {"start": start, "end": as_of}).all()
+    else:
+        rows = db.execute(
+            _HISTORY_SQL, {"user_ids": [str(u) for u in user_ids], "start": start, "end": as_of}
+        ).all()
+
+    histories: Dict[UUID, Tuple[List[date], List[int]]] = {}
+    for r in rows:
+        dates, totals = histories.setdefault(r.user_id, ([], []))
+        dates.append(r.date)
+        totals.append(int(r.total_minutes or 0))
+    if not histories:
+        return 0
+
+    limits = {
+        r.user_id: (r.daily_limit_minutes, r.weekend_relax_pct)
+        for r in db.execute(_LIMITS_SQL, {"user_ids": [str(u) for u in histories]})
+    }
+    results = build_forecasts(histories, limits, as_of)
+    persist_forecasts(db, as_of, results)
+    return len({r["user_id"] for r in results})
+
+
+# --- helpers ---
+def _nanmean(a: np.ndarray, axis: int) -> np.ndarray:
+    n = np.sum(~np.isnan(a), axis=axis)
+    s = np.nansum(a, axis=axis)
+    return np.where(n > 0, s / np.maximum(n, 1), np.nan)
+
+
+def _window_matrix(histories: List[Tuple[Sequence[date], Sequence[int]]], start_date: date) -> np.ndarray:
+    """(users, HISTORY_DAYS) matrix ending the day before `start_date`; missing days NaN."""
+    return _day_matrix(histories, start_date - timedelta(days=HISTORY_DAYS), HISTORY_DAYS)
+
+
+def _day_matrix(histories: List[Tuple[Sequence[date], Sequence[int]]], first_day: date, width: int) -> np.ndarray:
+    """(users, width) matrix of days [first_day, first_day + width); missing days NaN."""
+    Y = np.full((len(histories), width), np.nan)
+    for i, (dates, totals) in enumerate(histories):
+        for d, t in zip(dates, totals):
+            col = (d - first_day).days
+            if 0 <= col < width:
+                Y[i, col] = float(t or 0)
+    return Y
+
+
+def _shrunk_quantiles(residuals: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Per-row BAND_QUANTILES of ratio residuals, shrunk toward the pooled quantiles; lo <= 0 <= hi."""
+    q_lo, q_hi = BAND_QUANTILES
+    observed = residuals[~np.isnan(residuals)]
+    if len(observed):
+        g_lo, g_hi = np.quantile(observed, [q_lo, q_hi])
+    else:
+        g_lo, g_hi = BAND_DEFAULT
+    n = np.sum(~np.isnan(residuals), axis=1)
+    u_lo = np.where(n > 0, _row_quantile(residuals, n, q_lo), g_lo)
+    u_hi = np.where(n > 0, _row_quantile(residuals, n, q_hi), g_hi)
+    w = n / (n + BAND_SHRINK)
+    lo = w * u_lo + (1 - w) * g_lo
+    hi = w * u_hi + (1 - w) * g_hi
+    return np.minimum(lo, 0.0), np.maximum(hi, 0.0)
+
+
+def _row_quantile(values: np.ndarray, n: np.ndarray, q: float) -> np.ndarray:
+    """Satır başına NaN'sız lineer kantil (np.nanquantile ile aynı; satır döngüsü yok)."""
+    ordered = np.sort(values, axis=1)  # NaN'lar sona
+    pos = q * np.maximum(n - 1, 0)
+    lo = np.floor(pos).astype(np.int64)
+    hi = np.minimum(lo + 1, np.maximum(n - 1, 0))
+    a = np.take_along_axis(ordered, lo[:, None], axis=1)[:, 0]
+    b = np.take_along_axis(ordered, hi[:, None], axis=1)[:, 0]
+    return a + (b - a) * (pos - lo)
+
+
+def _to_matrix(rows, start: date, end: date) -> Tuple[List[UUID], np.ndarray]:
+    users = sorted({r.user_id for r in rows}, key=str)
+    index = {u: i for i, u in enumerate(users)}
+    width = (end - start).days
+    M = np.full((len(users), width), np.nan)
+    for r in rows:
+        col = (r.date - start).days
+        if 0 <= col < width:
+            M[index[r.user_id], col] = float(r.total_minutes or 0)
+    return users, M
@@ -0,0 +1,327 @@
+# app/services/hourly_rollup.py
+"""`usage_hourly` rollup: per (user, device, date, hour, package) seconds.
+
+Ingest, yeni eklenen oturumları (RETURNING) yerel saat sınırlarında böler ve
+saniyeleri rollup'a ekler; aynı oturum iki kez gelirse ON CONFLICT'e takıldığı
+için rollup'a da bir kez yazılır. Her saat dilimi için kullanıcının gece
+penceresiyle kesişim de (`night_seconds`) yazılır; app detay ekranı toplamı,
+gece süresini ve histogramı 24 satırdan okur.
+
+`usage_hourly_day` gün kapsama işaretidir: günün tüm oturumları rollup'ta ve
+gece saniyeleri kayıttaki pencereyle hesaplanmış. Rollup'tan önceki geçmiş,
+COPY ile toplu yüklenen veri ve gece penceresi değişimi için `rebuild_hourly`
+aralığı app_session'dan yeniden üretir; işaretsiz günleri okuyan taraf ham
+oturumlara düşer.
+"""
+import os
+from datetime import date, datetime, time, timedelta
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+from uuid import UUID
+
+import numpy as np
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.models.core import UsageHourly, UsageHourlyDay, UserSettings
+from app.services.feature_batch import LOCAL_TZ_NAME, lock_feature_users
+from app.services.night_window import LOCAL_TZ, NightWindow, to_epoch_us
+from app.services.usage_aggregation import (
+    TR_OFFSET_US,
+    US_PER_HOUR,
+    expand_hour_segments,
+    local_day_to_date,
+)
+
+# Gece penceresi değişince bu kadar günlük rollup yeni pencereyle yeniden kurulur;
+# daha eski günlerin işareti eski pencerede kalır ve app detay ham oturumlardan hesaplanır
+HOURLY_NIGHT_REBUILD_DAYS = int(os.getenv("HOURLY_NIGHT_REBUILD_DAYS", "35"))
+REBUILD_FETCH_ROWS = int(os.getenv("HOURLY_REBUILD_FETCH_ROWS", "50000"))
+
+_HOURLY_UPSERT_SQL = text(
+    """
+INSERT INTO usage_hourly AS h (user_id, device_id, date, hour, package_name, seconds, night_seconds)
+SELECT * FROM unnest(
+    CAST(:user_ids AS uuid[]), CAST(:device_ids AS uuid[]), CAST(:days AS date[]),
+    CAST(:hours AS smallint[]), CAST(:packages AS text[]), CAST(:seconds AS float8[]),
+    CAST(:night_seconds AS float8[])
+)
+ON CONFLICT ON CONSTRAINT pk_usage_hourly DO UPDATE SET
+    seconds = h.seconds + EXCLUDED.seconds,
+    night_seconds = h.night_seconds + EXCLUDED.night_seconds
+"""
+)
+
+_HOURLY_DELETE_SQL = text(
+    """
+DELETE FROM usage_hourly
+WHERE date BETWEEN :start AND :end
+  AND (CAST(:user_ids AS uuid[]) IS NULL OR user_id = ANY(CAST(:user_ids AS uuid[])))
+"""
+)
+
+_COVERAGE_DELETE_SQL = text(
+    """
+DELETE FROM usage_hourly_day
+WHERE date BETWEEN :start AND :end
+  AND (CAST(:user_ids AS uuid[]) IS NULL OR user_id = ANY(CAST(:user_ids AS uuid[])))
+"""
+)
+
+_REBUILD_SESSIONS_SQL = text(
+    """
+SELECT user_id, package_name, started_at, ended_at, device_id
+FROM app_session
+WHERE ended_at > started_at
+  AND started_at < :range_end
+  AND ended_at > :range_start
+  AND (CAST(:user_ids AS uuid[]) IS NULL OR user_id = ANY(CAST(:user_ids AS uuid[])))
+"""
+)
+
+# Yeniden kurulan günler kesin kapsanır
+_COVERAGE_UPSERT_SQL = text(
+    """
+INSERT INTO usage_hourly_day AS d (user_id, date, night_start, night_end)
+SELECT * FROM unnest(
+    CAST(:user_ids AS uuid[]), CAST(:days AS date[]),
+    CAST(:night_starts AS time[]), CAST(:night_ends AS time[])
+)
+ON CONFLICT ON CONSTRAINT pk_usage_hourly_day DO UPDATE SET
+    night_start = EXCLUDED.night_start,
+    night_end = EXCLUDED.night_end
+"""
+)
+
+# Ingest: gece saniyeleri başka pencereyle yazılmış günün işareti düşer
+_COVERAGE_STALE_SQL = text(
+    """
+DELETE FROM usage_hourly_day d
+USING unnest(
+    CAST(:user_ids AS uuid[]), CAST(:days AS date[]),
+    CAST(:night_starts AS time[]), CAST(:night_ends AS time[])
+) AS k(user_id, day, night_start, night_end)
+WHERE d.user_id = k.user_id
+  AND d.date = k.day
+  AND (d.night_start, d.night_end) IS DISTINCT FROM (k.night_start, k.night_end)
+"""
+)
+
+# Ingest: işaretsiz gün ancak bu transaction'dan önce yazılmış oturumu yoksa
+# (hepsi rollup'tan geçiyorsa) kapsanmış sayılır; rollup öncesi geçmişi olan
+# günler rebuild'e kadar ham oturumlardan okunur
+_COVERAGE_MARK_SQL = text(
+    """
+INSERT INTO usage_hourly_day (user_id, date, night_start, night_end)
+SELECT k.user_id, k.day, k.night_start, k.night_end
+FROM unnest(
+    CAST(:user_ids AS uuid[]), CAST(:days AS date[]),
+    CAST(:night_starts AS time[]), CAST(:night_ends AS time[])
+) AS k(user_id, day, night_start, night_end)
+WHERE NOT EXISTS (
+    SELECT 1 FROM usage_hourly_day d WHERE d.user_id = k.user_id AND d.date = k.day
+)
+AND NOT EXISTS (
+    SELECT 1 FROM app_session s
+    WHERE s.user_id = k.user_id
+      AND s.started_at < (k.day + 1)::timestamp AT TIME ZONE :tz
+      AND s.ended_at > k.day::timestamp AT TIME ZONE :tz
+      AND s.occurred_at < transaction_timestamp()
+)
+ON CONFLICT ON CONSTRAINT pk_usage_hourly_day DO NOTHING
+"""
+)
+
+BucketKey = Tuple[UUID, UUID, int, str]
+
+
+def _night_windows(db: Session, user_ids: Iterable[UUID]) -> Dict[UUID, NightWindow]:
+    settings = db.query(UserSettings).filter(UserSettings.user_id.in_(list(user_ids))).all()
+    return {s.user_id: NightWindow.from_settings(s) for s in settings}
+
+
+def _bucket_sessions(
+    rows: Sequence[tuple],
+    windows: Dict[UUID, NightWindow],
+    start_us: np.ndarray,
+    end_us: np.ndarray,
+) -> Dict[BucketKey, List[float]]:
+    """(user, device, mutlak yerel saat, paket) -> [saniye, gece saniyesi]."""
+    idx, local_hour, seconds = expand_hour_segments(start_us, end_us, TR_OFFSET_US)
+    if idx.size == 0:
+        return {}
+
+    # Saat diliminin UTC sınırları; gece kesişimi dilim başına kullanıcının penceresiyle
+    seg_start = np.maximum(local_hour * US_PER_HOUR - TR_OFFSET_US, start_us[idx])
+    seg_end = np.minimum((local_hour + 1) * US_PER_HOUR - TR_OFFSET_US, end_us[idx])
+    night = np.zeros(idx.size, dtype=np.float64)
+    by_user: Dict[UUID, List[int]] = {}
+    for pos, i in enumerate(idx.tolist()):
+        by_user.setdefault(rows[i][0], []).append(pos)
+    for user_id, positions in by_user.items():
+        pos = np.asarray(positions)
+        window = windows.get(user_id, NightWindow.from_times())
+        night[pos] = window.overlap_seconds_us(seg_start[pos], seg_end[pos])
+
+    buckets: Dict[BucketKey, List[float]] = {}
+    for i, h, sec, night_sec in zip(idx.tolist(), local_hour.tolist(), seconds.tolist(), night.tolist()):
+        r = rows[i]
+        acc = buckets.setdefault((r[0], r[4], h, r[1]), [0.0, 0.0])
+        acc[0] += sec
+        acc[1] += night_sec
+    return buckets
+
+
+def _write_buckets(db: Session, buckets: Dict[BucketKey, List[float]]) -> Dict[Tuple[UUID, date], None]:
+    """Upsert buckets; dokunulan (user_id, tarih) çiftlerini sırayla döner."""
+    keys = list(buckets)
+    day_cache: Dict[int, date] = {}
+    days = []
+    for _, _, h, _ in keys:
+        d = h // 24
+        if d not in day_cache:
+            day_cache[d] = local_day_to_date(d)
+        days.append(day_cache[d])
+
+    db.execute(
+        _HOURLY_UPSERT_SQL,
+        {
+            "user_ids": [str(k[0]) for k in keys],
+            "device_ids": [str(k[1]) for k in keys],
+            "days": days,
+            "hours": [k[2] % 24 for k in keys],
+            "packages": [k[3] for k in keys],
+            "seconds": [buckets[k][0] for k in keys],
+            "night_seconds": [buckets[k][1] for k in keys],
+        },
+    )
+    return dict.fromkeys((k[0], d) for k, d in zip(keys, days))
+
+
+def _coverage_params(days: Iterable[Tuple[UUID, date]], windows: Dict[UUID, NightWindow]) -> dict:
+    pairs = list(days)
+    times = [windows.get(u, NightWindow.from_times()).as_times() for u, _ in pairs]
+    return {
+        "user_ids": [str(u) for u, _ in pairs],
+        "days": [d for _, d in pairs],
+        "night_starts": [t[0] for t in times],
+        "night_ends": [t[1] for t in times],
+    }
+
+
+def _session_bounds(rows: Sequence[tuple]) -> Tuple[np.ndarray, np.ndarray]:
+    start_us = np.fromiter((to_epoch_us(r[2]) for r in rows), dtype=np.int64, count=len(rows))
+    end_us = np.fromiter((to_epoch_us(r[3]) for r in rows), dtype=np.int64, count=len(rows))
+    return start_us, end_us
+
+
+def apply_hourly_rollup(db: Session, inserted: Sequence[tuple]) -> int:
+    """
+    Add freshly inserted sessions to usage_hourly.
+
+    `inserted` satırları ingest RETURNING sırasındadır:
+    (user_id, package_name, started_at, ended_at, device_id). Commit çağırana aittir.
+    """
+    rows = [r for r in inserted if r[2] is not None and r[3] is not None]
+    if not rows:
+        return 0
+
+    user_ids = {r[0] for r in rows}
+    # Gece penceresi rebuild'i ile aynı kullanıcı kilidi (önce kilit, sonra yazım)
+    lock_feature_users(db, user_ids)
+    windows = _night_windows(db, user_ids)
+
+    start_us, end_us = _session_bounds(rows)
+    buckets = _bucket_sessions(rows, windows, start_us, end_us)
+    if not buckets:
+        return 0
+
+    touched = _write_buckets(db, buckets)
+    params = _coverage_params(touched, windows)
+    db.execute(_COVERAGE_STALE_SQL, params)
+    db.execute(_COVERAGE_MARK_SQL, {**params, "tz": LOCAL_TZ_NAME})
+    return len(buckets)
+
+
+def hourly_usage(
+    db: Session,
+    user_id: UUID,
+    package_name: str,
+    target_date: date,
+    window: NightWindow,
+) -> Optional[Tuple[List[float], float]]:
+    """
+    (24 saatlik saniye dizisi, gece saniyesi) - tüm cihazlar toplamı.
+
+    Gün rollup'ta kapsanmıyorsa ya da gece saniyeleri başka pencereyle yazılmışsa None.
+    """
+    marker = (
+        db.query(UsageHourlyDay.night_start, UsageHourlyDay.night_end)
+        .filter(UsageHourlyDay.user_id == user_id)
+        .filter(UsageHourlyDay.date == target_date)
+        .first()
+    )
+    if marker is None or NightWindow.from_times(marker.night_start, marker.night_end) != window:
+        return None
+
+    rows = (
+        db.query(UsageHourly.hour, UsageHourly.seconds, UsageHourly.night_seconds)
+        .filter(UsageHourly.user_id == user_id)
+        .filter(UsageHourly.date == target_date)
+        .filter(UsageHourly.package_name == package_name)
+        .all()
+    )
+    hourly = [0.0] * 24
+    night = 0.0
+    for hour, seconds, night_seconds in rows:
+        hourly[hour] += seconds or 0.0
+        night += night_seconds or 0.0
+    return hourly, night
+
+
+def rebuild_hourly(db: Session, start: date, end: date, user_ids: Optional[List[UUID]] = None) -> int:
+    """Recreate usage_hourly and its day markers for [start, end] from app_session (caller commits)."""
+    range_start = datetime.combine(start, time.min, tzinfo=LOCAL_TZ)
+    range_end = datetime.combine(end + timedelta(days=1), time.min, tzinfo=LOCAL_TZ)
+    range_start_us, range_end_us = to_epoch_us(range_start), to_epoch_us(range_end)
+    users = [str(u) for u in user_ids] if user_ids is not None else None
+    db.execute(_HOURLY_DELETE_SQL, {"start": start, "end": end, "user_ids": users})
+    db.execute(_COVERAGE_DELETE_SQL, {"start": start, "end": end, "user_ids": users})
+
+    result = db.execute(
+        _REBUILD_SESSIONS_SQL.execution_options(stream_results=True),
+        {"range_start": range_start, "range_end": range_end, "user_ids": users},
+    )
+    windows: Dict[UUID, NightWindow] = {}
+    covered: Dict[Tuple[UUID, date], None] = {}
+    written = 0
+    while True:
+        rows = result.fetchmany(REBUILD_FETCH_ROWS)
+        if not rows:
+            break
+        new_users = {r[0] for r in rows} - windows.keys()
+        if new_users:
+            windows.update(_night_windows(db, new_users))
+        start_us, end_us = _session_bounds(rows)
+        # Aralık dışına taşan oturumlar sınırda kırpılır; komşu günler dokunulmaz
+        start_us = np.maximum(start_us, range_start_us)
+        end_us = np.minimum(end_us, range_end_us)
+        buckets = _bucket_sessions(rows, windows, start_us, end_us)
+        if buckets:
+            covered.update(_write_buckets(db, buckets))
+            written += len(buckets)
+
+    if covered:
+        db.execute(_COVERAGE_UPSERT_SQL, _coverage_params(covered, windows))
+    return written
+
+
+def rebuild_night_window(db: Session, user_id: UUID) -> int:
+    """
+    Gece penceresi değişen kullanıcının son HOURLY_NIGHT_REBUILD_DAYS gününü yeniden kurar.
+
+    Ayar satırı aynı transaction'da güncellenmiş olmalı (caller commits).
+    """
+    lock_feature_users(db, [user_id])
+    today = datetime.now(LOCAL_TZ).date()
+    start = today - timedelta(days=max(HOURLY_NIGHT_REBUILD_DAYS, 1) - 1)
+    return rebuild_hourly(db, start, today, user_ids=[user_id])
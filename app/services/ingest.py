@@ -0,0 +1,327 @@
+# app/services/ingest.py
+"""Usage ingest helpers shared by the report endpoints.
+
+`/api/usage/report` (tek JSON gövde) ve `/api/usage/report/stream` (NDJSON)
+aynı gün bölme, session satırı üretme ve upsert mantığını kullanır.
+"""
+from datetime import date, datetime, time, timedelta, timezone
+from typing import Dict, Iterable, List, Sequence, Set, Tuple
+from uuid import UUID
+
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from app.models.core import AppSession, DailyUsageLog
+from app.schemas.usage import UsageEvent
+from app.services import bulk_loader, feature_delta, hourly_rollup, period_rollup
+from app.services.categorizer import get_or_create_app_entries
+from app.services.usage_aggregation import aggregate_events_vectorized
+
+# Türkiye için UTC+3 saat dilimi
+TR_TZ = timezone(timedelta(hours=3))
+
+# Tek bir paket için bir günde kabul edilen en yüksek süre
+MAX_DAILY_SECONDS = 16 * 3600
+
+SESSION_SOURCE = "android_sync"
+
+# Bu olay sayısının altında NumPy kurulum maliyeti döngüden pahalı
+VECTORIZE_MIN_EVENTS = 64
+
+# Tek INSERT ifadesindeki satır sayısı (Postgres'in 65535 parametre sınırının altında kalır)
+INSERT_CHUNK_ROWS = 1000
+
+
+class ImplausibleUsageError(ValueError):
+    """Raised when a (date, package) total cannot be real device usage."""
+
+
+def split_session(start_dt: datetime, end_dt: datetime):
+    """Yield (local date, seconds) segments of a session split at TR midnight."""
+    current_start = start_dt
+    # Stop when we pass the real end time to avoid infinite loop on same-day sessions
+    while current_start <= end_dt:
+        day_end = datetime.combine(current_start.date(), time.max, tzinfo=TR_TZ)
+        segment_end = min(day_end, end_dt)
+        duration = (segment_end - current_start).total_seconds()
+        if duration > 0:
+            yield current_start.date(), duration
+        current_start = segment_end + timedelta(seconds=1)
+
+
+def aggregate_events(
+    user_id: UUID,
+    device_id: UUID,
+    events: Sequence[UsageEvent],
+) -> Tuple[List[dict], Dict[Tuple[date, str], dict], Set[date]]:
+    """Build raw session rows and per-(date, package) totals for a batch of events."""
+    events = list(events)
+    if len(events) < VECTORIZE_MIN_EVENTS:
+        return aggregate_events_loop(user_id, device_id, events)
+    return aggregate_events_vectorized(user_id, device_id, events, TR_TZ, SESSION_SOURCE)
+
+
+def aggregate_events_loop(
+    user_id: UUID,
+    device_id: UUID,
+    events: Iterable[UsageEvent],
+) -> Tuple[List[dict], Dict[Tuple[date, str], dict], Set[date]]:
+    """Olay başına saf Python referans uygulaması (küçük batch'ler ve benchmark için)."""
+    aggregated: Dict[Tuple[date, str], dict] = {}
+    dates: Set[date] = set()
+    session_rows: List[dict] = []
+
+    for ev in events:
+        start_dt = datetime.fromtimestamp(ev.timestamp_start / 1000.0, TR_TZ)
+        end_dt = datetime.fromtimestamp(ev.timestamp_end / 1000.0, TR_TZ)
+
+        if end_dt <= start_dt:
+            continue
+
+        session_rows.append({
+            "user_id": user_id,
+            "device_id": device_id,
+            "package_name": ev.package_name,
+            "started_at": start_dt,
+            "ended_at": end_dt,
+            "source": SESSION_SOURCE,
+            "payload": None,
+        })
+
+        for usage_date, duration in split_session(start_dt, end_dt):
+            dates.add(usage_date)
+            key = (usage_date, ev.package_name)
+            if key not in aggregated:
+                aggregated[key] = {"duration": 0, "app_name": ev.app_name}
+            aggregated[key]["duration"] += duration
+            if ev.app_name:
+                aggregated[key]["app_name"] = ev.app_name
+
+    return session_rows, aggregated, dates
+
+
+def build_daily_rows(
+    user_id: UUID,
+    device_id: UUID,
+    aggregated: Dict[Tuple[date, str], dict],
+) -> List[dict]:
+    """Turn aggregated totals into `daily_usage_log` rows, rejecting implausible days."""
+    rows = []
+    now = datetime.utcnow()
+    for (usage_date, pkg), data in aggregated.items():
+        total_seconds = int(data["duration"])
+        if total_seconds > MAX_DAILY_SECONDS:
+            raise ImplausibleUsageError(
+                f"implausible daily total pkg={pkg} date={usage_date} total_seconds={total_seconds}"
+            )
+
+        rows.append({
+            "user_id": user_id,
+            "device_id": device_id,
+            "usage_date": usage_date,
+            "package_name": pkg,
+            "app_name": data["app_name"],
+            "total_seconds": total_seconds,
+            "updated_at": now,
+        })
+    return rows
+
+
+def insert_sessions(db: Session, session_rows: List[dict]) -> List[tuple]:
+    """
+    Insert raw sessions, ignoring ones already stored (unique_session_entry).
+
+    Sadece gerçekten eklenen satırların (user_id, package_name, started_at, ended_at,
+    device_id) değerlerini döner (RETURNING); feature deltaları ve saatlik rollup
+    bunlardan hesaplanır.
+    """
+    if bulk_loader.should_use_copy(db, len(session_rows)):
+        return bulk_loader.copy_sessions(db, session_rows, returning=True)
+    inserted: List[tuple] = []
+    for chunk in _chunked(session_rows):
+        stmt = insert(AppSession).values(chunk)
+        stmt = stmt.on_conflict_do_nothing(
+            index_elements=[
+                AppSession.user_id,
+                AppSession.device_id,
+                AppSession.package_name,
+                AppSession.started_at,
+            ]
+        ).returning(
+            AppSession.user_id,
+            AppSession.package_name,
+            AppSession.started_at,
+            AppSession.ended_at,
+            AppSession.device_id,
+        )
+        inserted.extend(tuple(row) for row in db.execute(stmt))
+    return inserted
+
+
+def upsert_daily_usage(db: Session, rows: List[dict], accumulate: bool = False) -> None:
+    """
+    Upsert `daily_usage_log` rows.
+
+    Varsayılan: gelen toplam mevcut değeri ezer (cihaz o günün tamamını gönderir).
+    accumulate=True: gelen saniye mevcut değere eklenir (aynı akışın sonraki parçaları).
+    BULK_COPY_THRESHOLD üstündeki batch'ler COPY + staging tablosu ile yazılır.
+    """
+    if bulk_loader.should_use_copy(db, len(rows)):
+        bulk_loader.copy_daily_usage(db, rows, accumulate=accumulate)
+        return
+    for chunk in _chunked(rows):
+        stmt = insert(DailyUsageLog).values(chunk)
+        total_seconds = stmt.excluded.total_seconds
+        if accumulate:
+            total_seconds = DailyUsageLog.total_seconds + stmt.excluded.total_seconds
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[
+                DailyUsageLog.user_id,
+                DailyUsageLog.device_id,
+                DailyUsageLog.usage_date,
+                DailyUsageLog.package_name,
+            ],
+            set_={
+                "app_name": stmt.excluded.app_name,
+                "total_seconds": total_seconds,
+                "updated_at": datetime.utcnow(),
+            },
+        )
+        db.execute(stmt)
+
+
+def _chunked(rows: List[dict], size: int = INSERT_CHUNK_ROWS):
+    for i in range(0, len(rows), size):
+        yield rows[i:i + size]
+
+
+def persist_usage(
+    db: Session,
+    session_rows: List[dict],
+    daily_rows: List[dict],
+    accumulate_rows: List[dict] = (),
+) -> Set[Tuple[UUID, date]]:
+    """
+    Write one batch of sessions and daily totals (caller commits).
+
+    Saatlik ve haftalık/aylık rollup'lar aynı transaction'da güncellenir.
+    Artımlı modda yeni oturumların katkısı aynı transaction'da feature_daily'ye
+    eklenir. Dönen küme tam yeniden hesap gereken (user_id, tarih) çiftleridir:
+    artımlı modda sadece delta uygulanamayanlar, recompute modunda yeni oturum
+    eklenen tüm günler.
+    """
+    inserted = insert_sessions(db, session_rows)
+    upsert_daily_usage(db, daily_rows)
+    upsert_daily_usage(db, list(accumulate_rows), accumulate=True)
+    hourly_rollup.apply_hourly_rollup(db, inserted)
+    period_rollup.refresh_usage_periods(db, period_rollup.touched_keys(daily_rows, accumulate_rows))
+
+    if feature_delta.incremental_enabled():
+        return feature_delta.apply_session_deltas(db, inserted)
+    return {(row[0], row[2].astimezone(TR_TZ).date()) for row in inserted}
+
+
+def apply_usage_batches(
+    db: Session,
+    batches: List[Tuple[UUID, UUID, List[UsageEvent]]],
+) -> Set[Tuple[UUID, date]]:
+    """
+    Apply many (user_id, device_id, events) report batches in one transaction.
+
+    Her batch kendi (tarih, paket) toplamlarını ezdiği için aynı anahtar birden
+    fazla batch'te geçerse sıradaki son batch kazanır; bu da istekleri tek tek
+    uygulamakla aynı sonucu verir. Dönen küme özellikleri tam olarak yeniden
+    hesaplanacak (user_id, tarih) çiftleridir (bkz. `persist_usage`). Commit
+    çağırana aittir.
+    """
+    session_rows: List[dict] = []
+    merged: Dict[Tuple[UUID, UUID, date, str], dict] = {}
+
+    for user_id, device_id, events in batches:
+        batch_sessions, aggregated, _ = aggregate_events(user_id, device_id, events)
+        session_rows.extend(batch_sessions)
+        for row in build_daily_rows(user_id, device_id, aggregated):
+            merged[(user_id, device_id, row["usage_date"], row["package_name"])] = row
+
+    # Katalog eklemeleri de aynı transaction'da: spool batch'i ya tamamen uygulanır ya hiç
+    get_or_create_app_entries(db, {key[3] for key in merged}, commit=False)
+    return persist_usage(db, session_rows, list(merged.values()))
+
+
+class ChunkedUsageWriter:
+    """
+    Writes an unbounded event stream in fixed-size chunks.
+
+    Her `chunk_size` olayda session'lar ve günlük toplamlar yazılıp commit edilir.
+    Bir (tarih, paket) anahtarı akışta ilk kez yazılırken mevcut değeri ezer,
+    sonraki parçalarda üstüne eklenir; böylece aynı akış tekrar gönderilirse
+    sonuç yine aynı olur. Bellekte sadece o anki parça ve anahtar başına
+    kümülatif saniye tutulur.
+    """
+
+    def __init__(self, db: Session, user_id: UUID, device_id: UUID, chunk_size: int):
+        self.db = db
+        self.user_id = user_id
+        self.device_id = device_id
+        self.chunk_size = chunk_size
+        self.accepted = 0
+        self.chunks = 0
+        self.dates: Set[date] = set()
+        # Tam yeniden hesap gereken (user_id, tarih) çiftleri (persist_usage'dan)
+        self.feature_keys: Set[Tuple[UUID, date]] = set()
+        self._pending: List[UsageEvent] = []
+        self._totals: Dict[Tuple[date, str], int] = {}
+        self._known_packages: Set[str] = set()
+
+    @property
+    def stored(self) -> int:
+        """Events already committed to the database."""
+        return self.accepted - len(self._pending)
+
+    @property
+    def is_full(self) -> bool:
+        return len(self._pending) >= self.chunk_size
+
+    def add(self, event: UsageEvent) -> None:
+        self._pending.append(event)
+        self.accepted += 1
+
+    def flush(self) -> None:
+        if not self._pending:
+            return
+
+        session_rows, aggregated, dates = aggregate_events(self.user_id, self.device_id, self._pending)
+        rows = build_daily_rows(self.user_id, self.device_id, aggregated)
+
+        new_packages = {pkg for (_, pkg) in aggregated} - self._known_packages
+        if new_packages:
+            get_or_create_app_entries(self.db, new_packages)
+            self._known_packages |= new_packages
+
+        fresh_rows, seen_rows = [], []
+        for row in rows:
+            key = (row["usage_date"], row["package_name"])
+            running = self._totals.get(key)
+            if running is None:
+                fresh_rows.append(row)
+                running = 0
+            else:
+                seen_rows.append(row)
+            running += row["total_seconds"]
+            if running > MAX_DAILY_SECONDS:
+                raise ImplausibleUsageError(
+                    f"implausible daily total pkg={key[1]} date={key[0]} total_seconds={running}"
+                )
+            self._totals[key] = running
+
+        try:
+            feature_keys = persist_usage(self.db, session_rows, fresh_rows, seen_rows)
+            self.db.commit()
+        except Exception:
+            self.db.rollback()
+            raise
+
+        self.dates |= dates
+        self.feature_keys |= feature_keys
+        self.chunks += 1
+        self._pending = []
@@ -0,0 +1,321 @@
+# app/services/ingest_spool.py
+"""Durable write-behind spool for usage reports.
+
+`USAGE_INGEST_MODE=spool` iken `/api/usage/report` olayları doğruladıktan sonra
+yerel bir SQLite dosyasına (WAL, synchronous=FULL) ekler ve hemen cevap döner.
+`SpoolDrainer` arka planda biriken batch'leri büyük gruplar halinde Postgres'e
+uygular ve ancak commit başarılı olduktan sonra spool'dan siler. Süreç yeniden
+başladığında silinmemiş batch'ler otomatik olarak tekrar oynatılır.
+
+Her spool dosyasını tek bir drainer okumalı; birden çok uvicorn worker'ı varsa
+her biri için ayrı INGEST_SPOOL_PATH verilmelidir.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+from uuid import UUID
+
+from sqlalchemy.exc import DBAPIError, InterfaceError, OperationalError
+
+from app.db import SessionLocal
+from app.schemas.usage import UsageEvent
+from app.services.dashboard_cache import dashboard_cache
+from app.services.feature_scheduler import feature_scheduler
+from app.services.ingest import apply_usage_batches
+
+INGEST_MODE = os.getenv("USAGE_INGEST_MODE", "direct").lower()  # direct | spool
+SPOOL_PATH = os.getenv("INGEST_SPOOL_PATH", os.path.join("var", "ingest_spool.sqlite3"))
+
+# Drainer tek seferde en fazla bu kadar batch'i tek transaction'da uygular
+DRAIN_BATCH_LIMIT = int(os.getenv("INGEST_DRAIN_BATCH_LIMIT", "200"))
+DRAIN_IDLE_SECONDS = float(os.getenv("INGEST_DRAIN_IDLE_SECONDS", "1.0"))
+DRAIN_MAX_BACKOFF_SECONDS = 30.0
+# Veri kaynaklı (bağlantı dışı) hatada batch bu kadar denemeden sonra dead tablosuna taşınır
+MAX_ATTEMPTS = 5
+
+
+@dataclass
+class SpooledBatch:
+    seq: int
+    user_id: UUID
+    device_id: UUID
+    events: List[UsageEvent]
+    received_at: float
+    attempts: int
+
+
+class IngestSpool:
+    """Append-only SQLite spool. Tüm metotlar thread-safe."""
+
+    def __init__(self, path: str = SPOOL_PATH):
+        self.path = path
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.appended_batches = 0
+        self.drained_batches = 0
+        self.drained_events = 0
+        self.failed_attempts = 0
+        self.dead_batches = 0
+        self.last_error: Optional[str] = None
+        self.last_drain_at: Optional[float] = None
+
+    def open(self):
+        if self._conn is not None:
+            return
+        with self._lock:
+            if self._conn is not None:  # başka thread bu arada açtı
+                return
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=FULL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS spool (
+                    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                    user_id TEXT NOT NULL,
+                    device_id TEXT NOT NULL,
+                    event_count INTEGER NOT NULL,
+                    events TEXT NOT NULL,
+                    received_at REAL NOT NULL,
+                    attempts INTEGER NOT NULL DEFAULT 0
+                )
+                """
+            )
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS spool_dead (
+                    seq INTEGER PRIMARY KEY,
+                    user_id TEXT NOT NULL,
+                    device_id TEXT NOT NULL,
+                    event_count INTEGER NOT NULL,
+                    events TEXT NOT NULL,
+                    received_at REAL NOT NULL,
+                    attempts INTEGER NOT NULL,
+                    error TEXT
+                )
+                """
+            )
+            self._conn = conn
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def append(self, user_id: UUID, device_id: UUID, events: List[UsageEvent]) -> int:
+        """Persist one report batch; returns its sequence number once it is on disk."""
+        self.open()
+        body = json.dumps([e.model_dump() for e in events], separators=(",", ":"))
+        with self._lock:
+            cur = self._conn.execute(
+                "INSERT INTO spool (user_id, device_id, event_count, events, received_at) VALUES (?, ?, ?, ?, ?)",
+                (str(user_id), str(device_id), len(events), body, time.time()),
+            )
+            seq = cur.lastrowid
+            self.appended_batches += 1
+        self.wakeup.set()
+        return seq
+
+    def peek(self, limit: int) -> List[SpooledBatch]:
+        """Oldest pending batches, in arrival order."""
+        self.open()
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT seq, user_id, device_id, events, received_at, attempts FROM spool ORDER BY seq LIMIT ?",
+                (limit,),
+            ).fetchall()
+        return [
+            SpooledBatch(
+                seq=seq,
+                user_id=UUID(user_id),
+                device_id=UUID(device_id),
+                events=[UsageEvent(**e) for e in json.loads(events)],
+                received_at=received_at,
+                attempts=attempts,
+            )
+            for seq, user_id, device_id, events, received_at, attempts in rows
+        ]
+
+    def ack(self, batches: List[SpooledBatch]):
+        """Drop batches that were committed to Postgres."""
+        if not batches:
+            return
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            self._conn.executemany("DELETE FROM spool WHERE seq = ?", [(b.seq,) for b in batches])
+            self._conn.execute("COMMIT")
+            self.drained_batches += len(batches)
+            self.drained_events += sum(len(b.events) for b in batches)
+            self.last_drain_at = time.time()
+
+    def mark_failed(self, batch: SpooledBatch, error: str):
+        """Bump the attempt counter; move the batch aside once it keeps failing on its own data."""
+        with self._lock:
+            attempts = batch.attempts + 1
+            if attempts >= MAX_ATTEMPTS:
+                self._conn.execute("BEGIN IMMEDIATE")
+                self._conn.execute(
+                    """
+                    INSERT OR REPLACE INTO spool_dead
+                    SELECT seq, user_id, device_id, event_count, events, received_at, ?, ? FROM spool WHERE seq = ?
+                    """,
+                    (attempts, error, batch.seq),
+                )
+                self._conn.execute("DELETE FROM spool WHERE seq = ?", (batch.seq,))
+                self._conn.execute("COMMIT")
+                self.dead_batches += 1
+            else:
+                self._conn.execute("UPDATE spool SET attempts = ? WHERE seq = ?", (attempts, batch.seq))
+
+    def stats(self) -> Dict:
+        if self._conn is None and not os.path.exists(self.path):
+            return {"mode": INGEST_MODE, "pending_batches": 0, "pending_events": 0, "lag_seconds": 0.0}
+        self.open()
+        with self._lock:
+            pending_batches, pending_events, oldest = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(event_count), 0), MIN(received_at) FROM spool"
+            ).fetchone()
+            dead = self._conn.execute("SELECT COUNT(*) FROM spool_dead").fetchone()[0]
+        now = time.time()
+        return {
+            "mode": INGEST_MODE,
+            "pending_batches": pending_batches,
+            "pending_events": pending_events,
+            "lag_seconds": round(now - oldest, 3) if oldest else 0.0,
+            "appended_batches": self.appended_batches,
+            "drained_batches": self.drained_batches,
+            "drained_events": self.drained_events,
+            "failed_attempts": self.failed_attempts,
+            "dead_batches": dead,
+            "last_drain_age_seconds": round(now - self.last_drain_at, 3) if self.last_drain_at else None,
+            "last_error": self.last_error,
+        }
+
+
+class SpoolDrainer(threading.Thread):
+    """Background worker applying spooled batches to app_session / daily_usage_log."""
+
+    def __init__(self, spool: IngestSpool):
+        super().__init__(name="ingest-spool-drainer", daemon=True)
+        self.spool = spool
+        self._stop_event = threading.Event()
+        self._backoff = 0.0
+
+    def stop(self, timeout: float = 5.0):
+        self._stop_event.set()
+        self.spool.wakeup.set()
+        self.join(timeout)
+
+    def run(self):
+        print(f"INGEST SPOOL drainer started path={self.spool.path}")
+        while not self._stop_event.is_set():
+            batches = self.spool.peek(DRAIN_BATCH_LIMIT)
+            if not batches:
+                self.spool.wakeup.wait(DRAIN_IDLE_SECONDS)
+                self.spool.wakeup.clear()
+                continue
+
+            if self._drain(batches):
+                self._backoff = 0.0
+            else:
+                self._backoff = min(max(self._backoff * 2, 0.5), DRAIN_MAX_BACKOFF_SECONDS)
+                self._stop_event.wait(self._backoff)
+        print("INGEST SPOOL drainer stopped")
+
+    def _drain(self, batches: List[SpooledBatch]) -> bool:
+        try:
+            touched = self._apply(batches)
+        except DBAPIError as e:
+            if e.connection_invalidated or _is_connection_error(e):
+                # DB erişilemez: batch'ler spool'da kalır, backoff ile tekrar denenir
+                self._record_error(e)
+                return False
+            return self._drain_one_by_one(batches)
+        except Exception:
+            return self._drain_one_by_one(batches)
+
+        self.spool.ack(batches)
+        self._recompute(touched)
+        return True
+
+    def _drain_one_by_one(self, batches: List[SpooledBatch]) -> bool:
+        """Grup başarısız olduysa hatalı batch'i bulmak için tek tek uygula."""
+        progressed = False
+        for batch in batches:
+            try:
+                touched = self._apply([batch])
+            except Exception as e:
+                self._record_error(e)
+                if isinstance(e, DBAPIError) and (e.connection_invalidated or _is_connection_error(e)):
+                    return progressed
+                self.spool.mark_failed(batch, str(e))
+                continue
+            self.spool.ack([batch])
+            self._recompute(touched)
+            progressed = True
+        return progressed
+
+    def _apply(self, batches: List[SpooledBatch]):
+        db = SessionLocal()
+        try:
+            touched = apply_usage_batches(db, [(b.user_id, b.device_id, b.events) for b in batches])
+            db.commit()
+            for user_id in {b.user_id for b in batches}:
+                dashboard_cache.invalidate_user(user_id)
+            return touched
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def _recompute(self, touched):
+        for user_id, target_date in touched:
+            feature_scheduler.schedule(user_id, target_date)
+
+    def _record_error(self, e: Exception):
+        self.spool.failed_attempts += 1
+        self.spool.last_error = f"{type(e).__name__}: {e}"[:500]
+        print(f"INGEST SPOOL drain error={self.spool.last_error}")
+
+
+def _is_connection_error(e: DBAPIError) -> bool:
+    return isinstance(e, (OperationalError, InterfaceError))
+
+
+# Global erişim nesneleri
+ingest_spool = IngestSpool()
+_drainer: Optional[SpoolDrainer] = None
+
+
+def spool_enabled() -> bool:
+    return INGEST_MODE == "spool"
+
+
+def start_drainer():
+    """Spool modu açıksa ya da diskte oynatılmamış batch kaldıysa drainer'ı başlat."""
+    global _drainer
+    if _drainer is not None:
+        return
+    if not spool_enabled() and not os.path.exists(ingest_spool.path):
+        return
+    ingest_spool.open()
+    _drainer = SpoolDrainer(ingest_spool)
+    _drainer.start()
+
+
+def stop_drainer():
+    global _drainer
+    if _drainer is not None:
+        _drainer.stop()
+        _drainer = None
+    ingest_spool.close()
@@ -0,0 +1,143 @@
+# app/services/model_registry.py
+"""Process-wide registry of trained model artifacts.
+
+Modeller uygulama açılışında (main.py lifespan) bir kez yüklenir; istekler
+sadece `model_registry.get("persona")` ile hazır nesneyi alır. Tahmin için
+model `persona_model.CompiledForest`'a çevrilir; bu düz diziler (birkaç yüz KB)
+her süreçte ayrı kopyadır, süreçler arası paylaşılmaz. Pooled tahmin modelinin
+katsayıları (`forecast.json`) da burada tutulur.
+
+Artifact yoksa ve `PERSONA_MODEL_TRAIN_ON_MISSING=true` ise (geliştirme ortamı)
+model açılışta bir kez bellekte eğitilir; ai_pool işçileri asla eğitmez, istek
+yolunda da eğitim yapılmaz.
+"""
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Dict, NamedTuple, Optional
+
+from app.services import persona_model
+
+PERSONA_MODEL_MMAP = os.getenv("PERSONA_MODEL_MMAP", "true").lower() in ("1", "true", "yes")
+# Artifact yoksa açılışta CSV'den bellekte eğit (sadece geliştirme; ~3 sn sürer)
+PERSONA_MODEL_TRAIN_ON_MISSING = os.getenv("PERSONA_MODEL_TRAIN_ON_MISSING", "false").lower() in ("1", "true", "yes")
+
+
+class LoadedModel(NamedTuple):
+    model: object  # tahmin için kullanılan nesne (CompiledForest veya sklearn modeli)
+    metadata: Dict
+    source: str  # "artifact" | "trained_at_startup"
+    loaded_at: datetime
+    load_ms: float
+
+
+class ModelRegistry:
+    def __init__(self):
+        self._models: Dict[str, LoadedModel] = {}
+        self._errors: Dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    def get(self, name: str) -> Optional[LoadedModel]:
+        return self._models.get(name)
+
+    def load_all(self, train_on_missing: bool = PERSONA_MODEL_TRAIN_ON_MISSING):
+        self.load_persona(train_on_missing=train_on_missing)
+        self.load_forecast()
+
+    def load_forecast(self) -> Optional[LoadedModel]:
+        """Pooled forecast katsayıları (forecast.json); yoksa forecasting seasonal modele düşer."""
+        from app.services import forecasting
+
+        with self._lock:
+            t0 = time.perf_counter()
+            try:
+                result = forecasting.load_pooled_model()
+            except Exception as e:
+                self._errors["forecast"] = str(e)
+                print(f"MODEL REGISTRY: forecast load failed: {e}")
+                return self._models.get("forecast")
+            if result is None:
+                return None
+            model, metadata = result
+            loaded = LoadedModel(model, metadata, "artifact", datetime.utcnow(), _ms(t0))
+            self._models["forecast"] = loaded
+            self._errors.pop("forecast", None)
+            print(f"MODEL REGISTRY: forecast {metadata.get('version')} ({loaded.load_ms:.0f} ms)")
+            return loaded
+
+    def load_persona(
+        self,
+        model_dir: str = persona_model.PERSONA_MODEL_DIR,
+        train_on_missing: bool = PERSONA_MODEL_TRAIN_ON_MISSING,
+    ) -> Optional[LoadedModel]:
+        """Load (or reload) the current persona artifact; hata olursa eski model kalır."""
+        with self._lock:
+            t0 = time.perf_counter()
+            try:
+                loaded = self._load_persona_artifact(model_dir, t0)
+                if loaded is None and train_on_missing and os.path.exists(persona_model.PERSONA_TRAIN_PATH):
+                    model, metadata = persona_model.train_persona_model()
+                    loaded = LoadedModel(_compile(model), metadata, "trained_at_startup", datetime.utcnow(), _ms(t0))
+                    print(
+                        "MODEL REGISTRY: persona artifact not found, trained in memory "
+                        "(run app/scripts/train_persona_model.py to persist one)"
+                    )
+            except Exception as e:
+                self._errors["persona"] = str(e)
+                print(f"MODEL REGISTRY: persona load failed: {e}")
+                return self._models.get("persona")
+
+            if loaded is None:
+                self._errors["persona"] = "no artifact and no training data"
+                return None
+            self._models["persona"] = loaded
+            self._errors.pop("persona", None)
+            print(f"MODEL REGISTRY: persona {loaded.metadata.get('version')} ({loaded.source}, {loaded.load_ms:.0f} ms)")
+            return loaded
+
+    def stats(self) -> Dict:
+        return {
+            "models": {
+                name: {
+                    "version": m.metadata.get("version"),
+                    "source": m.source,
+                    "loaded_at": m.loaded_at.isoformat(),
+                    "load_ms": round(m.load_ms, 1),
+                    "predictor": type(m.model).__name__,
+                    "classes": m.metadata.get("classes"),
+                    "model_key": m.metadata.get("model_key"),
+                }
+                for name, m in self._models.items()
+            },
+            "errors": dict(self._errors),
+        }
+
+    def _load_persona_artifact(self, model_dir: str, t0: float) -> Optional[LoadedModel]:
+        import joblib
+
+        manifest = persona_model.read_manifest(model_dir)
+        if manifest is None:
+            return None
+        if manifest.get("features") != persona_model.PERSONA_FEATURES:
+            raise ValueError(f"feature mismatch: artifact={manifest.get('features')}")
+        path = os.path.join(model_dir, manifest["artifact"])
+        model = joblib.load(path, mmap_mode="r" if PERSONA_MODEL_MMAP else None)
+        return LoadedModel(_compile(model), manifest, "artifact", datetime.utcnow(), _ms(t0))
+
+
+def _compile(model):
+    """Düz numpy ağaç formuna çevir; desteklenmeyen model ise olduğu gibi kullan."""
+    try:
+        return persona_model.CompiledForest(model)
+    except Exception as e:
+        print(f"MODEL REGISTRY: compiled predictor unavailable ({e}), using estimator directly")
+        return model
+
+
+def _ms(t0: float) -> float:
+    return (time.perf_counter() - t0) * 1000
+
+
+# Global erişim nesnesi (main.py lifespan'inde yüklenir)
+model_registry = ModelRegistry()
@@ -0,0 +1,117 @@
+# app/services/night_window.py
+"""Shared, precompiled night (bedtime) window overlap calculator.
+
+Kullanıcının `nightly_start`/`nightly_end` aralığı bir kez gün içi mikrosaniye
+ofsetlerine derlenir; oturum dizilerinin gece kesişimi tek seferde NumPy ile
+hesaplanır. Eski gün gün yürüyen hesapla aynı sonucu verir:
+
+- Oturum yerel (TR) gece yarılarında bölünür; gün `23:59:59.999999`'da biter ve
+  sonraki parça bir saniye sonra başlar (`usage_aggregation.expand_day_segments`).
+- Gece yarısını aşan pencere aynı gün içinde [start, 24:00) ve [00:00, end)
+  olarak iki parçaya ayrılır.
+"""
+from dataclasses import dataclass
+from datetime import datetime, time, timedelta, timezone
+from typing import Optional, Sequence, Tuple
+from uuid import UUID
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from app.models.core import UserSettings
+from app.services.usage_aggregation import (
+    TR_OFFSET_US,
+    US_PER_DAY,
+    US_PER_SECOND,
+    expand_day_segments,
+)
+
+DEFAULT_NIGHT_START = time(22, 0)
+DEFAULT_NIGHT_END = time(7, 0)
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+LOCAL_TZ = timezone(timedelta(microseconds=TR_OFFSET_US))
+
+
+def _time_to_us(t: time) -> int:
+    return ((t.hour * 60 + t.minute) * 60 + t.second) * US_PER_SECOND + t.microsecond
+
+
+def _us_to_time(us: int) -> time:
+    seconds, micro = divmod(us, US_PER_SECOND)
+    return time(seconds // 3600, seconds // 60 % 60, seconds % 60, micro)
+
+
+def to_epoch_us(dt: datetime) -> int:
+    """Exact UTC epoch microseconds; naive values are treated as TR local time."""
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=LOCAL_TZ)
+    delta = dt - _EPOCH
+    return (delta.days * 86_400 + delta.seconds) * US_PER_SECOND + delta.microseconds
+
+
+@dataclass(frozen=True)
+class NightWindow:
+    """Bedtime window as microsecond offsets from local midnight."""
+
+    start_us: int
+    end_us: int
+
+    @classmethod
+    def from_times(cls, start: Optional[time] = None, end: Optional[time] = None) -> "NightWindow":
+        return cls(_time_to_us(start or DEFAULT_NIGHT_START), _time_to_us(end or DEFAULT_NIGHT_END))
+
+    @classmethod
+    def from_settings(cls, settings: Optional[UserSettings]) -> "NightWindow":
+        if settings is None:
+            return cls.from_times()
+        return cls.from_times(settings.nightly_start, settings.nightly_end)
+
+    @classmethod
+    def for_user(cls, db: Session, user_id: UUID) -> "NightWindow":
+        settings = db.query(UserSettings).filter(UserSettings.user_id == user_id).first()
+        return cls.from_settings(settings)
+
+    def as_times(self) -> Tuple[time, time]:
+        """(start, end) as local wall-clock times (varsayılanlar uygulanmış)."""
+        return _us_to_time(self.start_us), _us_to_time(self.end_us)
+
+    @property
+    def crosses_midnight(self) -> bool:
+        return self.start_us > self.end_us
+
+    def overlap_seconds_us(self, start_us: np.ndarray, end_us: np.ndarray) -> np.ndarray:
+        """Night overlap in seconds for each [start, end] (UTC epoch microseconds)."""
+        start_us = np.asarray(start_us, dtype=np.int64)
+        end_us = np.asarray(end_us, dtype=np.int64)
+        out = np.zeros(len(start_us), dtype=np.float64)
+        valid = np.flatnonzero(end_us > start_us)
+        if valid.size == 0:
+            return out
+
+        idx, day, seg_start, seg_end = expand_day_segments(start_us[valid], end_us[valid], TR_OFFSET_US)
+        midnight = day * US_PER_DAY
+        if self.crosses_midnight:
+            late = _overlap(seg_start, seg_end, midnight + self.start_us, midnight + US_PER_DAY - 1)
+            early = _overlap(seg_start, seg_end, midnight, midnight + self.end_us)
+            overlap = late + early
+        else:
+            overlap = _overlap(seg_start, seg_end, midnight + self.start_us, midnight + self.end_us)
+
+        out[valid] = np.bincount(idx, weights=overlap / US_PER_SECOND, minlength=valid.size)
+        return out
+
+    def overlap_seconds(self, starts: Sequence[datetime], ends: Sequence[datetime]) -> np.ndarray:
+        start_us = np.fromiter((to_epoch_us(s) for s in starts), dtype=np.int64, count=len(starts))
+        end_us = np.fromiter((to_epoch_us(e) for e in ends), dtype=np.int64, count=len(ends))
+        return self.overlap_seconds_us(start_us, end_us)
+
+    def overlap_minutes(self, starts: Sequence[datetime], ends: Sequence[datetime]) -> float:
+        """Total night minutes over all sessions."""
+        if not starts:
+            return 0.0
+        return float(self.overlap_seconds(starts, ends).sum()) / 60.0
+
+
+def _overlap(a_start: np.ndarray, a_end: np.ndarray, b_start: np.ndarray, b_end: np.ndarray) -> np.ndarray:
+    return np.maximum(np.minimum(a_end, b_end) - np.maximum(a_start, b_start), 0)
@@ -0,0 +1,315 @@
+# app/services/online_state.py
+"""Per-user online model state advanced once per finalized feature_daily day.
+
+Persona özellikleri ve haftalık tahmin her istekte 30 günlük geçmişten
+yeniden türetiliyordu. Online modda her kullanıcı için sabit boyutlu bir
+durum vektörü tutulur (`ai_model_state`, 18 float64 = 144 bayt BYTEA):
+
+- Persona: üstel ağırlıklı (yaklaşık 30 günlük) gece / toplam / oyun / sosyal
+  ortalamaları ve hafta sonu / hafta içi toplamları. `PERSONA_FEATURES`
+  sırasındaki vektör doğrudan buradan okunur.
+- Tahmin (`holt_winters_online_v1`): sönümlü trendli Holt-Winters - seviye,
+  eğim ve haftanın günü başına çarpımsal katsayı. Her yeni gün O(1) günceller;
+  ufuk tahmini kapalı formdur.
+
+Bir gün, `ONLINE_STATE_SETTLE_DAYS` gün beklemeden kesinleşmiş sayılmaz: bugün
+kısmidir, dünün verisi de geç senkronizasyonla hâlâ değişebilir (varsayılan 1 ->
+`date < today - 1`). `advance_states` sadece `last_day`'den sonraki kesinleşmiş
+günleri okur ve aynı tarihteki tüm kullanıcıları vektörel günceller; sonuç tek
+upsert ile yazılır. Dashboard henüz kesinleşmemiş günleri (dün) `apply_pending`
+ile durumun bellekteki kopyasına uygular, kalıcı duruma yazmaz. Eski bir gün sonradan değişirse
+(geç senkronizasyon) durum onu görmez: `app/scripts/update_online_state.py
+--rebuild` son `ONLINE_STATE_REPLAY_DAYS` günü baştan oynatır.
+"""
+import os
+from datetime import date, timedelta
+from typing import Dict, List, NamedTuple, Optional, Tuple
+from uuid import UUID
+
+import numpy as np
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.db import SessionLocal
+from app.services.forecasting import HORIZON_DAYS
+from app.services.periodic import PeriodicJob
+
+ONLINE_MODELS_ENABLED = os.getenv("ONLINE_MODELS_ENABLED", "false").lower() == "true"
+ONLINE_STATE_INTERVAL_SECONDS = float(os.getenv("ONLINE_STATE_INTERVAL_SECONDS", "3600"))
+ONLINE_STATE_REPLAY_DAYS = int(os.getenv("ONLINE_STATE_REPLAY_DAYS", "90"))
+# Bugünden önceki bu kadar gün daha kesinleşmemiş sayılır (geç gelen oturumlar)
+ONLINE_STATE_SETTLE_DAYS = int(os.getenv("ONLINE_STATE_SETTLE_DAYS", "1"))
+
+ONLINE_MODEL_KEY = "holt_winters_online_v1"
+
+# Özellik ortalamaları: ~30 günlük pencereye denk EWMA
+FEATURE_ALPHA = 2.0 / (30 + 1)
+# Holt-Winters (sönümlü trend, çarpımsal haftalık mevsimsellik)
+HW_ALPHA = 0.3
+HW_BETA = 0.05
+HW_GAMMA = 0.1
+HW_PHI = 0.9
+
+# Durum vektörü düzeni
+NIGHT, TOTAL, GAMING, SOCIAL, WEIGHT, WE_TOTAL, WE_WEIGHT, WD_TOTAL, WD_WEIGHT, LEVEL, TREND = range(11)
+SEASON = 11
+STATE_SIZE = SEASON + 7
+
+_STATE_SQL = text(
+    """
+SELECT user_id, last_day, n_days, state
+FROM ai_model_state
+WHERE user_id = ANY(CAST(:user_ids AS uuid[])) AND model_key = :model_key
+"""
+)
+
+_NEW_DAYS_SQL = text(
+    """
+SELECT f.user_id, f.date, f.total_minutes, f.night_minutes, f.gaming_ratio, f.social_ratio, f.weekend
+FROM feature_daily f
+LEFT JOIN ai_model_state s ON s.user_id = f.user_id AND s.model_key = :model_key AND NOT :rebuild
+WHERE f.date < :settled_before
+  AND f.date > COALESCE(s.last_day, :replay_from)
+  AND (CAST(:user_ids AS uuid[]) IS NULL OR f.user_id = ANY(CAST(:user_ids AS uuid[])))
+ORDER BY f.date
+"""
+)
+
+_UPSERT_SQL = text(
+    """
+INSERT INTO ai_model_state (user_id, model_key, last_day, n_days, state, updated_at)
+SELECT u.user_id, :model_key, u.last_day, u.n_days, u.state, NOW()
+FROM unnest(
+    CAST(:user_ids AS uuid[]), CAST(:last_days AS date[]), CAST(:n_days AS int[]), CAST(:states AS bytea[])
+) AS u(user_id, last_day, n_days, state)
+ON CONFLICT (user_id) DO UPDATE SET
+    model_key = EXCLUDED.model_key,
+    last_day = EXCLUDED.last_day,
+    n_days = EXCLUDED.n_days,
+    state = EXCLUDED.state,
+    updated_at = EXCLUDED.updated_at
+"""
+)
+
+
+class OnlineState(NamedTuple):
+    last_day: date
+    n_days: int
+    vector: np.ndarray
+
+
+def initial_vector() -> np.ndarray:
+    v = np.zeros(STATE_SIZE)
+    v[SEASON:] = 1.0
+    return v
+
+
+def decode(raw: bytes) -> np.ndarray:
+    v = np.frombuffer(raw, dtype=np.float64)
+    return v.copy() if len(v) == STATE_SIZE else initial_vector()
+
+
+def update_day(
+    S: np.ndarray,
+    n_days: np.ndarray,
+    gap: np.ndarray,
+    weekday: int,
+    total: np.ndarray,
+    night: np.ndarray,
+    gaming: np.ndarray,
+    social: np.ndarray,
+    weekend: np.ndarray,
+):
+    """
+    Apply one finalized day to the rows of S in place (hepsi aynı tarih).
+    gap: önceki gözlemden bu yana gün sayısı (ilk gözlemde önemsiz).
+    """
+    a, keep = FEATURE_ALPHA, 1.0 - FEATURE_ALPHA
+    we = weekend.astype(np.float64)
+    S[:, NIGHT] = keep * S[:, NIGHT] + a * night
+    S[:, TOTAL] = keep * S[:, TOTAL] + a * total
+    S[:, GAMING] = keep * S[:, GAMING] + a * gaming
+    S[:, SOCIAL] = keep * S[:, SOCIAL] + a * social
+    S[:, WEIGHT] = keep * S[:, WEIGHT] + a
+    S[:, WE_TOTAL] = keep * S[:, WE_TOTAL] + a * total * we
+    S[:, WE_WEIGHT] = keep * S[:, WE_WEIGHT] + a * we
+    S[:, WD_TOTAL] = keep * S[:, WD_TOTAL] + a * total * (1 - we)
+    S[:, WD_WEIGHT] = keep * S[:, WD_WEIGHT] + a * (1 - we)
+
+    # Holt-Winters: eksik günler boyunca seviye sönümlü trendle ilerler
+    first = n_days == 0
+    g = np.maximum(gap, 1).astype(np.float64)
+    level, trend = S[:, LEVEL], S[:, TREND]
+    prior_level = level + trend * _damped_sum(g - 1)
+    prior_trend = trend * HW_PHI ** (g - 1)
+    season = S[:, SEASON + weekday]
+    new_level = HW_ALPHA * (total / np.maximum(season, 1e-3)) + (1 - HW_ALPHA) * (prior_level + HW_PHI * prior_trend)
+    new_trend = HW_BETA * (new_level - prior_level) + (1 - HW_BETA) * HW_PHI * prior_trend
+    new_season = HW_GAMMA * (total / np.maximum(new_level, 1.0)) + (1 - HW_GAMMA) * season
+
+    S[:, LEVEL] = np.where(first, total, new_level)
+    S[:, TREND] = np.where(first, 0.0, new_trend)
+    S[:, SEASON + weekday] = np.where(first, season, np.clip(new_season, 0.3, 3.0))
+
+
+def persona_features(state: OnlineState) -> List[float]:
+    """PERSONA_FEATURES sırası: night_avg, total_avg, gaming_ratio, social_ratio, weekend_ratio."""
+    v = state.vector
+    w = max(v[WEIGHT], 1e-12)
+    weekend_ratio = 0.0
+    if v[WE_WEIGHT] > 0 and v[WD_WEIGHT] > 0:
+        weekend_ratio = (v[WE_TOTAL] / v[WE_WEIGHT]) / max(v[WD_TOTAL] / v[WD_WEIGHT], 1.0)
+    return [float(v[NIGHT] / w), float(v[TOTAL] / w), float(v[GAMING] / w), float(v[SOCIAL] / w), float(weekend_ratio)]
+
+
+def forecast_from_state(state: OnlineState) -> Tuple[List[int], date]:
+    """Closed-form next HORIZON_DAYS from the state: (seri, başlangıç günü)."""
+    v = state.vector
+    start_date = state.last_day + timedelta(days=1)
+    steps = np.arange(1, HORIZON_DAYS + 1, dtype=np.float64)
+    weekdays = [(start_date + timedelta(days=h)).weekday() for h in range(HORIZON_DAYS)]
+    base = np.maximum(v[LEVEL] + v[TREND] * _damped_sum(steps), 0.0)
+    series = base * v[SEASON + np.array(weekdays)]
+    return [int(round(x)) for x in series], start_date
+
+
+def settled_before(today: date) -> date:
+    """İlk kesinleşmemiş gün: durum vektörüne sadece bundan önceki günler yazılır."""
+    return today - timedelta(days=max(ONLINE_STATE_SETTLE_DAYS, 0))
+
+
+def apply_pending(
+    state: OnlineState,
+    days: List[date],
+    total: np.ndarray,
+    night: np.ndarray,
+    gaming: np.ndarray,
+    social: np.ndarray,
+    weekend: np.ndarray,
+) -> OnlineState:
+    """`last_day`'den sonraki kesinleşmemiş günleri durumun kopyasına uygular (kalıcı yazılmaz)."""
+    S = state.vector.copy()[None, :]
+    n_days = np.array([state.n_days], dtype=np.int64)
+    last_day = state.last_day
+    for i, day in enumerate(days):
+        update_day(
+            S,
+            n_days,
+            np.array([(day - last_day).days]),
+            day.weekday(),
+            total=np.array([float(total[i])]),
+            night=np.array([float(night[i])]),
+            gaming=np.array([float(gaming[i])]),
+            social=np.array([float(social[i])]),
+            weekend=np.array([bool(weekend[i])]),
+        )
+        n_days += 1
+        last_day = day
+    return OnlineState(last_day, int(n_days[0]), S[0])
+
+
+def load_state(db: Session, user_id) -> Optional[OnlineState]:
+    row = db.execute(_STATE_SQL, {"user_ids": [str(user_id)], "model_key": ONLINE_MODEL_KEY}).first()
+    if row is None or row.last_day is None:
+        return None
+    return OnlineState(row.last_day, int(row.n_days), decode(row.state))
+
+
+def advance_states(
+    db: Session,
+    user_ids: Optional[List[UUID]] = None,
+    today: Optional[date] = None,
+    rebuild: bool = False,
+) -> Dict:
+    """
+    Apply every finalized day after each user's `last_day` (rebuild: son
+    ONLINE_STATE_REPLAY_DAYS gün baştan). Tek okuma + tek upsert; commit çağırana aittir.
+    """
+    today = today or date.today()
+    replay_from = today - timedelta(days=ONLINE_STATE_REPLAY_DAYS + 1)
+    rows = db.execute(
+        _NEW_DAYS_SQL,
+        {
+            "model_key": ONLINE_MODEL_KEY,
+            "rebuild": rebuild,
+            "settled_before": settled_before(today),
+            "replay_from": replay_from,
+            "user_ids": [str(u) for u in user_ids] if user_ids is not None else None,
+        },
+    ).all()
+    if not rows:
+        return {"users": 0, "days": 0}
+
+    users = sorted({r.user_id for r in rows}, key=str)
+    index = {u: i for i, u in enumerate(users)}
+    S = np.tile(initial_vector(), (len(users), 1))
+    n_days = np.zeros(len(users), dtype=np.int64)
+    last_ord = np.zeros(len(users), dtype=np.int64)
+    if not rebuild:
+        for r in db.execute(_STATE_SQL, {"user_ids": [str(u) for u in users], "model_key": ONLINE_MODEL_KEY}):
+            i = index[r.user_id]
+            S[i] = decode(r.state)
+            n_days[i] = r.n_days or 0
+            last_ord[i] = r.last_day.toordinal() if r.last_day else 0
+
+    # Aynı tarihteki tüm kullanıcılar tek vektörel adımda
+    by_date: Dict[date, List] = {}
+    for r in rows:
+        by_date.setdefault(r.date, []).append(r)
+    for day, day_rows in sorted(by_date.items()):
+        idx = np.fromiter((index[r.user_id] for r in day_rows), dtype=np.int64, count=len(day_rows))
+        sub = S[idx]
+        update_day(
+            sub,
+            n_days[idx],
+            day.toordinal() - last_ord[idx],
+            day.weekday(),
+            total=np.array([float(r.total_minutes or 0) for r in day_rows]),
+            night=np.array([float(r.night_minutes or 0) for r in day_rows]),
+            gaming=np.array([float(r.gaming_ratio or 0) for r in day_rows]),
+            social=np.array([float(r.social_ratio or 0) for r in day_rows]),
+            weekend=np.array([bool(r.weekend) for r in day_rows]),
+        )
+        S[idx] = sub
+        n_days[idx] += 1
+        last_ord[idx] = day.toordinal()
+
+    db.execute(
+        _UPSERT_SQL,
+        {
+            "model_key": ONLINE_MODEL_KEY,
+            "user_ids": [str(u) for u in users],
+            "last_days": [date.fromordinal(int(o)) for o in last_ord],
+            "n_days": [int(n) for n in n_days],
+            "states": [S[i].tobytes() for i in range(len(users))],
+        },
+    )
+    return {"users": len(users), "days": len(rows)}
+
+
+def advance_all_states() -> Dict:
+    """PeriodicJob girişi: kendi session'ı ve commit'i."""
+    db = SessionLocal()
+    try:
+        result = advance_states(db)
+        db.commit()
+        return result
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+def _damped_sum(steps: np.ndarray) -> np.ndarray:
+    """phi + phi^2 + ... + phi^steps (steps=0 -> 0)."""
+    return HW_PHI * (1 - HW_PHI ** steps) / (1 - HW_PHI)
+
+
+# Global erişim nesnesi (main.py lifespan'inde başlatılır)
+online_state_job = PeriodicJob(
+    "online_state",
+    ONLINE_STATE_INTERVAL_SECONDS,
+    advance_all_states,
+    initial_delay_seconds=30,
+)
@@ -0,0 +1,269 @@
+# app/services/period_rollup.py
+"""Weekly / monthly usage rollups and the range history read path.
+
+`usage_weekly` (ISO hafta, pazartesi başlangıç) ve `usage_monthly` kullanıcı
+başına dönem toplamlarını tutar. Ingest `daily_usage_log`'a yazdığı her
+(user_id, tarih) için ilgili hafta ve ayı aynı transaction'da
+`daily_usage_log`'dan yeniden toplar; günlük satırlar ezilebildiği için delta
+değil dönem bazında yeniden hesap yapılır (bir dönem en fazla 31 gün okur).
+
+Okuma: aralığın tamamen içinde kalan dönemler rollup'tan, aralık sınırında
+kırpılan (veya rollup'ta satırı olmayan) dönemler `daily_usage_log`'dan canlı
+hesaplanır. Böylece 365 günlük haftalık görünüm ~52 satır okur.
+
+Dakikalar dashboard ile aynı hesaplanır: her günlük satır için
+`total_seconds // 60`, sonra toplam.
+"""
+from datetime import date, timedelta
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+from uuid import UUID
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+GRANULARITIES = ("day", "week", "month")
+
+# Tek istekte izin verilen en geniş aralık (gün) - granülerite başına
+MAX_RANGE_DAYS = {"day": 366, "week": 3 * 366, "month": 10 * 366}
+
+# granularity -> (tablo, dönem kolonu, Postgres aralığı)
+_PERIOD_TABLES = {
+    "week": ("usage_weekly", "week_start", "1 week"),
+    "month": ("usage_monthly", "month_start", "1 month"),
+}
+
+
+def _refresh_sql(table: str, column: str, interval: str):
+    return text(
+        f"""
+WITH targets AS (
+    SELECT DISTINCT user_id, period_start
+    FROM unnest(CAST(:user_ids AS uuid[]), CAST(:periods AS date[])) AS t(user_id, period_start)
+)
+INSERT INTO {table} AS r (user_id, {column}, total_seconds, total_minutes, active_days, updated_at)
+SELECT t.user_id,
+       t.period_start,
+       COALESCE(SUM(l.total_seconds), 0),
+       COALESCE(SUM(COALESCE(l.total_seconds, 0) / 60), 0),
+       COUNT(DISTINCT l.usage_date) FILTER (WHERE l.total_seconds > 0),
+       NOW()
+FROM targets t
+LEFT JOIN daily_usage_log l
+       ON l.user_id = t.user_id
+      AND l.usage_date >= t.period_start
+      AND l.usage_date < t.period_start + INTERVAL '{interval}'
+GROUP BY t.user_id, t.period_start
+ON CONFLICT (user_id, {column}) DO UPDATE SET
+    total_seconds = EXCLUDED.total_seconds,
+    total_minutes = EXCLUDED.total_minutes,
+    active_days = EXCLUDED.active_days,
+    updated_at = EXCLUDED.updated_at
+"""
+    )
+
+
+def _rebuild_sql(table: str, column: str, unit: str):
+    return text(
+        f"""
+INSERT INTO {table} (user_id, {column}, total_seconds, total_minutes, active_days, updated_at)
+SELECT user_id,
+       date_trunc('{unit}', usage_date::timestamp)::date,
+       SUM(COALESCE(total_seconds, 0)),
+       SUM(COALESCE(total_seconds, 0) / 60),
+       COUNT(DISTINCT usage_date) FILTER (WHERE total_seconds > 0),
+       NOW()
+FROM daily_usage_log
+WHERE usage_date BETWEEN :start AND :end
+  AND (CAST(:user_ids AS uuid[]) IS NULL OR user_id = ANY(CAST(:user_ids AS uuid[])))
+GROUP BY 1, 2
+"""
+    )
+
+
+def _delete_sql(table: str, column: str):
+    return text(
+        f"""
+DELETE FROM {table}
+WHERE {column} BETWEEN :start AND :end
+  AND (CAST(:user_ids AS uuid[]) IS NULL OR user_id = ANY(CAST(:user_ids AS uuid[])))
+"""
+    )
+
+
+def _read_sql(table: str, column: str):
+    return text(
+        f"""
+SELECT {column} AS period_start, total_minutes, active_days
+FROM {table}
+WHERE user_id = :user_id AND {column} BETWEEN :start AND :end
+"""
+    )
+
+
+_REFRESH_SQL = {g: _refresh_sql(t, c, i) for g, (t, c, i) in _PERIOD_TABLES.items()}
+_REBUILD_SQL = {g: _rebuild_sql(t, c, g) for g, (t, c, _) in _PERIOD_TABLES.items()}
+_DELETE_SQL = {g: _delete_sql(t, c) for g, (t, c, _) in _PERIOD_TABLES.items()}
+_READ_SQL = {g: _read_sql(t, c) for g, (t, c, _) in _PERIOD_TABLES.items()}
+
+# Aynı kullanıcının eşzamanlı ingest'leri (çok cihaz, spool + doğrudan rapor)
+# dönemleri sırayla yeniden toplasın; anahtar sırasıyla alınır (deadlock olmasın)
+_LOCK_USERS_SQL = text(
+    """
+SELECT pg_advisory_xact_lock(k)
+FROM (
+    SELECT DISTINCT hashtext('usage_period:' || u) AS k
+    FROM unnest(CAST(:user_ids AS text[])) AS u
+    ORDER BY k
+) AS keys
+"""
+)
+
+_DAILY_TOTALS_SQL = text(
+    """
+SELECT usage_date,
+       SUM(COALESCE(total_seconds, 0) / 60) AS minutes,
+       SUM(COALESCE(total_seconds, 0)) AS seconds
+FROM daily_usage_log
+WHERE user_id = :user_id AND usage_date = ANY(CAST(:dates AS date[]))
+GROUP BY usage_date
+"""
+)
+
+
+def period_start(d: date, granularity: str) -> date:
+    if granularity == "week":
+        return d - timedelta(days=d.weekday())
+    if granularity == "month":
+        return d.replace(day=1)
+    return d
+
+
+def period_end(start: date, granularity: str) -> date:
+    """Inclusive last day of the period starting at `start`."""
+    if granularity == "week":
+        return start + timedelta(days=6)
+    if granularity == "month":
+        next_month = (start.replace(day=28) + timedelta(days=4)).replace(day=1)
+        return next_month - timedelta(days=1)
+    return start
+
+
+def refresh_usage_periods(db: Session, keys: Iterable[Tuple[UUID, date]]) -> int:
+    """
+    Recompute the weekly and monthly rows touched by these (user_id, usage_date) keys.
+
+    Ingest `daily_usage_log` yazdıktan sonra aynı transaction'da çağırır; commit
+    çağırana aittir. Kullanıcı başına advisory lock transaction sonuna kadar
+    tutulur. Dönen değer yeniden hesaplanan dönem satırı sayısıdır.
+    """
+    keys = set(keys)
+    if not keys:
+        return 0
+    # READ COMMITTED'da her ifade kendi snapshot'ını alır: kilit beklenirken commit
+    # eden diğer transaction'ın günlük satırları aşağıdaki toplamda görünür
+    db.execute(_LOCK_USERS_SQL, {"user_ids": sorted({str(u) for u, _ in keys})})
+    written = 0
+    for granularity in _PERIOD_TABLES:
+        targets = sorted({(str(u), period_start(d, granularity)) for u, d in keys})
+        db.execute(
+            _REFRESH_SQL[granularity],
+            {"user_ids": [u for u, _ in targets], "periods": [p for _, p in targets]},
+        )
+        written += len(targets)
+    return written
+
+
+def rebuild_usage_periods(db: Session, start: date, end: date, user_ids: Optional[List[UUID]] = None) -> int:
+    """
+    Recreate weekly/monthly rows for every period overlapping [start, end] (caller commits).
+
+    COPY ile toplu yüklenen veya rollup'lardan önceki geçmiş için kullanılır.
+    """
+    users = [str(u) for u in user_ids] if user_ids is not None else None
+    written = 0
+    for granularity in _PERIOD_TABLES:
+        lo = period_start(start, granularity)
+        hi = period_end(period_start(end, granularity), granularity)
+        db.execute(_DELETE_SQL[granularity], {"start": lo, "end": hi, "user_ids": users})
+        result = db.execute(_REBUILD_SQL[granularity], {"start": lo, "end": hi, "user_ids": users})
+        written += result.rowcount or 0
+    return written
+
+
+def usage_history(db: Session, user_id: UUID, start: date, end: date, granularity: str) -> List[dict]:
+    """
+    Zero-filled points for [start, end]: her biri period_start, period_end
+    (aralığa kırpılmış, dahil), total_minutes, active_days ve partial (dönem
+    aralık sınırında kırpıldıysa True).
+    """
+    if granularity not in GRANULARITIES:
+        raise ValueError(f"unknown granularity: {granularity}")
+
+    if granularity == "day":
+        daily = _daily_totals(db, user_id, _days(start, end))
+        points = []
+        for d in _days(start, end):
+            minutes, seconds = daily.get(d, (0, 0))
+            points.append(_point(d, d, minutes, 1 if seconds > 0 else 0, False))
+        return points
+
+    periods: List[Tuple[date, date, bool]] = []
+    p = period_start(start, granularity)
+    while p <= end:
+        p_end = period_end(p, granularity)
+        full = p >= start and p_end <= end
+        periods.append((max(p, start), min(p_end, end), full))
+        p = p_end + timedelta(days=1)
+
+    full_starts = [lo for lo, _, full in periods if full]
+    rollup: Dict[date, Tuple[int, int]] = {}
+    if full_starts:
+        rows = db.execute(
+            _READ_SQL[granularity],
+            {"user_id": user_id, "start": full_starts[0], "end": full_starts[-1]},
+        ).all()
+        rollup = {r.period_start: (int(r.total_minutes or 0), int(r.active_days or 0)) for r in rows}
+
+    # Kırpılan veya rollup satırı olmayan dönemler günlük tablodan
+    live_days = [d for lo, hi, full in periods if not full or lo not in rollup for d in _days(lo, hi)]
+    daily = _daily_totals(db, user_id, live_days)
+
+    points = []
+    for lo, hi, full in periods:
+        if full and lo in rollup:
+            minutes, active_days = rollup[lo]
+        else:
+            minutes = active_days = 0
+            for d in _days(lo, hi):
+                day_minutes, day_seconds = daily.get(d, (0, 0))
+                minutes += day_minutes
+                active_days += 1 if day_seconds > 0 else 0
+        points.append(_point(lo, hi, minutes, active_days, not full))
+    return points
+
+
+def _days(start: date, end: date) -> List[date]:
+    return [start + timedelta(days=i) for i in range((end - start).days + 1)]
+
+
+def _daily_totals(db: Session, user_id: UUID, days: List[date]) -> Dict[date, Tuple[int, int]]:
+    """{usage_date: (dakika, saniye)}; sadece istenen günler okunur."""
+    if not days:
+        return {}
+    rows = db.execute(_DAILY_TOTALS_SQL, {"user_id": user_id, "dates": days}).all()
+    return {r.usage_date: (int(r.minutes or 0), int(r.seconds or 0)) for r in rows}
+
+
+def _point(lo: date, hi: date, minutes: int, active_days: int, partial: bool) -> dict:
+    return {
+        "period_start": lo,
+        "period_end": hi,
+        "total_minutes": minutes,
+        "active_days": active_days,
+        "partial": partial,
+    }
+
+
+def touched_keys(*row_lists: Iterable[dict]) -> Set[Tuple[UUID, date]]:
+    """(user_id, usage_date) keys of daily_usage_log rows about to be written."""
+    return {(row["user_id"], row["usage_date"]) for rows in row_lists for row in rows}
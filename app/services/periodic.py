@@ -0,0 +1,91 @@
+# app/services/periodic.py
+"""Minimal background runner for periodic maintenance jobs.
+
+Her iş kendi daemon thread'inde `interval_seconds` aralıkla çalışır. Hata
+olursa loglanır ve bir sonraki turda tekrar denenir; `stop()` beklemeyi
+hemen keser.
+"""
+import threading
+import time
+from datetime import datetime
+from typing import Callable, Dict, Optional
+
+
+class PeriodicJob:
+    def __init__(
+        self,
+        name: str,
+        interval_seconds: float,
+        fn: Callable[[], object],
+        initial_delay_seconds: Optional[float] = None,
+    ):
+        self.name = name
+        self.interval_seconds = max(interval_seconds, 1.0)
+        self.initial_delay_seconds = (
+            self.interval_seconds if initial_delay_seconds is None else max(initial_delay_seconds, 0.0)
+        )
+        self.fn = fn
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+        self.runs = 0
+        self.failures = 0
+        self.last_started_at: Optional[datetime] = None
+        self.last_finished_at: Optional[datetime] = None
+        self.last_duration_ms: Optional[float] = None
+        self.last_result = None
+        self.last_error: Optional[str] = None
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._loop, name=f"periodic-{self.name}", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 30.0):
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def run_once(self):
+        """Run the job now in the calling thread (also used by the loop)."""
+        with self._lock:
+            self.last_started_at = datetime.utcnow()
+            t0 = time.perf_counter()
+            try:
+                self.last_result = self.fn()
+                self.last_error = None
+            except Exception as e:
+                self.failures += 1
+                self.last_error = str(e)
+                print(f"PERIODIC JOB {self.name} failed: {e}")
+            finally:
+                self.runs += 1
+                self.last_duration_ms = (time.perf_counter() - t0) * 1000
+                self.last_finished_at = datetime.utcnow()
+            return self.last_result
+
+    def stats(self) -> Dict:
+        return {
+            "name": self.name,
+            "running": self._thread is not None and self._thread.is_alive(),
+            "interval_seconds": self.interval_seconds,
+            "runs": self.runs,
+            "failures": self.failures,
+            "last_started_at": self.last_started_at.isoformat() if self.last_started_at else None,
+            "last_finished_at": self.last_finished_at.isoformat() if self.last_finished_at else None,
+            "last_duration_ms": round(self.last_duration_ms, 1) if self.last_duration_ms is not None else None,
+            "last_result": self.last_result if isinstance(self.last_result, (int, float, str, dict)) else None,
+            "last_error": self.last_error,
+        }
+
+    def _loop(self):
+        if self._stop_event.wait(self.initial_delay_seconds):
+            return
+        while not self._stop_event.is_set():
+            self.run_once()
+            if self._stop_event.wait(self.interval_seconds):
+                return
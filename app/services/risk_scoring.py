@@ -0,0 +1,464 @@
+# app/services/risk_scoring.py
+"""Population-wide rule_v1 risk scoring with one read and one bulk upsert.
+
+Risk skoru eskiden sadece ebeveyn `/api/ai/dashboard` açtığında, kullanıcı
+başına birkaç ORM sorgusu + commit ile hesaplanıyordu. Artık:
+
+- `score_users` son `RISK_WINDOW_DAYS` günün feature_daily satırlarını (ve
+  user_settings limitlerini) tüm aktif kullanıcılar için tek sorguda okur,
+  kullanıcı x gün matrislerine dizer (eksik günler `observed` maskesiyle) ve rule_v1 bileşik skorunu
+  `score_matrix` ile tüm nüfus için vektörel hesaplar.
+- Sonuç `risk_assessment`'a tek `INSERT ... ON CONFLICT` ile yazılır
+  (dimension 'overall', model_key 'rule_v1').
+- `risk_batch_job` günde bir kez (`RISK_BATCH_HOUR` sonrası) çalışır; birden
+  fazla worker varsa `batch_run_log` günü bir kez puanlatır.
+  `app/scripts/score_risk.py` aynı işi elle (işarete bakmadan) tetikler.
+- AIEngine önce bugünün kayıtlı satırını (`persisted_risk`) döner; yoksa aynı
+  `score_matrix` ile tek satırlık hesap yapar ve aynı upsert'le yazar.
+- `risk_dimension` / `risk_level` satırları açılışta bir kez seed edilir ve
+  `risk_meta` içinde değişmez bir sözlükte tutulur; yazma yolu meta tablolara
+  sorgu atmaz.
+
+Aktif kullanıcı: pencerede en az bir feature_daily günü olan kullanıcı.
+"""
+import json
+import os
+import threading
+from datetime import date, datetime, timedelta
+from types import MappingProxyType
+from typing import Dict, List, Mapping, NamedTuple, Optional
+from uuid import UUID
+
+import numpy as np
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.db import SessionLocal
+from app.services.feature_history import FeatureHistory
+from app.services.night_window import LOCAL_TZ
+from app.services.periodic import PeriodicJob
+
+RISK_MODEL_KEY = "rule_v1"
+RISK_DIMENSION_KEY = "overall"
+RISK_DIMENSION_NAME = "Genel Risk"
+RISK_WINDOW_DAYS = 14
+
+RISK_BATCH_ENABLED = os.getenv("RISK_BATCH_ENABLED", "true").lower() == "true"
+RISK_BATCH_HOUR = int(os.getenv("RISK_BATCH_HOUR", "2"))  # yerel saat; bu saatten sonra günde bir kez
+RISK_BATCH_CHECK_SECONDS = float(os.getenv("RISK_BATCH_CHECK_SECONDS", "600"))
+
+# Ağırlıklar (toplam 1.0)
+W_NIGHT = 0.40
+W_LIMIT = 0.30
+W_MIX = 0.20
+W_WEEKEND = 0.10
+
+NO_DATA_LEVEL = "Veri Yok"
+
+# Etiket -> risk_level (key, rank); 'none': pencerede veri yok işaretçisi
+LEVELS = {
+    NO_DATA_LEVEL: ("none", 0),
+    "Düşük": ("low", 1),
+    "Orta": ("medium", 2),
+    "Yüksek": ("high", 3),
+}
+
+_HISTORY_SQL = text(
+    """
+SELECT f.user_id, f.date, f.total_minutes, f.night_minutes, f.gaming_ratio, f.social_ratio,
+       f.weekend, f.is_holiday, s.daily_limit_minutes, s.weekend_relax_pct
+FROM feature_daily f
+LEFT JOIN user_settings s ON s.user_id = f.user_id
+WHERE f.date >= :start AND f.date < :end
+"""
+)
+
+_USER_HISTORY_SQL = text(
+    """
+SELECT f.user_id, f.date, f.total_minutes, f.night_minutes, f.gaming_ratio, f.social_ratio,
+       f.weekend, f.is_holiday, s.daily_limit_minutes, s.weekend_relax_pct
+FROM feature_daily f
+LEFT JOIN user_settings s ON s.user_id = f.user_id
+WHERE f.user_id = ANY(CAST(:user_ids AS uuid[]))
+  AND f.date >= :start AND f.date < :end
+"""
+)
+
+_DIMENSION_SQL = text(
+    """
+INSERT INTO risk_dimension (key, display_name) VALUES (:key, :name)
+ON CONFLICT (key) DO UPDATE SET key = EXCLUDED.key
+RETURNING id
+"""
+)
+
+_LEVELS_SQL = text(
+    """
+INSERT INTO risk_level (key, rank)
+SELECT * FROM unnest(CAST(:keys AS text[]), CAST(:ranks AS smallint[]))
+ON CONFLICT (key) DO UPDATE SET key = EXCLUDED.key
+RETURNING key, id
+"""
+)
+
+_UPSERT_SQL = text(
+    """
+INSERT INTO risk_assessment AS r (user_id, as_of_date, dimension_id, level_id, prob, model_key, features)
+SELECT u.user_id, :as_of, :dimension_id, u.level_id, u.prob, :model_key, CAST(u.features AS jsonb)
+FROM unnest(
+    CAST(:user_ids AS uuid[]), CAST(:level_ids AS smallint[]),
+    CAST(:probs AS numeric[]), CAST(:features AS text[])
+) AS u(user_id, level_id, prob, features)
+ON CONFLICT (user_id, as_of_date, dimension_id) DO UPDATE SET
+    level_id = EXCLUDED.level_id,
+    prob = EXCLUDED.prob,
+    model_key = EXCLUDED.model_key,
+    features = EXCLUDED.features
+"""
+)
+
+_PERSISTED_SQL = text(
+    """
+SELECT r.features
+FROM risk_assessment r
+JOIN risk_dimension d ON d.id = r.dimension_id
+WHERE r.user_id = :user_id AND r.as_of_date = :as_of
+  AND d.key = :dimension AND r.model_key = :model_key
+"""
+)
+
+_LOCK_SQL = text("SELECT pg_try_advisory_xact_lock(hashtext(:name))")
+
+_RUN_DONE_SQL = text("SELECT 1 FROM batch_run_log WHERE job_name = :job AND run_date = :run_date")
+
+_RUN_MARK_SQL = text(
+    """
+INSERT INTO batch_run_log (job_name, run_date, users, finished_at)
+VALUES (:job, :run_date, :users, NOW())
+ON CONFLICT (job_name, run_date) DO UPDATE SET
+    users = EXCLUDED.users,
+    finished_at = EXCLUDED.finished_at
+"""
+)
+
+
+def map_level(score: int) -> str:
+    if score >= 67:
+        return "Yüksek"
+    if score >= 34:
+        return "Orta"
+    return "Düşük"
+
+
+def score_matrix(
+    total: np.ndarray,
+    night: np.ndarray,
+    mix: np.ndarray,
+    off_day: np.ndarray,
+    observed: np.ndarray,
+    limits: np.ndarray,
+    relax_pct: np.ndarray,
+) -> Dict[str, np.ndarray]:
+    """
+    rule_v1 for a (users, days) population at once.
+
+    total/night/mix: dakika ve oyun+sosyal oranı; gözlenmeyen hücreler `observed`
+    ile dışarıda bırakılır (değerleri önemsiz). limits/relax_pct: (users,),
+    limit yoksa NaN. Her kullanıcının en az bir gözlenen günü olmalı.
+    """
+    n = observed.sum(axis=1)
+
+    def row_mean(values, mask):
+        return np.where(mask, values, 0.0).sum(axis=1) / np.maximum(mask.sum(axis=1), 1)
+
+    # 1) Gece kullanımı: 60 dk ve üstü tam risk
+    night_avg = row_mean(night, observed)
+    night_score = np.minimum(100, np.rint((night_avg / 60) * 100))
+
+    # 2) Günlük limit aşımı: limit yoksa nötr 50; hafta sonu/tatil gevşeme payı
+    has_limit = np.nan_to_num(limits, nan=0.0) > 0
+    limit = np.where(has_limit, limits, 1.0)[:, None]
+    relax = (np.maximum(np.nan_to_num(relax_pct, nan=0.0), 0) / 100.0)[:, None]
+    day_limit = np.where(off_day, limit * (1 + relax), limit)
+    over_pct = np.maximum((total - day_limit) / np.maximum(day_limit, 1), 0)
+    limit_score = np.where(has_limit, np.minimum(100, np.rint(row_mean(over_pct, observed) * 100)), 50)
+
+    # 3) Kategori dağılımı: oyun + sosyal oranı
+    mix_avg = row_mean(mix, observed)
+    mix_score = np.minimum(100, np.rint(mix_avg * 100))
+
+    # 4) Hafta sonu/tatil aşırı yükü: hafta içi ortalamaya göre fark
+    off_mask = observed & off_day
+    week_mask = observed & ~off_day
+    weekday_avg = row_mean(total, week_mask)
+    penalty = np.maximum((row_mean(total, off_mask) - weekday_avg) / np.maximum(weekday_avg, 1), 0)
+    penalty = np.where(off_mask.any(axis=1) & week_mask.any(axis=1), penalty, 0)
+    weekend_score = np.minimum(100, np.rint(penalty * 100))
+
+    composite = W_NIGHT * night_score + W_LIMIT * limit_score + W_MIX * mix_score + W_WEEKEND * weekend_score
+    return {
+        "score": np.rint(composite).astype(np.int64),
+        "night_avg": night_avg,
+        "night_score": night_score.astype(np.int64),
+        "total_avg": row_mean(total, observed),
+        "limit_score": limit_score.astype(np.int64),
+        "mix_avg": mix_avg,
+        "mix_score": mix_score.astype(np.int64),
+        "weekend_score": weekend_score.astype(np.int64),
+        "data_points": n,
+        "confidence": np.minimum(n / float(RISK_WINDOW_DAYS), 1.0),
+    }
+
+
+def result_for(
+    scores: Dict[str, np.ndarray], i: int, weekend_relax_pct: Optional[int], history_end: Optional[date] = None
+) -> Dict:
+    """
+    Row `i` of `score_matrix` output -> {"score", "level", "details"} (API şekli).
+    history_end: girdinin son günü; dashboard anlık görüntüsünün tazeliği buna bakar.
+    """
+    score = int(scores["score"][i])
+    details = {
+        "night_minutes_avg": round(float(scores["night_avg"][i]), 1),
+        "night_score": int(scores["night_score"][i]),
+        "total_minutes_avg": round(float(scores["total_avg"][i]), 1),
+        "limit_score": int(scores["limit_score"][i]),
+        "mix_ratio_avg": round(float(scores["mix_avg"][i]), 2),
+        "mix_score": int(scores["mix_score"][i]),
+        "weekend_score": int(scores["weekend_score"][i]),
+        "weekend_relax_pct": weekend_relax_pct,
+        "data_points": int(scores["data_points"][i]),
+        "method": "rule",
+        "confidence": round(float(scores["confidence"][i]), 2),
+    }
+    if history_end is not None:
+        details["history_end"] = history_end.isoformat()
+    return {"score": score, "level": map_level(score), "details": details}
+
+
+def no_data_result(history_end: Optional[date] = None) -> Dict:
+    """
+    Risk penceresinde feature günü yok. history_end (yüklenen geçmişin son günü)
+    ile yazılırsa anlık görüntü taze sayılır ve her istek yenileme tetiklemez.
+    """
+    details = {"data_points": 0, "method": "rule"}
+    if history_end is not None:
+        details["history_end"] = history_end.isoformat()
+    return {"score": 0, "level": NO_DATA_LEVEL, "details": details}
+
+
+def score_history(
+    history: FeatureHistory, daily_limit: Optional[int], weekend_relax_pct: Optional[int], as_of: date
+) -> Dict:
+    """
+    Single user (AIEngine yolu): batch ile aynı (1, RISK_WINDOW_DAYS) matris
+    düzeni, böylece toplama sırası ve sonuç birebir aynıdır.
+    """
+    start = np.datetime64(as_of - timedelta(days=RISK_WINDOW_DAYS), "D")
+    cols = (history.dates - start).astype(np.int64)
+    keep = (cols >= 0) & (cols < RISK_WINDOW_DAYS)
+    cols = cols[keep]
+    shape = (1, RISK_WINDOW_DAYS)
+
+    def place(values, dtype=np.float64):
+        out = np.zeros(shape, dtype=dtype)
+        out[0, cols] = values[keep]
+        return out
+
+    scores = score_matrix(
+        total=place(history.total),
+        night=place(history.night),
+        mix=place(history.gaming + history.social),
+        off_day=place(history.off_day, dtype=bool),
+        observed=place(np.ones(len(history), dtype=bool), dtype=bool),
+        limits=np.array([daily_limit if daily_limit is not None else np.nan], dtype=np.float64),
+        relax_pct=np.array([weekend_relax_pct if weekend_relax_pct is not None else np.nan], dtype=np.float64),
+    )
+    history_end = history.dates[keep][-1].astype(object) if keep.any() else None
+    return result_for(scores, 0, weekend_relax_pct, history_end)
+
+
+class RiskMeta(NamedTuple):
+    dimension_id: int
+    level_ids: Mapping[str, int]  # etiket ("Veri Yok" / "Düşük" / "Orta" / "Yüksek") -> risk_level.id
+
+
+def ensure_meta(db: Session) -> RiskMeta:
+    """Upsert the 'overall' dimension and the levels (caller commits)."""
+    dimension_id = db.execute(_DIMENSION_SQL, {"key": RISK_DIMENSION_KEY, "name": RISK_DIMENSION_NAME}).scalar()
+    keys = [k for k, _ in LEVELS.values()]
+    ranks = [r for _, r in LEVELS.values()]
+    ids = {row.key: row.id for row in db.execute(_LEVELS_SQL, {"keys": keys, "ranks": ranks})}
+    return RiskMeta(dimension_id, MappingProxyType({label: ids[key] for label, (key, _) in LEVELS.items()}))
+
+
+class RiskMetaCache:
+    """
+    Process-wide, read-only risk meta ids. main.py lifespan'inde `seed` edilir;
+    seed edilmemiş süreçlerde (script'ler) ilk `get` kendi session'ıyla seed eder.
+    """
+
+    def __init__(self):
+        self._meta: Optional[RiskMeta] = None
+        self._lock = threading.Lock()
+
+    def seed(self) -> RiskMeta:
+        # Kendi transaction'ı: çağıranın rollback'i önbellekteki id'leri geçersiz kılmasın
+        db = SessionLocal()
+        try:
+            meta = ensure_meta(db)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+        with self._lock:
+            self._meta = meta
+        return meta
+
+    def get(self) -> RiskMeta:
+        meta = self._meta
+        return meta if meta is not None else self.seed()
+
+
+def persist_risks(db: Session, as_of: date, results: List[Dict]) -> int:
+    """Bulk upsert (caller commits). results: user_id, score, level, details."""
+    if not results:
+        return 0
+    meta = risk_meta.get()
+    db.execute(
+        _UPSERT_SQL,
+        {
+            "as_of": as_of,
+            "dimension_id": meta.dimension_id,
+            "model_key": RISK_MODEL_KEY,
+            "user_ids": [str(r["user_id"]) for r in results],
+            "level_ids": [meta.level_ids[r["level"]] for r in results],
+            "probs": [round(r["score"] / 100, 3) for r in results],
+            "features": [
+                json.dumps({"score": r["score"], "level": r["level"], **r["details"]}, ensure_ascii=False)
+                for r in results
+            ],
+        },
+    )
+    return len(results)
+
+
+def persisted_risk(db: Session, user_id, as_of: date) -> Optional[Dict]:
+    """Stored rule_v1 row for `as_of` in API shape, or None."""
+    features = db.execute(
+        _PERSISTED_SQL,
+        {"user_id": str(user_id), "as_of": as_of, "dimension": RISK_DIMENSION_KEY, "model_key": RISK_MODEL_KEY},
+    ).scalar()
+    if not features or "score" not in features:
+        return None
+    details = {k: v for k, v in features.items() if k not in ("score", "level")}
+    return {"score": int(features["score"]), "level": features.get("level") or map_level(int(features["score"])),
+            "details": details}
+
+
+def score_users(db: Session, user_ids: Optional[List[UUID]] = None, as_of: Optional[date] = None) -> int:
+    """
+    Batch: tek feature_daily sorgusu + tek vektörel skor + tek upsert.
+    Pencere [as_of - RISK_WINDOW_DAYS, as_of). Commit çağırana aittir.
+    """
+    as_of = as_of or datetime.now(LOCAL_TZ).date()
+    start = as_of - timedelta(days=RISK_WINDOW_DAYS)
+    if user_ids is None:
+        rows = db.execute(_HISTORY_SQL, {"start": start, "end": as_of}).all()
+    else:
+        rows = db.execute(
+            _USER_HISTORY_SQL, {"user_ids": [str(u) for u in user_ids], "start": start, "end": as_of}
+        ).all()
+    if not rows:
+        return 0
+
+    users = sorted({r.user_id for r in rows}, key=str)
+    index = {u: i for i, u in enumerate(users)}
+    shape = (len(users), RISK_WINDOW_DAYS)
+    total = np.zeros(shape)
+    night = np.zeros(shape)
+    mix = np.zeros(shape)
+    off_day = np.zeros(shape, dtype=bool)
+    observed = np.zeros(shape, dtype=bool)
+    limits = np.full(len(users), np.nan)
+    relax_pct = np.full(len(users), np.nan)
+    relax_raw: List[Optional[int]] = [None] * len(users)
+    history_end: List[Optional[date]] = [None] * len(users)
+
+    for r in rows:
+        i = index[r.user_id]
+        col = (r.date - start).days
+        total[i, col] = r.total_minutes or 0
+        night[i, col] = r.night_minutes or 0
+        mix[i, col] = float(r.gaming_ratio or 0) + float(r.social_ratio or 0)
+        off_day[i, col] = bool(r.weekend) or bool(r.is_holiday)
+        observed[i, col] = True
+        history_end[i] = max(history_end[i] or r.date, r.date)
+        if r.daily_limit_minutes is not None:
+            limits[i] = r.daily_limit_minutes
+        if r.weekend_relax_pct is not None:
+            relax_pct[i] = r.weekend_relax_pct
+        relax_raw[i] = r.weekend_relax_pct
+
+    scores = score_matrix(total, night, mix, off_day, observed, limits, relax_pct)
+    results = []
+    for i, user_id in enumerate(users):
+        results.append({"user_id": user_id, **result_for(scores, i, relax_raw[i], history_end[i])})
+    return persist_risks(db, as_of, results)
+
+
+def run_risk_batch(as_of: Optional[date] = None) -> Dict:
+    """
+    Score every active user (own session and commit). Advisory lock keeps workers
+    from overlapping; `batch_run_log` satırı günü dağıtım genelinde bir kez puanlatır.
+    """
+    as_of = as_of or datetime.now(LOCAL_TZ).date()
+    db = SessionLocal()
+    try:
+        if not db.execute(_LOCK_SQL, {"name": "risk_batch"}).scalar():
+            db.rollback()
+            return {"skipped": "risk batch already running"}
+        # Kilitten sonra okunur: önceki worker'ın commit ettiği işaret görünür
+        if db.execute(_RUN_DONE_SQL, {"job": "risk_batch", "run_date": as_of}).first():
+            db.rollback()
+            return {"skipped": f"{as_of.isoformat()} already scored"}
+        written = score_users(db, as_of=as_of)
+        db.execute(_RUN_MARK_SQL, {"job": "risk_batch", "run_date": as_of, "users": written})
+        db.commit()
+        return {"as_of": as_of.isoformat(), "users": written}
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+class _NightlyRisk:
+    """Günde bir kez: yerel saat RISK_BATCH_HOUR'u geçtikten sonraki ilk kontrolde çalışır."""
+
+    def __init__(self):
+        self.last_scored: Optional[date] = None
+
+    def __call__(self):
+        now = datetime.now(LOCAL_TZ)
+        # Saat ve gün aynı yerel saatten: sunucu UTC ise date.today() 00-03 arası bir gün geride kalır
+        today = now.date()
+        if self.last_scored == today or now.hour < RISK_BATCH_HOUR:
+            return {"skipped": f"next run after {RISK_BATCH_HOUR:02d}:00", "last_scored": self.last_scored}
+        result = run_risk_batch(today)
+        # Kilit başka worker'daysa o süreç bugünü puanlıyor; bitirdiyse batch_run_log atlatır
+        self.last_scored = today
+        return result
+
+
+# Global erişim nesneleri (main.py lifespan'inde seed edilir / başlatılır)
+risk_meta = RiskMetaCache()
+
+risk_batch_job = PeriodicJob(
+    "risk_batch",
+    RISK_BATCH_CHECK_SECONDS,
+    _NightlyRisk(),
+    initial_delay_seconds=60,
+)
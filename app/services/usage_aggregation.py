@@ -0,0 +1,160 @@
+# app/services/usage_aggregation.py
+"""NumPy-backed day splitting and aggregation of usage events.
+
+`ingest.aggregate_events_loop` her olayı tek tek `datetime` nesneleriyle gece
+yarısında böler. Buradaki sürüm aynı hesabı tamsayı mikrosaniye dizileri
+üzerinde tek geçişte yapar ve birebir aynı çıktıyı üretir:
+
+- Olay sınırları `datetime.fromtimestamp(ms / 1000)` ile aynı şekilde
+  mikrosaniyeye çevrilir (ms * 1000).
+- Bir gün `23:59:59.999999`'da biter, sonraki parça bir saniye sonra başlar
+  (döngüdeki `segment_end + 1s` davranışı korunur).
+- Süreler aynı sırayla toplanır; böylece float toplamlar da bit düzeyinde eşittir.
+"""
+from datetime import date, datetime, timezone
+from typing import Dict, List, Sequence, Set, Tuple
+from uuid import UUID
+
+import numpy as np
+
+US_PER_SECOND = 1_000_000
+US_PER_HOUR = 3_600 * US_PER_SECOND
+US_PER_DAY = 86_400 * US_PER_SECOND
+TR_OFFSET_US = 3 * 3600 * US_PER_SECOND
+_EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+
+def expand_day_segments(start_us: np.ndarray, end_us: np.ndarray, offset_us: int = TR_OFFSET_US):
+    """
+    Split [start, end] intervals (UTC epoch microseconds) at local midnights.
+
+    Returns (interval_idx, local_day, seg_start, seg_end) where seg_* are local
+    epoch microseconds and local_day is days since 1970-01-01 local time.
+    Segments follow the cursor walk of `split_session`; zero-length ones are kept.
+    """
+    s = np.asarray(start_us, dtype=np.int64) + offset_us
+    e = np.asarray(end_us, dtype=np.int64) + offset_us
+
+    first_day = s // US_PER_DAY
+    # k. parça (k>=1) (first_day + k) * D + 1s - 1us anında başlar; başlangıç <= bitiş olduğu sürece devam
+    extra = np.maximum((e - US_PER_SECOND + 1) // US_PER_DAY - first_day, 0)
+    counts = extra + 1
+
+    idx = np.repeat(np.arange(len(s)), counts)
+    offsets = np.cumsum(counts) - counts
+    k = np.arange(int(counts.sum())) - np.repeat(offsets, counts)
+
+    day = first_day[idx] + k
+    seg_start = np.where(k == 0, s[idx], day * US_PER_DAY + US_PER_SECOND - 1)
+    seg_end = np.minimum((day + 1) * US_PER_DAY - 1, e[idx])
+    return idx, day, seg_start, seg_end
+
+
+def expand_hour_segments(start_us: np.ndarray, end_us: np.ndarray, offset_us: int = TR_OFFSET_US):
+    """
+    Split [start, end) intervals (UTC epoch microseconds) at local hour boundaries.
+
+    Returns (interval_idx, local_hour, seconds); local_hour is hours since
+    1970-01-01 local time (gün = local_hour // 24, saat = local_hour % 24).
+    Gün bölmeden farklı olarak parçalar arasında boşluk yoktur; boş parçalar atılır.
+    """
+    s = np.asarray(start_us, dtype=np.int64) + offset_us
+    e = np.asarray(end_us, dtype=np.int64) + offset_us
+    e = np.maximum(e, s)
+
+    first_hour = s // US_PER_HOUR
+    counts = np.maximum((e - 1) // US_PER_HOUR - first_hour + 1, 1)
+
+    idx = np.repeat(np.arange(len(s)), counts)
+    offsets = np.cumsum(counts) - counts
+    k = np.arange(int(counts.sum())) - np.repeat(offsets, counts)
+
+    hour = first_hour[idx] + k
+    seg_start = np.maximum(hour * US_PER_HOUR, s[idx])
+    seg_end = np.minimum((hour + 1) * US_PER_HOUR, e[idx])
+    keep = seg_end > seg_start
+    return idx[keep], hour[keep], (seg_end - seg_start)[keep] / US_PER_SECOND
+
+
+def local_day_to_date(day: int) -> date:
+    return date.fromordinal(_EPOCH_ORDINAL + int(day))
+
+
+def aggregate_events_vectorized(
+    user_id: UUID,
+    device_id: UUID,
+    events: Sequence,
+    tz: timezone,
+    source: str,
+) -> Tuple[List[dict], Dict[Tuple[date, str], dict], Set[date]]:
+    """Vectorized twin of `ingest.aggregate_events_loop` (same return values)."""
+    if not events:
+        return [], {}, set()
+
+    start_ms = np.fromiter((ev.timestamp_start for ev in events), dtype=np.int64, count=len(events))
+    end_ms = np.fromiter((ev.timestamp_end for ev in events), dtype=np.int64, count=len(events))
+    valid = np.flatnonzero(end_ms > start_ms)
+    if valid.size == 0:
+        return [], {}, set()
+
+    valid_events = [events[i] for i in valid]
+    start_us = start_ms[valid] * 1000
+    end_us = end_ms[valid] * 1000
+
+    session_rows = [
+        {
+            "user_id": user_id,
+            "device_id": device_id,
+            "package_name": ev.package_name,
+            "started_at": datetime.fromtimestamp(ev.timestamp_start / 1000.0, tz),
+            "ended_at": datetime.fromtimestamp(ev.timestamp_end / 1000.0, tz),
+            "source": source,
+            "payload": None,
+        }
+        for ev in valid_events
+    ]
+
+    offset_us = int(tz.utcoffset(None).total_seconds()) * US_PER_SECOND
+    idx, day, seg_start, seg_end = expand_day_segments(start_us, end_us, offset_us)
+    dur_us = seg_end - seg_start
+    keep = dur_us > 0
+    idx, day, dur_us = idx[keep], day[keep], dur_us[keep]
+    if idx.size == 0:
+        return session_rows, {}, set()
+
+    # Paketleri tamsayı koduna çevir ve (gün, paket) anahtarı üret
+    codes: Dict[str, int] = {}
+    pkg_code = np.fromiter(
+        (codes.setdefault(ev.package_name, len(codes)) for ev in valid_events),
+        dtype=np.int64,
+        count=len(valid_events),
+    )
+    packages = list(codes)
+    keys = day * len(codes) + pkg_code[idx]
+    uniq, first_pos, inv = np.unique(keys, return_index=True, return_inverse=True)
+
+    # bincount girişi sırayla toplar -> döngüdeki float toplamla aynı sonuç
+    seconds = np.bincount(inv, weights=dur_us / US_PER_SECOND, minlength=len(uniq))
+
+    # app_name: anahtara katkı veren son dolu isim, yoksa ilk olayın ismi
+    has_name = np.fromiter((bool(ev.app_name) for ev in valid_events), dtype=bool, count=len(valid_events))
+    named = has_name[idx]
+    last_named = np.full(len(uniq), -1, dtype=np.int64)
+    np.maximum.at(last_named, inv[named], np.flatnonzero(named))
+    name_pos = np.where(last_named >= 0, last_named, first_pos)
+
+    aggregated: Dict[Tuple[date, str], dict] = {}
+    dates: Set[date] = set()
+    day_cache: Dict[int, date] = {}
+    for u in np.argsort(first_pos, kind="stable"):
+        d = int(uniq[u] // len(codes))
+        usage_date = day_cache.get(d)
+        if usage_date is None:
+            usage_date = day_cache[d] = local_day_to_date(d)
+            dates.add(usage_date)
+        aggregated[(usage_date, packages[int(uniq[u] % len(codes))])] = {
+            "duration": float(seconds[u]),
+            "app_name": valid_events[idx[name_pos[u]]].app_name,
+        }
+
+    return session_rows, aggregated, dates
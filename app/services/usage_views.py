@@ -0,0 +1,110 @@
+# app/services/usage_views.py
+"""Refresh job for the `view_daily_app_usage` materialized view (bakım amaçlı).
+
+View tanımı `db/view_daily-app-usage.sql` içindedir. Periyodik iş view'u
+`REFRESH MATERIALIZED VIEW CONCURRENTLY` ile yeniler (okuyucular bloklanmaz;
+unique index bunun için şart) ve `mv_refresh_log`'a tazelik watermark'ını yazar:
+veri en az `data_as_of` anına kadar commit edilmiş her şeyi içerir.
+
+- Birden fazla worker süreci varsa advisory lock ile aynı anda tek yenileme.
+- View hiç doldurulmamışsa (WITH NO DATA) ilk yenileme CONCURRENTLY olmadan yapılır.
+- API okuyucusu yoktur (dashboard/app_detail/history rollup tablolarını okur);
+  view harici raporlama içindir. Yenileme bu yüzden varsayılan kapalıdır
+  (`MV_REFRESH_ENABLED=true` ile açılır).
+"""
+import os
+import time
+from datetime import datetime
+from typing import Dict, Optional
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.db import SessionLocal
+from app.services.night_window import LOCAL_TZ
+from app.services.periodic import PeriodicJob
+
+DAILY_APP_USAGE_VIEW = "view_daily_app_usage"
+
+MV_REFRESH_ENABLED = os.getenv("MV_REFRESH_ENABLED", "false").lower() in ("1", "true", "yes")
+MV_REFRESH_INTERVAL_SECONDS = float(os.getenv("MV_REFRESH_INTERVAL_SECONDS", "300"))
+
+_LOCK_SQL = text("SELECT pg_try_advisory_xact_lock(hashtext(:name))")
+_POPULATED_SQL = text("SELECT ispopulated FROM pg_matviews WHERE matviewname = :name")
+_NOW_SQL = text("SELECT clock_timestamp()")
+
+_LOG_SQL = text(
+    """
+INSERT INTO mv_refresh_log (view_name, data_as_of, refreshed_at, duration_ms, concurrent)
+VALUES (:name, :data_as_of, clock_timestamp(), :duration_ms, :concurrent)
+ON CONFLICT (view_name) DO UPDATE SET
+    data_as_of = EXCLUDED.data_as_of,
+    refreshed_at = EXCLUDED.refreshed_at,
+    duration_ms = EXCLUDED.duration_ms,
+    concurrent = EXCLUDED.concurrent
+"""
+)
+
+_FRESHNESS_SQL = text(
+    "SELECT data_as_of, refreshed_at, duration_ms, concurrent FROM mv_refresh_log WHERE view_name = :name"
+)
+
+def refresh_daily_app_usage() -> Dict:
+    """Refresh the materialized view and record its watermark (own session and commit)."""
+    db = SessionLocal()
+    try:
+        if not db.execute(_LOCK_SQL, {"name": DAILY_APP_USAGE_VIEW}).scalar():
+            db.rollback()
+            return {"skipped": "refresh already running"}
+
+        populated = db.execute(_POPULATED_SQL, {"name": DAILY_APP_USAGE_VIEW}).scalar()
+        if populated is None:
+            raise RuntimeError(f"{DAILY_APP_USAGE_VIEW} is missing; apply db/view_daily-app-usage.sql")
+
+        # REFRESH kendi snapshot'ını bu andan sonra alır: bu ana kadarki commit'ler dahil
+        data_as_of = db.execute(_NOW_SQL).scalar()
+        concurrent = bool(populated)
+        t0 = time.perf_counter()
+        db.execute(text(
+            f"REFRESH MATERIALIZED VIEW {'CONCURRENTLY ' if concurrent else ''}{DAILY_APP_USAGE_VIEW}"
+        ))
+        duration_ms = int((time.perf_counter() - t0) * 1000)
+        db.execute(
+            _LOG_SQL,
+            {
+                "name": DAILY_APP_USAGE_VIEW,
+                "data_as_of": data_as_of,
+                "duration_ms": duration_ms,
+                "concurrent": concurrent,
+            },
+        )
+        db.commit()
+        return {"data_as_of": data_as_of.isoformat(), "duration_ms": duration_ms, "concurrent": concurrent}
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+def view_freshness(db: Session, view_name: str = DAILY_APP_USAGE_VIEW) -> Optional[Dict]:
+    """mv_refresh_log satırı (watermark + gecikme saniyesi); hiç yenilenmediyse None."""
+    row = db.execute(_FRESHNESS_SQL, {"name": view_name}).first()
+    if row is None:
+        return None
+    return {
+        "view_name": view_name,
+        "data_as_of": row.data_as_of,
+        "refreshed_at": row.refreshed_at,
+        "duration_ms": row.duration_ms,
+        "concurrent": row.concurrent,
+        "lag_seconds": round((datetime.now(LOCAL_TZ) - row.data_as_of).total_seconds(), 1),
+    }
+
+
+# Global erişim nesnesi (main.py lifespan'inde başlatılır)
+view_refresh_job = PeriodicJob(
+    "view_daily_app_usage_refresh",
+    MV_REFRESH_INTERVAL_SECONDS,
+    refresh_daily_app_usage,
+)
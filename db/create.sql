@@ -46,10 +46,13 @@ CREATE TABLE app_catalog (
     package_name TEXT PRIMARY KEY,
     app_name TEXT NOT NULL,
     category_id INT,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),  -- CatalogIndex artımlı yenileme watermark'ı
     CONSTRAINT fk_app_catalog_category
         FOREIGN KEY (category_id) REFERENCES app_category(id)
 );
 
+CREATE INDEX idx_app_catalog_updated_at ON app_catalog (updated_at);
+
 -- =========================================================
 --  CORE: USER SETTINGS (Eski child_settings)
 -- =========================================================
@@ -108,6 +111,86 @@ CREATE TABLE daily_usage_log (
         FOREIGN KEY (device_id) REFERENCES device(id) ON DELETE CASCADE
 );
 
+-- Saatlik rollup: ingest yeni oturumları yerel saat sınırlarında bölüp ekler
+CREATE TABLE usage_hourly (
+    user_id UUID NOT NULL,
+    device_id UUID NOT NULL,
+    date DATE NOT NULL,
+    hour SMALLINT NOT NULL CHECK (hour BETWEEN 0 AND 23),
+    package_name TEXT NOT NULL,
+    seconds DOUBLE PRECISION NOT NULL DEFAULT 0,
+    night_seconds DOUBLE PRECISION NOT NULL DEFAULT 0,   -- kullanıcının gece penceresiyle kesişim
+
+    CONSTRAINT pk_usage_hourly PRIMARY KEY (user_id, date, package_name, device_id, hour),
+
+    CONSTRAINT fk_usage_hourly_user
+        FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
+    CONSTRAINT fk_usage_hourly_device
+        FOREIGN KEY (device_id) REFERENCES device(id) ON DELETE CASCADE
+);
+
+-- Gün kapsama işareti: günün tüm oturumları usage_hourly'de ve night_seconds bu
+-- pencereyle hesaplandı. İşaretsiz (veya pencere değişmiş) gün ham oturumlardan okunur
+CREATE TABLE usage_hourly_day (
+    user_id UUID NOT NULL,
+    date DATE NOT NULL,
+    night_start TIME NOT NULL,
+    night_end TIME NOT NULL,
+
+    CONSTRAINT pk_usage_hourly_day PRIMARY KEY (user_id, date),
+
+    CONSTRAINT fk_usage_hourly_day_user
+        FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+);
+
+-- Dönem rollup'ları: ingest dokunduğu hafta/ayı daily_usage_log'dan yeniden toplar
+CREATE TABLE usage_weekly (
+    user_id UUID NOT NULL,
+    week_start DATE NOT NULL,          -- ISO hafta, pazartesi
+    total_seconds BIGINT NOT NULL DEFAULT 0,
+    total_minutes INT NOT NULL DEFAULT 0,
+    active_days SMALLINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+
+    CONSTRAINT pk_usage_weekly PRIMARY KEY (user_id, week_start),
+
+    CONSTRAINT fk_usage_weekly_user
+        FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+);
+
+CREATE TABLE usage_monthly (
+    user_id UUID NOT NULL,
+    month_start DATE NOT NULL,         -- ayın ilk günü
+    total_seconds BIGINT NOT NULL DEFAULT 0,
+    total_minutes INT NOT NULL DEFAULT 0,
+    active_days SMALLINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+
+    CONSTRAINT pk_usage_monthly PRIMARY KEY (user_id, month_start),
+
+    CONSTRAINT fk_usage_monthly_user
+        FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+);
+
+-- Materialized view tazelik watermark'ı: veri en az `data_as_of` anı kadar günceldir
+CREATE TABLE mv_refresh_log (
+    view_name TEXT PRIMARY KEY,
+    data_as_of TIMESTAMPTZ NOT NULL,
+    refreshed_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    duration_ms INT,
+    concurrent BOOLEAN NOT NULL DEFAULT TRUE
+);
+
+-- Günlük toplu işlerin çalıştırma kaydı: (iş, gün) başına bir satır; çok worker'da gün bir kez işlenir
+CREATE TABLE batch_run_log (
+    job_name TEXT NOT NULL,
+    run_date DATE NOT NULL,
+    users INT,
+    finished_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+
+    CONSTRAINT pk_batch_run_log PRIMARY KEY (job_name, run_date)
+);
+
 -- =========================================================
 --  ANALYTICS: DAILY FEATURES (AI Girdisi)
 -- =========================================================
@@ -123,6 +206,12 @@ CREATE TABLE feature_daily (
     weekend BOOLEAN,
     is_holiday BOOLEAN DEFAULT FALSE,
 
+    -- Artımlı (delta) güncelleme için ham saniyeler; NULL ise satır tam hesap bekler
+    total_seconds DOUBLE PRECISION,
+    night_seconds DOUBLE PRECISION,
+    gaming_seconds DOUBLE PRECISION,
+    social_seconds DOUBLE PRECISION,
+
     PRIMARY KEY (user_id, date),
     CONSTRAINT fk_feature_daily_user
         FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
@@ -174,9 +263,17 @@ CREATE TABLE weekly_forecast (
     horizon_week SMALLINT NOT NULL,
     scenario VARCHAR NOT NULL,      -- 'baseline', 'reduced'
     target VARCHAR,                 -- 'total_minutes'
-    yhat_lo INT,
-    yhat_hi INT,
+    yhat_lo INT,                    -- haftalık toplam alt bant
+    yhat_hi INT,                    -- haftalık toplam üst bant
     model_key VARCHAR,
+    yhat INT,                       -- haftalık toplam (dakika)
+    daily_series JSONB,             -- 7 günlük dakika serisi
+    daily_lo JSONB,                 -- günlük alt bant (kantil)
+    daily_hi JSONB,                 -- günlük üst bant (kantil)
+    start_date DATE,                -- serinin ilk günü
+    history_end DATE,               -- girdi geçmişinin son günü
+    history_signature VARCHAR,      -- girdi özeti; değişince yeniden hesaplanır
+    created_at TIMESTAMPTZ DEFAULT NOW(),
 
     PRIMARY KEY (user_id, as_of_date, horizon_week, scenario),
 
@@ -184,6 +281,36 @@ CREATE TABLE weekly_forecast (
         FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
 );
 
+-- =========================================================
+--  AI: USER PROFILE (Persona anlık görüntüsü)
+-- =========================================================
+CREATE TABLE user_profile (
+    user_id UUID PRIMARY KEY,
+    label VARCHAR NOT NULL,         -- 'Gece Kuşu', 'Dengeli Kullanıcı' ...
+    probabilities JSONB,            -- [{label, probability}]
+    model_key VARCHAR,              -- persona artifact sürümü veya 'rule'
+    history_end DATE,               -- girdi geçmişinin son günü
+    updated_at TIMESTAMPTZ DEFAULT NOW(),
+
+    CONSTRAINT fk_user_profile_user
+        FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+);
+
+-- =========================================================
+--  AI: ONLINE MODEL STATE (Kullanıcı başına artımlı model durumu)
+-- =========================================================
+CREATE TABLE ai_model_state (
+    user_id UUID PRIMARY KEY,
+    model_key VARCHAR NOT NULL,     -- 'holt_winters_online_v1'
+    last_day DATE,                  -- uygulanan son kesinleşmiş gün
+    n_days INT NOT NULL DEFAULT 0,  -- uygulanan gün sayısı
+    state BYTEA NOT NULL,           -- float64 durum vektörü (sabit boyut)
+    updated_at TIMESTAMPTZ DEFAULT NOW(),
+
+    CONSTRAINT fk_ai_model_state_user
+        FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+);
+
 -- =========================================================
 --  POLICY: RULE (Kurallar)
 -- =========================================================
@@ -1,6 +1,16 @@
-DROP VIEW IF EXISTS view_daily_app_usage;
+-- Eski düz view'u kaldır (materialized view ile aynı ad)
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM pg_class WHERE relname = 'view_daily_app_usage' AND relkind = 'v') THEN
+        DROP VIEW view_daily_app_usage;
+    END IF;
+END $$;
 
-CREATE OR REPLACE VIEW view_daily_app_usage AS
+DROP MATERIALIZED VIEW IF EXISTS view_daily_app_usage;
+
+-- Materialized: okuma her seferinde daily_usage_log'u yeniden toplamaz.
+-- app/services/usage_views.py periyodik olarak REFRESH ... CONCURRENTLY çalıştırır.
+CREATE MATERIALIZED VIEW view_daily_app_usage AS
 SELECT
     user_id,
     DATE(usage_date) AS usage_date,
@@ -10,4 +20,18 @@ SELECT
 FROM
     daily_usage_log
 GROUP BY
-    user_id, usage_date, package_name;
\ No newline at end of file
+    user_id, usage_date, package_name
+WITH DATA;
+
+-- CONCURRENTLY yenileme için zorunlu
+CREATE UNIQUE INDEX ux_view_daily_app_usage
+    ON view_daily_app_usage (user_id, usage_date, package_name);
+
+-- Tazelik watermark'ı (mv_refresh_log tablosu db/create.sql içinde)
+INSERT INTO mv_refresh_log (view_name, data_as_of, refreshed_at, duration_ms, concurrent)
+VALUES ('view_daily_app_usage', NOW(), NOW(), NULL, FALSE)
+ON CONFLICT (view_name) DO UPDATE SET
+    data_as_of = EXCLUDED.data_as_of,
+    refreshed_at = EXCLUDED.refreshed_at,
+    duration_ms = EXCLUDED.duration_ms,
+    concurrent = EXCLUDED.concurrent;